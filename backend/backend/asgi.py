@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from nft.activity_stream import WEBSOCKET_PATH, activity_websocket  # noqa: E402  (needs apps loaded)
+
+
+async def application(scope, receive, send):
+    """Django for HTTP; the live activity WebSocket is served directly"""
+    if scope['type'] == 'websocket':
+        if scope['path'] == WEBSOCKET_PATH:
+            await activity_websocket(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await django_application(scope, receive, send)
@@ -58,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'nft.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -66,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'nft.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -95,9 +97,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when an atomic block starts, so concurrent writers
+        # wait (up to `timeout` seconds) instead of failing with "database is locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # On disk rather than shared-cache memory, so tests running several
+        # connections wait for the write lock like production does
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Read replicas (optional)
+# Comma-separated SQLite paths, e.g. for local stand-ins:
+#   DB_REPLICAS=/tmp/replica1.sqlite3,/tmp/replica2.sqlite3
+# Postgres replicas can be added to DATABASES directly and listed in DATABASE_REPLICAS.
+DATABASE_REPLICAS = []
+_replica_paths = [path.strip() for path in os.getenv('DB_REPLICAS', '').split(',') if path.strip()]
+for i, replica_path in enumerate(_replica_paths, start=1):
+    alias = f'replica{i}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': replica_path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['nft.db_routers.ReplicaRouter']
+
+# Views (by URL name) whose reads may be served from a replica
+REPLICA_READ_VIEWS = [
+    'get_nfts',
+    'get_combined_nfts',
+    'search_nfts',
+    'get_collections',
+    'get_trending_collections',
+    'get_collections_by_likes',
+    'get_activities',
+    'get_activity_stats',
+]
+
+# After a client's own write, pin its reads to default for this many seconds
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,6 +180,79 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Transaction archive
+# `manage.py archive_transactions` moves transactions older than the horizon
+# into gzipped NDJSON files here; get_activities?time_filter=all reads them back.
+TRANSACTION_ARCHIVE_DIR = Path(os.getenv('TRANSACTION_ARCHIVE_DIR', BASE_DIR / 'archive' / 'transactions'))
+TRANSACTION_ARCHIVE_HORIZON_DAYS = int(os.getenv('TRANSACTION_ARCHIVE_HORIZON_DAYS', 90))
+
+# Live activity stream (/api/activities/stream/ and ws://.../ws/activities/)
+# Events kept for Last-Event-ID replay, per-client queue before it is told to
+# refetch, and seconds between keepalives on idle SSE connections.
+ACTIVITY_STREAM_REPLAY = int(os.getenv('ACTIVITY_STREAM_REPLAY', 256))
+ACTIVITY_STREAM_QUEUE_SIZE = int(os.getenv('ACTIVITY_STREAM_QUEUE_SIZE', 100))
+ACTIVITY_STREAM_HEARTBEAT = int(os.getenv('ACTIVITY_STREAM_HEARTBEAT', 15))
+
+# Home timeline (/api/profiles/<wallet>/timeline/)
+# Activity of wallets with fewer followers than the fan-out limit is copied
+# into each follower's timeline when it happens; busier wallets are merged
+# in at read time, and wallets crossing the limit are switched over when
+# they do. Timelines are trimmed back to about LENGTH as they are written;
+# `manage.py trim_timelines` cuts every one to exactly LENGTH.
+ACTIVITY_TIMELINE_FANOUT_LIMIT = int(os.getenv('ACTIVITY_TIMELINE_FANOUT_LIMIT', 1000))
+ACTIVITY_TIMELINE_LENGTH = int(os.getenv('ACTIVITY_TIMELINE_LENGTH', 500))
+
+# Profile image thumbnails (nft.thumbnails): worker processes that render the
+# WebP/AVIF avatar and banner variants after upload; 0 renders inline.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+# Largest avatar/banner accepted by a multipart update_profile (streamed, so
+# this bounds disk use, not memory)
+PROFILE_IMAGE_MAX_SIZE = int(os.getenv('PROFILE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))  # 10MB
+
+# Token metadata (nft.token_metadata): IPFS token URIs are resolved by racing
+# these gateways, at most IPFS_FETCH_CONCURRENCY CIDs at a time, and kept in a
+# content-addressed cache that is never invalidated (CIDs are immutable). A CID
+# no gateway could serve is not raced again for IPFS_FAILURE_TTL seconds.
+IPFS_GATEWAYS = [g for g in os.getenv(
+    'IPFS_GATEWAYS', 'https://ipfs.io,https://cloudflare-ipfs.com,https://gateway.pinata.cloud',
+).split(',') if g]
+IPFS_FETCH_CONCURRENCY = int(os.getenv('IPFS_FETCH_CONCURRENCY', 8))
+IPFS_FETCH_TIMEOUT = float(os.getenv('IPFS_FETCH_TIMEOUT', 10))
+IPFS_FAILURE_TTL = float(os.getenv('IPFS_FAILURE_TTL', 300))
+TOKEN_METADATA_CACHE_DIR = Path(os.getenv('TOKEN_METADATA_CACHE_DIR', BASE_DIR / 'cache' / 'token_metadata'))
+
+# Trait rarity index (nft.rarity): seconds after a collection's traits change
+# before it is re-ranked, so a burst of registrations triggers a single pass
+RARITY_RANK_DELAY = float(os.getenv('RARITY_RANK_DELAY', 5))
+
+# Auction closing (nft.auctions): `manage.py run_auction_scheduler`, run once
+# per deployment, keeps a heap of auction end times and closes auctions as
+# they end, re-reading open auctions every AUCTION_SCHEDULER_RELOAD seconds to
+# pick up ones listed through the web workers. endAuction is sent from
+# AUCTION_SETTLER_PRIVATE_KEY (read from the environment) when set.
+AUCTION_SCHEDULER_RELOAD = float(os.getenv('AUCTION_SCHEDULER_RELOAD', 30))
+
+# Contract ABI (nft.abi_registry): compiled once from the Hardhat artifact
+# (selectors and event decoders, without the bytecode) and kept here until the
+# artifact changes; enough on its own where smartcontract/ is not deployed
+CONTRACT_ABI_CACHE_DIR = Path(os.getenv('CONTRACT_ABI_CACHE_DIR', BASE_DIR / 'cache' / 'abi'))
+
+# Chain ingestion (nft.chain_sync): blocks are only ingested once they are
+# CHAIN_CONFIRMATIONS deep, starting at the contract's deployment block. The
+# last CHAIN_JOURNAL_SIZE ingested blocks are journaled so a reorg deeper than
+# the confirmation depth can still be rolled back and re-applied.
+CHAIN_CONFIRMATIONS = int(os.getenv('CHAIN_CONFIRMATIONS', 12))
+CHAIN_START_BLOCK = int(os.getenv('CHAIN_START_BLOCK', 0))
+CHAIN_JOURNAL_SIZE = int(os.getenv('CHAIN_JOURNAL_SIZE', 128))
+# `manage.py tail_chain` follows the head from a newHeads subscription when
+# CHAIN_WS_URL (wss://...) is set, else by polling eth_blockNumber between
+# these bounds (seconds), slowing down while no blocks arrive
+CHAIN_WS_URL = os.getenv('CHAIN_WS_URL', '')
+CHAIN_POLL_MIN_INTERVAL = float(os.getenv('CHAIN_POLL_MIN_INTERVAL', 1))
+CHAIN_POLL_MAX_INTERVAL = float(os.getenv('CHAIN_POLL_MAX_INTERVAL', 30))
+# `manage.py backfill_chain`: requests per second each worker process may send
+CHAIN_BACKFILL_RPC_RATE = float(os.getenv('CHAIN_BACKFILL_RPC_RATE', 10))
+
 # File Upload Settings
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
@@ -170,3 +283,47 @@ REST_FRAMEWORK = {
 # Web3 settings
 WEB3_PROVIDER_URI = "https://eth-sepolia.g.alchemy.com/v2/Bxo3zUQluKPV1Z9k0ajGE"
 CONTRACT_ADDRESS = "0xAB6FEdb0AdB537166425fd2bBd1F416b99899201"
+
+# Performance instrumentation
+# Samples kept per endpoint/metric for the p50/p95/p99 served at /api/perf/
+PERF_SAMPLE_WINDOW = int(os.getenv('PERF_SAMPLE_WINDOW', 1000))
+# Allow ?debug_timing=1 to append the timing breakdown to JSON responses
+PERF_DEBUG_FOOTER = DEBUG
+
+# Logging
+# LOG_LEVEL=DEBUG enables debug output; LOG_DEBUG_SAMPLE_RATE keeps only a
+# fraction of debug records from hot paths; LOG_FORMAT=json for structured output.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+        'json': {
+            '()': 'nft.logging_utils.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sample_debug': {
+            '()': 'nft.logging_utils.SampleDebugFilter',
+            'rate': os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'),
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'nft.logging_utils.QueueLogHandler',
+            'formatter': os.getenv('LOG_FORMAT', 'text'),
+            'filters': ['sample_debug'],
+        },
+    },
+    'loggers': {
+        'nft': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
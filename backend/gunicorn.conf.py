@@ -0,0 +1,10 @@
+# gunicorn picks this file up when started from backend/, e.g.
+#   PROMETHEUS_MULTIPROC_DIR=/var/run/nft-metrics gunicorn backend.wsgi
+import os
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's samples from live gauges aggregated by /metrics (nft.metrics)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
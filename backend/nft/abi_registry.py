@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from django.conf import settings
+from eth_abi import decode as abi_decode
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PATH = (Path(settings.BASE_DIR).parent / 'smartcontract' / 'artifacts' / 'contracts' /
+                 'nftmarketplace.sol' / 'NFTMarketplace.json')
+CACHE_DIR = Path(getattr(settings, 'CONTRACT_ABI_CACHE_DIR', Path(settings.BASE_DIR) / 'cache' / 'abi'))
+# Bump when the layout of the cache file changes
+CACHE_VERSION = 1
+
+_ZERO_WORD = bytes(32)
+
+
+def _word_decoder(abi_type):
+    """Decoder for one 32-byte ABI word of a static elementary type, or None for anything else"""
+    if abi_type == 'address':
+        # Lowercase, as AddressField stores it; checksumming is the slow part of generic decoding
+        return lambda word: '0x' + word[12:].hex()
+    if abi_type == 'bool':
+        return lambda word: word != _ZERO_WORD
+    if abi_type.startswith('uint'):
+        return lambda word: int.from_bytes(word, 'big')
+    if abi_type.startswith('int'):
+        return lambda word: int.from_bytes(word, 'big', signed=True)
+    if abi_type.startswith('bytes') and abi_type[5:].isdigit():
+        size = int(abi_type[5:])
+        return lambda word: word[:size]
+    return None
+
+
+def _raw_bytes(value):
+    """bytes of a 0x hex string (raw JSON-RPC) or bytes-like value (web3-formatted logs)"""
+    return bytes.fromhex(value[2:]) if isinstance(value, str) else bytes(value)
+
+
+class EventDecoder:
+    """
+    Decodes one event's logs without going through web3's contract
+    machinery: indexed arguments straight from their topics, and data made
+    of static words by slicing, falling back to eth_abi only for dynamic
+    types (NFTMinted's tokenURI).
+    """
+
+    def __init__(self, name, inputs):
+        self.name = name
+        self.names = tuple(arg_name for arg_name, _, _ in inputs)
+        # Indexed dynamic values (strings, arrays) are only their hash; kept as the raw 32 bytes, like web3 does
+        self.topic_decoders = [_word_decoder(abi_type) or bytes for _, abi_type, indexed in inputs if indexed]
+        self.data_types = [abi_type for _, abi_type, indexed in inputs if not indexed]
+        self.word_decoders = [_word_decoder(abi_type) for abi_type in self.data_types]
+        self.static = all(self.word_decoders)
+        # Argument order (ABI order) -> (indexed?, position among topics or data)
+        self.order = []
+        topic, data = 0, 0
+        for _, _, indexed in inputs:
+            self.order.append((True, topic) if indexed else (False, data))
+            topic, data = topic + indexed, data + (not indexed)
+
+    def decode(self, topics, data):
+        """The event's argument values, in ABI order, from its topics (without topic0) and data bytes"""
+        indexed = [decoder(topic) for decoder, topic in zip(self.topic_decoders, topics)]
+        if self.static:
+            values = [decoder(data[32 * i:32 * i + 32]) for i, decoder in enumerate(self.word_decoders)]
+        else:
+            values = [value.lower() if abi_type == 'address' else value
+                      for abi_type, value in zip(self.data_types, abi_decode(self.data_types, data))]
+        return tuple(indexed[position] if is_topic else values[position] for is_topic, position in self.order)
+
+
+class AbiRegistry:
+    """
+    The marketplace contract's ABI with what is derived from it worked out
+    once: 4-byte function selectors and a topic0 -> EventDecoder table.
+    """
+
+    def __init__(self, abi, selectors, events):
+        self.abi = abi
+        self.selectors = selectors
+        # topic0 bytes -> EventDecoder
+        self.events = {bytes.fromhex(topic[2:]): EventDecoder(name, inputs) for topic, (name, inputs) in events.items()}
+
+    @staticmethod
+    def derive(abi):
+        """(selectors, events) for an ABI: what the disk cache keeps besides the ABI itself"""
+        selectors = {'0x' + function_abi_to_4byte_selector(entry).hex(): entry['name']
+                     for entry in abi if entry.get('type') == 'function'}
+        events = {'0x' + event_abi_to_log_topic(entry).hex():
+                  (entry['name'], [(arg['name'], arg['type'], arg['indexed']) for arg in entry['inputs']])
+                  for entry in abi if entry.get('type') == 'event' and not entry.get('anonymous')}
+        return selectors, events
+
+    def decode_logs(self, logs):
+        """
+        (block, log index, tx hash, event name, args) for every known event
+        among logs, in chain order. Logs may be raw JSON-RPC dicts (hex
+        strings) or web3's formatted AttributeDicts; addresses come out
+        lowercase.
+        """
+        events, decoders = [], self.events
+        for log in logs:
+            topics = log['topics']
+            if log.get('removed') or not topics:
+                continue
+            topics = [_raw_bytes(topic) for topic in topics]
+            decoder = decoders.get(topics[0])
+            if decoder is None:
+                continue
+            block, index, tx_hash = log['blockNumber'], log['logIndex'], log['transactionHash']
+            if isinstance(block, str):
+                block, index = int(block, 16), int(index, 16)
+            tx_hash = tx_hash.lower() if isinstance(tx_hash, str) else '0x' + bytes(tx_hash).hex()
+            values = decoder.decode(topics[1:], _raw_bytes(log['data']))
+            events.append((block, index, tx_hash, decoder.name, dict(zip(decoder.names, values))))
+        events.sort(key=lambda event: event[:2])
+        return events
+
+
+def _fingerprint(path):
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load(artifact_path=ARTIFACT_PATH, cache_dir=CACHE_DIR):
+    """
+    Registry for the Hardhat artifact at artifact_path. The compiled form
+    (ABI, selectors and topics, without the bytecode) is kept in cache_dir
+    and reused while the artifact's mtime and size are unchanged; when the
+    artifact is missing (e.g. a deploy without smartcontract/) the cache
+    alone is enough.
+    """
+    artifact_path, cache_dir = Path(artifact_path), Path(cache_dir)
+    cache_path = cache_dir / f'{artifact_path.stem}.json'
+    fingerprint = _fingerprint(artifact_path) if artifact_path.exists() else None
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached['version'] == CACHE_VERSION and (fingerprint is None or cached['source'] == fingerprint):
+            return AbiRegistry(cached['abi'], cached['selectors'], cached['events'])
+    except (OSError, ValueError, KeyError):
+        pass
+    if fingerprint is None:
+        raise FileNotFoundError(f"Contract artifact not found at {artifact_path} and no ABI cache at {cache_path}")
+
+    with open(artifact_path) as f:
+        artifact = json.load(f)
+    if not artifact.get('abi'):
+        raise ValueError(f"No 'abi' field found in contract artifact {artifact_path}")
+    abi = artifact['abi']
+    selectors, events = AbiRegistry.derive(abi)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'source': fingerprint, 'abi': abi,
+                       'selectors': selectors, 'events': events}, f)
+        os.replace(tmp, cache_path)
+        logger.info("Compiled contract ABI cached at %s", cache_path)
+    except OSError as e:
+        logger.warning("Could not cache the compiled contract ABI at %s: %s", cache_path, e)
+    return AbiRegistry(abi, selectors, events)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """The marketplace contract's AbiRegistry, loaded once per process"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load()
+    return _registry
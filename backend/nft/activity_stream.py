@@ -0,0 +1,357 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import uuid
+from collections import deque
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = getattr(settings, 'ACTIVITY_STREAM_HEARTBEAT', 15)
+
+
+def time_ago(timestamp, now=None):
+    time_diff = (now or timezone.now()) - timestamp
+    if time_diff.days > 0:
+        return f"{time_diff.days} days ago"
+    elif time_diff.seconds > 3600:
+        hours = time_diff.seconds // 3600
+        return f"{hours} hours ago"
+    else:
+        minutes = time_diff.seconds // 60
+        return f"{minutes} minutes ago"
+
+
+def activity_payload(activity, from_username, to_username, now=None, from_avatar=None, to_avatar=None):
+    """One activity-feed item; shared by get_activities and the live stream (avatars: URL or None)"""
+    data = {
+        'id': activity.id,
+        'type': activity.transaction_type,
+        'nft': None,
+        'from': {
+            'address': activity.from_address,
+            'name': from_username,
+            'avatar': from_avatar
+        },
+        'to': {
+            'address': activity.to_address,
+            'name': to_username,
+            'avatar': to_avatar
+        },
+        'price': None,
+        'timestamp': activity.timestamp.isoformat(),
+        'time_ago': time_ago(activity.timestamp, now),
+        'transaction_hash': activity.transaction_hash,
+        'block_number': activity.block_number,
+    }
+    # Follow/unfollow actions have no NFT involved
+    if activity.transaction_type not in ('follow', 'unfollow'):
+        nft = activity.nft
+        data['nft'] = {
+            'id': nft.id if nft else None,
+            'name': nft.name if nft else 'Unknown NFT',
+            'image_url': nft.image_url if nft else '',
+            'collection': nft.collection if nft else 'Unknown Collection',
+            'token_id': nft.token_id if nft else None
+        }
+        data['price'] = float(activity.price) if activity.price else None
+        data['gas_used'] = activity.gas_used
+        data['gas_price'] = float(activity.gas_price) if activity.gas_price else None
+    return data
+
+
+class Subscription:
+    """
+    One connected client. Events are handed over through an asyncio.Queue
+    (ASGI) or a queue.Queue (WSGI); a client that falls behind by more than
+    the queue size is marked lagged and told to refetch instead of buffering
+    without bound.
+    """
+
+    def __init__(self, types=None, collection=None, maxsize=100, loop=None):
+        self.types = set(types) if types else None
+        self.collection = collection
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+        self.lagged = False
+
+    def wants(self, event):
+        data = event['data']
+        if self.types and data['type'] not in self.types:
+            return False
+        if self.collection and (data['nft'] or {}).get('collection') != self.collection:
+            return False
+        return True
+
+    def deliver(self, event):
+        if self.loop:
+            try:
+                self.loop.call_soon_threadsafe(self._put, event)
+            except RuntimeError:
+                # Event loop already closed; the client is gone
+                pass
+        else:
+            self._put(event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except (asyncio.QueueFull, queue.Full):
+            self.lagged = True
+
+    def drain(self):
+        """Drop queued events (after telling a lagged client to refetch)"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.lagged = False
+
+
+class ActivityHub:
+    """
+    In-process broadcast of new activity to connected stream clients.
+
+    Each event is serialized once when its transaction commits and fanned
+    out to every matching subscriber. Event ids are "<epoch>-<seq>" where
+    the epoch changes on every process start; the last `replay_size` events
+    are kept so a client reconnecting with Last-Event-ID from this epoch
+    gets what it missed, and one from another epoch is told to refetch.
+    Only events created in this process are seen: run one ASGI worker, or
+    one hub per worker behind sticky connections.
+    """
+
+    def __init__(self, replay_size=256, queue_size=100):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._seq = 0
+        # Events up to this seq were never buffered (nobody was listening)
+        self._gap_seq = 0
+        self._replay = deque(maxlen=replay_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, data):
+        with self._lock:
+            self._seq += 1
+            event = {'id': f"{self.epoch}-{self._seq}", 'seq': self._seq, 'data': data}
+            self._replay.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.wants(event):
+                subscriber.deliver(event)
+        return event
+
+    def skip(self):
+        """Count an event that was not published because nobody was subscribed"""
+        with self._lock:
+            self._seq += 1
+            self._gap_seq = self._seq
+
+    def subscribe(self, types=None, collection=None, last_event_id=None, loop=None):
+        """
+        Register a client; returns (subscription, missed) where missed is the
+        list of buffered events after last_event_id, or None when they cannot
+        be replayed (other epoch or fell out of the buffer) and the client
+        should refetch.
+        """
+        subscription = Subscription(types, collection, self.queue_size, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+            missed = self._missed(last_event_id)
+        if missed:
+            missed = [event for event in missed if subscription.wants(event)]
+        return subscription, missed
+
+    def _missed(self, last_event_id):
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        first_kept = self._replay[0]['seq'] if self._replay else self._seq + 1
+        if seq > self._seq or seq < self._gap_seq or seq < first_kept - 1:
+            return None
+        return [event for event in self._replay if event['seq'] > seq]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+hub = ActivityHub(
+    replay_size=getattr(settings, 'ACTIVITY_STREAM_REPLAY', 256),
+    queue_size=getattr(settings, 'ACTIVITY_STREAM_QUEUE_SIZE', 100),
+)
+
+
+def activity_payloads(activities, now=None):
+    """activity_payload for each transaction, looking up every username and avatar in one query"""
+    from .models import UserProfile
+    from .thumbnails import list_avatar_url
+    addresses = {activity.from_address for activity in activities} | {activity.to_address for activity in activities}
+    profiles = {
+        address: (username, list_avatar_url(variants) or avatar_url)
+        for address, username, avatar_url, variants in UserProfile.objects.filter(wallet_address__in=addresses)
+        .values_list('wallet_address', 'username', 'avatar_url', 'avatar_variants')
+    }
+    payloads = []
+    for activity in activities:
+        from_name, from_avatar = profiles.get(activity.from_address, (None, None))
+        to_name, to_avatar = profiles.get(activity.to_address, (None, None))
+        payloads.append(activity_payload(
+            activity,
+            from_name or f"User{activity.from_address[-4:]}",
+            to_name or f"User{activity.to_address[-4:]}",
+            now,
+            from_avatar,
+            to_avatar,
+        ))
+    return payloads
+
+
+def publish_transaction(tx):
+    """Serialize a committed transaction once and broadcast it"""
+    hub.publish(activity_payloads([tx])[0])
+
+
+def on_transaction_saved(sender, instance, created, **kwargs):
+    """post_save hook: broadcast new transactions once they commit (nothing to do with no clients)"""
+    if not created:
+        return
+    if hub.subscriber_count:
+        transaction.on_commit(lambda: _safe_publish(instance))
+    else:
+        hub.skip()
+
+
+def _safe_publish(tx):
+    try:
+        publish_transaction(tx)
+    except Exception:
+        logger.exception("Failed to publish activity %s", tx.pk)
+
+
+def parse_filters(params):
+    """(types, collection) from ?type=buy,list&collection=... query parameters"""
+    types = [t for t in params.get('type', '').split(',') if t and t != 'all']
+    return types or None, params.get('collection') or None
+
+
+# Server-Sent Events
+
+def sse_format(event_id, event, data):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _reset_message():
+    return sse_format(None, 'reset', {'reason': 'missed events; refetch /api/activities/'})
+
+
+async def sse_events(types, collection, last_event_id):
+    """Async SSE body for ASGI servers"""
+    subscription, missed = hub.subscribe(types, collection, last_event_id, loop=asyncio.get_running_loop())
+    try:
+        yield "retry: 3000\n\n"
+        if missed is None:
+            yield _reset_message()
+        for event in missed or ():
+            yield sse_format(event['id'], 'activity', event['data'])
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if subscription.lagged:
+                subscription.drain()
+                yield _reset_message()
+                continue
+            yield sse_format(event['id'], 'activity', event['data'])
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def sse_events_sync(types, collection, last_event_id):
+    """Blocking SSE body for WSGI servers (holds one worker thread per client)"""
+    subscription, missed = hub.subscribe(types, collection, last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        if missed is None:
+            yield _reset_message()
+        for event in missed or ():
+            yield sse_format(event['id'], 'activity', event['data'])
+        while True:
+            try:
+                event = subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if subscription.lagged:
+                subscription.drain()
+                yield _reset_message()
+                continue
+            yield sse_format(event['id'], 'activity', event['data'])
+    finally:
+        hub.unsubscribe(subscription)
+
+
+# WebSocket (plain ASGI, routed in backend/asgi.py)
+
+WEBSOCKET_PATH = '/ws/activities/'
+
+
+async def activity_websocket(scope, receive, send):
+    """
+    ws://host/ws/activities/?type=buy,list&collection=X&last_event_id=...
+    Sends {"event": "activity"|"reset", "id": ..., "data": ...} text frames.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    params = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+    types, collection = parse_filters(params)
+    await send({'type': 'websocket.accept'})
+
+    subscription, missed = hub.subscribe(types, collection, params.get('last_event_id'),
+                                         loop=asyncio.get_running_loop())
+
+    async def send_json(payload):
+        await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+    async def pump():
+        if missed is None:
+            await send_json({'event': 'reset', 'id': None, 'data': None})
+        for event in missed or ():
+            await send_json({'event': 'activity', 'id': event['id'], 'data': event['data']})
+        while True:
+            event = await subscription.queue.get()
+            if subscription.lagged:
+                subscription.drain()
+                await send_json({'event': 'reset', 'id': None, 'data': None})
+                continue
+            await send_json({'event': 'activity', 'id': event['id'], 'data': event['data']})
+
+    pump_task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+    finally:
+        pump_task.cancel()
+        hub.unsubscribe(subscription)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class NftConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nft'
+
+    def ready(self):
+        from django.db.models.signals import post_save
+        from . import activity_stream, auctions, timeline
+        post_save.connect(activity_stream.on_transaction_saved, sender='nft.Transaction',
+                          dispatch_uid='nft.activity_stream')
+        post_save.connect(timeline.on_transaction_saved, sender='nft.Transaction', dispatch_uid='nft.timeline')
+        post_save.connect(auctions.on_nft_saved, sender='nft.NFT', dispatch_uid='nft.auctions')
@@ -0,0 +1,395 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import NFT, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Longest window get_activities/get_activity_stats serve from the hot table
+MIN_HORIZON_DAYS = 30
+
+ARCHIVE_BATCH_SIZE = 50_000
+
+# Ids per DELETE statement (stays under SQLite's 999 variable limit)
+DELETE_CHUNK = 900
+
+MANIFEST_VERSION = 1
+
+# Transaction types counted as sales of an NFT (see nft_stats)
+SALE_TYPES = ('buy', 'sale')
+
+
+class ArchivedNFT:
+    """NFT fields captured when a transaction was archived"""
+
+    def __init__(self, data):
+        self.id = data['id']
+        self.token_id = data['token_id']
+        self.name = data['name']
+        self.image_url = data['image_url']
+        self.collection = data['collection']
+
+
+class ArchivedTransaction:
+    """Read-only stand-in for a Transaction row read back from the archive"""
+
+    def __init__(self, record):
+        self.id = record['id']
+        self.transaction_hash = record['transaction_hash']
+        self.nft_id = record['nft_id']
+        self.nft = ArchivedNFT(record['nft']) if record['nft'] else None
+        self.from_address = record['from_address']
+        self.to_address = record['to_address']
+        self.transaction_type = record['transaction_type']
+        self.price = Decimal(record['price']) if record['price'] is not None else None
+        self.block_number = record['block_number']
+        self.gas_used = record['gas_used']
+        self.gas_price = Decimal(record['gas_price']) if record['gas_price'] is not None else None
+        self.timestamp = datetime.fromisoformat(record['timestamp'])
+        self.created_at = datetime.fromisoformat(record['created_at'])
+
+    def matches(self, search):
+        """Same fields as the hot-table search in get_activities (case-insensitive substring)"""
+        needle = search.lower()
+        fields = [self.from_address, self.to_address]
+        if self.nft:
+            fields += [self.nft.name, self.nft.collection]
+        return any(needle in value.lower() for value in fields if value)
+
+
+def _to_record(tx):
+    nft = tx.nft
+    return {
+        'id': tx.id,
+        'transaction_hash': tx.transaction_hash,
+        'nft_id': tx.nft_id,
+        'nft': {
+            'id': nft.id,
+            'token_id': nft.token_id,
+            'name': nft.name,
+            'image_url': nft.image_url,
+            'collection': nft.collection,
+        } if nft else None,
+        'from_address': tx.from_address,
+        'to_address': tx.to_address,
+        'transaction_type': tx.transaction_type,
+        'price': str(tx.price) if tx.price is not None else None,
+        'block_number': tx.block_number,
+        'gas_used': tx.gas_used,
+        'gas_price': str(tx.gas_price) if tx.gas_price is not None else None,
+        'timestamp': tx.timestamp.isoformat(),
+        'created_at': tx.created_at.isoformat(),
+    }
+
+
+def fold_sales(sales, nft_model=NFT):
+    """
+    Add archived sales, as (nft_id, price, timestamp), to their NFTs'
+    archived_sales_volume and archived_last_sale_price/_at. Returns the
+    number of NFTs touched.
+    """
+    totals = {}
+    for nft_id, price, timestamp in sales:
+        if nft_id is None:
+            continue
+        volume, last_price, last_at = totals.get(nft_id, (Decimal(0), None, None))
+        if last_at is None or timestamp > last_at:
+            last_price, last_at = price, timestamp
+        totals[nft_id] = (volume + (price or 0), last_price, last_at)
+    for nft_id, (volume, last_price, last_at) in totals.items():
+        nfts = nft_model.objects.filter(id=nft_id)
+        nfts.update(archived_sales_volume=F('archived_sales_volume') + volume)
+        nfts.filter(Q(archived_last_sale_at__isnull=True) | Q(archived_last_sale_at__lt=last_at)).update(
+            archived_last_sale_price=last_price, archived_last_sale_at=last_at)
+    return len(totals)
+
+
+def _next_month(moment):
+    return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class TransactionArchive:
+    """
+    Gzipped NDJSON archive of old transactions.
+
+    Layout under `root`:
+        manifest.json                  parts with row counts, per-type counts,
+                                       time/id ranges and checksums
+        YYYY/MM/part-<min>-<max>.ndjson.gz
+                                       one JSON record per line, newest first
+
+    A part is written and its rows deleted from the hot table in one database
+    transaction; the manifest is updated after the commit. recover() settles
+    parts left behind by a crash between the two.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.TRANSACTION_ARCHIVE_DIR)
+        self.manifest_path = self.root / 'manifest.json'
+        self._manifest = None
+        self._manifest_mtime = None
+
+    # Manifest
+
+    def manifest(self):
+        """Current manifest, re-read when the file changes on disk"""
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {'version': MANIFEST_VERSION, 'parts': []}
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path) as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _write_manifest(self, manifest):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def _add_parts(self, parts):
+        manifest = dict(self.manifest())
+        manifest['parts'] = manifest['parts'] + parts
+        self._write_manifest(manifest)
+
+    def parts(self):
+        """Manifest parts, newest first"""
+        return sorted(self.manifest()['parts'], key=lambda part: part['max_timestamp'], reverse=True)
+
+    # Writing
+
+    def archive_before(self, cutoff, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+        """
+        Move transactions with timestamp < cutoff into the archive, one part
+        (at most batch_size rows) per database transaction. Returns a summary
+        dict with the rows and parts written per month.
+        """
+        summary = {'rows': 0, 'parts': 0, 'months': {}}
+        old = Transaction.objects.filter(timestamp__lt=cutoff)
+        if dry_run:
+            for month in old.dates('timestamp', 'month'):
+                start = timezone.make_aware(datetime(month.year, month.month, 1))
+                count = old.filter(timestamp__gte=start, timestamp__lt=_next_month(start)).count()
+                summary['months'][month.strftime('%Y-%m')] = count
+                summary['rows'] += count
+            return summary
+
+        with self._lock():
+            self.recover()
+            for month in old.dates('timestamp', 'month'):
+                start = timezone.make_aware(datetime(month.year, month.month, 1))
+                in_month = (old.filter(timestamp__gte=start, timestamp__lt=_next_month(start))
+                            .select_related('nft').order_by('-timestamp', '-id'))
+                key = month.strftime('%Y-%m')
+                while True:
+                    part = self._archive_part(key, in_month, batch_size)
+                    if part is None:
+                        break
+                    self._add_parts([part])
+                    summary['rows'] += part['rows']
+                    summary['parts'] += 1
+                    summary['months'][key] = summary['months'].get(key, 0) + part['rows']
+                    logger.info("Archived %s rows of %s into %s", part['rows'], key, part['path'])
+        return summary
+
+    def _archive_part(self, month, queryset, batch_size):
+        with transaction.atomic():
+            rows = list(queryset[:batch_size])
+            if not rows:
+                return None
+            ids = [row.id for row in rows]
+            relative = Path(month[:4]) / month[5:] / f"part-{min(ids)}-{max(ids)}.ndjson.gz"
+            path = self.root / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + '.tmp')
+            type_counts = {}
+            with open(tmp, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as gz:
+                    for row in rows:
+                        gz.write(json.dumps(_to_record(row), separators=(',', ':')).encode() + b'\n')
+                        type_counts[row.transaction_type] = type_counts.get(row.transaction_type, 0) + 1
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp, path)
+            for i in range(0, len(ids), DELETE_CHUNK):
+                Transaction.objects.filter(id__in=ids[i:i + DELETE_CHUNK]).delete()
+            # Per-NFT stats keep counting these sales once they leave the hot table
+            fold_sales((row.nft_id, row.price, row.timestamp) for row in rows if row.transaction_type in SALE_TYPES)
+        return self._describe_part(relative, rows=len(rows), type_counts=type_counts,
+                                   min_timestamp=rows[-1].timestamp.isoformat(),
+                                   max_timestamp=rows[0].timestamp.isoformat(),
+                                   min_id=min(ids), max_id=max(ids))
+
+    def _describe_part(self, relative, **fields):
+        path = self.root / relative
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return {
+            'path': relative.as_posix(),
+            'month': f"{relative.parts[0]}-{relative.parts[1]}",
+            'bytes': path.stat().st_size,
+            'sha256': digest.hexdigest(),
+            **fields,
+        }
+
+    def recover(self):
+        """
+        Settle part files missing from the manifest: if their rows are gone
+        from the hot table the delete committed and the part is registered,
+        if the rows are all still there it is removed. Returns the number of
+        parts registered.
+        """
+        known = {part['path'] for part in self.manifest()['parts']}
+        registered = []
+        for path in sorted(self.root.glob('*/*/part-*.ndjson.gz')):
+            relative = path.relative_to(self.root)
+            if relative.as_posix() in known:
+                continue
+            records = list(self._read_file(path))
+            ids = [record['id'] for record in records]
+            remaining = sum(
+                Transaction.objects.filter(id__in=ids[i:i + DELETE_CHUNK]).count()
+                for i in range(0, len(ids), DELETE_CHUNK)
+            )
+            if remaining == 0 and records:
+                type_counts = {}
+                for record in records:
+                    type_counts[record['transaction_type']] = type_counts.get(record['transaction_type'], 0) + 1
+                registered.append(self._describe_part(
+                    relative, rows=len(records), type_counts=type_counts,
+                    min_timestamp=records[-1]['timestamp'], max_timestamp=records[0]['timestamp'],
+                    min_id=min(ids), max_id=max(ids),
+                ))
+                logger.warning("Registered orphaned archive part %s", relative)
+            elif remaining == len(ids):
+                path.unlink()
+                logger.warning("Removed archive part %s from an uncommitted run", relative)
+            else:
+                logger.error("Archive part %s is only partly archived; leaving it for inspection", relative)
+        for tmp in self.root.glob('*/*/part-*.ndjson.gz.tmp'):
+            tmp.unlink()
+        if registered:
+            self._add_parts(registered)
+        return len(registered)
+
+    def _lock(self):
+        return _ArchiveLock(self.root / '.lock')
+
+    # Reading
+
+    def _read_file(self, path):
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _part_count(self, part, transaction_type):
+        if transaction_type:
+            return part['type_counts'].get(transaction_type, 0)
+        return part['rows']
+
+    def iter_transactions(self, transaction_type=None, search=None, parts=None):
+        """Archived transactions, newest part first, optionally filtered like get_activities"""
+        for part in parts if parts is not None else self.parts():
+            if transaction_type and not part['type_counts'].get(transaction_type):
+                continue
+            for record in self._read_file(self.root / part['path']):
+                if transaction_type and record['transaction_type'] != transaction_type:
+                    continue
+                tx = ArchivedTransaction(record)
+                if search and not tx.matches(search):
+                    continue
+                yield tx
+
+    def count(self, transaction_type=None, search=None):
+        """Matching archived rows; answered from the manifest unless searching"""
+        if search:
+            return sum(1 for _ in self.iter_transactions(transaction_type, search))
+        return sum(self._part_count(part, transaction_type) for part in self.parts())
+
+    def slice(self, offset, limit, transaction_type=None, search=None):
+        """`limit` matching archived rows after skipping `offset`, newest first"""
+        parts = self.parts()
+        if not search:
+            # Skip whole parts using their counts instead of decompressing them
+            while parts and offset >= self._part_count(parts[0], transaction_type):
+                offset -= self._part_count(parts[0], transaction_type)
+                parts = parts[1:]
+        rows = []
+        for tx in self.iter_transactions(transaction_type, search, parts):
+            if offset:
+                offset -= 1
+                continue
+            rows.append(tx)
+            if len(rows) >= limit:
+                break
+        return rows
+
+
+class _ArchiveLock:
+    """Exclusive lock file so two archive runs never interleave"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise RuntimeError(f"Archive is locked by another run (remove {self.path} if that run died)")
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return self
+
+    def __exit__(self, *exc):
+        self.path.unlink(missing_ok=True)
+
+
+def all_time_page(hot_queryset, page, limit, transaction_type=None, search=None, archive=None):
+    """
+    One page of an "all time" listing: the hot table (already filtered and
+    ordered newest first) followed by the archive. Returns (rows, pagination)
+    with the same pagination keys get_activities uses.
+    """
+    archive = archive or TransactionArchive()
+    try:
+        limit = max(1, int(limit))
+    except (TypeError, ValueError):
+        limit = 20
+    try:
+        page = max(1, int(page))
+    except (TypeError, ValueError):
+        page = 1
+    hot_count = hot_queryset.count()
+    total = hot_count + archive.count(transaction_type, search)
+    num_pages = max(1, math.ceil(total / limit))
+    page = min(page, num_pages)
+    offset = (page - 1) * limit
+
+    rows = list(hot_queryset[offset:offset + limit]) if offset < hot_count else []
+    if len(rows) < limit:
+        rows += archive.slice(max(0, offset - hot_count), limit - len(rows), transaction_type, search)
+    return rows, {
+        'page': page,
+        'total_pages': num_pages,
+        'total_items': total,
+        'has_next': page < num_pages,
+        'has_previous': page > 1,
+    }
@@ -0,0 +1,179 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from .models import NFT
+from .web3_utils import web3_instance
+
+logger = logging.getLogger(__name__)
+
+# Auctions closed per statement when many end at once
+CLOSE_BATCH_SIZE = 500
+# Seconds between re-reads of the open-auctions index, which is how the
+# scheduler learns about auctions listed or extended by other processes
+RELOAD_INTERVAL = getattr(settings, 'AUCTION_SCHEDULER_RELOAD', 30)
+
+
+def open_auctions():
+    """Auctions still waiting to close; a range of the nfts_open_auctions_idx partial index"""
+    return NFT.objects.filter(is_auction=True, auction_closed_at__isnull=True, auction_end_time__isnull=False)
+
+
+def close_due_auctions(now=None, limit=CLOSE_BATCH_SIZE):
+    """
+    Close up to `limit` auctions whose end time has passed: stamp
+    auction_closed_at and take them off sale, then settle them (see
+    settle_auctions). The scheduler and close_auctions (from cron, or
+    while a new scheduler starts up) can overlap, so closers race:
+    due rows are locked with SKIP LOCKED where the database has row locks
+    (SQLite's IMMEDIATE transactions serialize closers instead), and each
+    row is only stamped while still open, so a row another closer got to
+    first is neither closed nor settled twice. Returns the token ids this
+    call closed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = open_auctions().filter(auction_end_time__lte=now).order_by('auction_end_time')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        due = list(due.values_list('id', 'token_id')[:limit])
+        # One guarded UPDATE per row: its row count says whether this closer won it
+        token_ids = [token_id for nft_id, token_id in due
+                     if NFT.objects.filter(id=nft_id, auction_closed_at__isnull=True).update(
+                         auction_closed_at=now, is_listed=False, updated_at=now)]
+    if not token_ids:
+        return []
+    logger.info("Closed %d auctions", len(token_ids))
+    settle_auctions(token_ids)
+    return token_ids
+
+
+def settle_auctions(token_ids):
+    """
+    Send endAuction for closed auctions when a settler key is configured
+    (AUCTION_SETTLER_PRIVATE_KEY), recording each transaction hash. Without
+    one they stay pending settlement (auction_settle_tx null) for the
+    seller, winner or `close_auctions --settle`. Returns the number sent.
+    """
+    if not token_ids or not os.getenv('AUCTION_SETTLER_PRIVATE_KEY'):
+        return 0
+    try:
+        hashes = web3_instance.end_auctions(token_ids)
+    except Exception:
+        logger.exception("Could not settle %d auctions", len(token_ids))
+        return 0
+    sent = {token_id: tx_hash for token_id, tx_hash in hashes.items() if tx_hash}
+    nfts = list(NFT.objects.filter(token_id__in=list(sent)).only('id', 'token_id'))
+    for nft in nfts:
+        nft.auction_settle_tx = sent[nft.token_id]
+    NFT.objects.bulk_update(nfts, ['auction_settle_tx'])
+    return len(sent)
+
+
+def pending_settlement():
+    """Closed auctions no endAuction has been sent for"""
+    return NFT.objects.filter(is_auction=True, auction_closed_at__isnull=False, auction_settle_tx__isnull=True)
+
+
+class AuctionScheduler:
+    """
+    Closes auctions when they end, without polling: a min-heap of
+    (end time, nft id) says how long to sleep, and the thread is woken early
+    when an auction ending sooner than the current head is scheduled. What
+    to close is always read back from the open-auctions index, so heap
+    entries for auctions that were extended or cancelled meanwhile only
+    cause a spurious wake-up.
+    """
+
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        """Whether the scheduler thread was started in this process"""
+        return self._thread is not None
+
+    def load(self):
+        """Rebuild the heap from the open-auctions index"""
+        entries = [(end.timestamp(), nft_id) for nft_id, end in
+                   open_auctions().values_list('id', 'auction_end_time').iterator()]
+        heapq.heapify(entries)
+        with self._cond:
+            self._heap = entries
+            self._cond.notify()
+        return len(entries)
+
+    def schedule(self, nft_id, end_time):
+        """Make sure the scheduler wakes up at end_time (a listing or an extension)"""
+        with self._cond:
+            deadline = end_time.timestamp()
+            heapq.heappush(self._heap, (deadline, nft_id))
+            if self._heap[0] == (deadline, nft_id):
+                self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self.load()
+            self._thread = threading.Thread(target=self.run, name='auction-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the thread, waiting up to timeout seconds for it to finish closing"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        next_load = time.time() + self.reload_interval
+        while True:
+            with self._cond:
+                while not self._stopping and time.time() < next_load and (
+                        not self._heap or self._heap[0][0] > time.time()):
+                    self._cond.wait(min(self._heap[0][0] if self._heap else next_load, next_load) - time.time())
+                if self._stopping:
+                    return
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    heapq.heappop(self._heap)
+            try:
+                if now >= next_load:
+                    self.load()
+                    next_load = time.time() + self.reload_interval
+                while len(close_due_auctions()) == CLOSE_BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("Failed to close auctions")
+                # Try again shortly rather than dropping the deadline
+                with self._cond:
+                    heapq.heappush(self._heap, (time.time() + 1, 0))
+            finally:
+                connections.close_all()
+
+
+# Started by `manage.py run_auction_scheduler`, once per deployment
+scheduler = AuctionScheduler()
+
+
+def schedule_auctions(nfts):
+    """Hand the open auctions among nfts to the scheduler (if it runs in this process)"""
+    if not scheduler.running:
+        return
+    for nft in nfts:
+        if nft.is_auction and nft.auction_end_time and nft.auction_closed_at is None:
+            scheduler.schedule(nft.pk, nft.auction_end_time)
+
+
+def on_nft_saved(sender, instance, **kwargs):
+    """post_save hook: wake the scheduler for new or extended auctions once they commit"""
+    if scheduler.running and instance.is_auction and instance.auction_end_time:
+        transaction.on_commit(lambda: schedule_auctions([instance]))
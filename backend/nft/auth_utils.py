@@ -1,28 +1,36 @@
+import hashlib
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import UserProfile
 
+
+def wallet_username(wallet_address):
+    """Stable auth username for a wallet address"""
+    return f"user_{hashlib.md5(wallet_address.encode()).hexdigest()[:12]}"
+
+
 def get_or_create_web3_user(wallet_address):
     """
-    Get or create a User and UserProfile for a Web3 wallet address
+    Get or create the User and UserProfile for a Web3 wallet address.
+
+    Wallet users never log in with a password, so the User gets an unusable
+    password marker (make_password(None)) instead of going through
+    create_user(), which runs a full PBKDF2 hash. Both rows are inserted
+    with ignore_conflicts, so concurrent first visits for the same wallet
+    all end up reading the same profile instead of failing on the unique
+    constraint. Returns the UserProfile.
     """
-    # Create or get a user for this wallet address
-    username = f"user_{wallet_address[:8]}"
-    user, user_created = User.objects.get_or_create(
-        username=username,
-        defaults={
-            'email': f"{username}@example.com"
-        }
-    )
-    
-    if user_created:
-        # Set an unusable password since these users won't login traditionally
-        user.set_unusable_password()
-        user.save()
-    
-    # Get or create the profile
-    profile, profile_created = UserProfile.objects.get_or_create(
-        wallet_address=wallet_address,
-        defaults={'user': user}
-    )
-    
-    return profile, profile_created
+    profile = UserProfile.objects.filter(wallet_address=wallet_address).first()
+    if profile is not None:
+        return profile
+
+    username = wallet_username(wallet_address)
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=username, email=f"{username}@example.com", password=make_password(None)),
+        ], ignore_conflicts=True)
+        UserProfile.objects.bulk_create([
+            UserProfile(wallet_address=wallet_address, username=f"User{wallet_address[-4:]}"),
+        ], ignore_conflicts=True)
+    return UserProfile.objects.get(wallet_address=wallet_address)
@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from django.conf import settings
+from .chain_sync import CONFIRMATIONS, JOURNAL_SIZE, apply_range, read_range, synced_block
+from .web3_utils import web3_instance
+
+logger = logging.getLogger(__name__)
+
+# Blocks fetched by one worker task and applied in one transaction
+SHARD_SIZE = 10000
+WORKERS = os.cpu_count() or 4
+# Requests per second each worker may send, to stay under the provider's limits
+RPC_RATE = getattr(settings, 'CHAIN_BACKFILL_RPC_RATE', 10)
+# Workers only talk to the node; a fresh interpreter keeps the parent's
+# database connections and HTTP sessions out of them
+MP_CONTEXT = 'spawn'
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart (no limit for rate <= 0)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+_limiter = None
+
+
+def _init_worker(rate):
+    global _limiter
+    import django
+    django.setup()
+    _limiter = RateLimiter(rate)
+
+
+def fetch_shard(start, end, journal_from):
+    """Worker task: read_range() for one shard, throttled to the worker's RPC rate"""
+    events, headers = read_range(start, end, journal_from, throttle=_limiter.wait if _limiter else None)
+    return start, end, events, headers
+
+
+def shards(start, end, shard_size=SHARD_SIZE):
+    return [(shard_start, min(shard_start + shard_size - 1, end)) for shard_start in range(start, end + 1, shard_size)]
+
+
+def backfill(to_block=None, shard_size=SHARD_SIZE, workers=WORKERS, rpc_rate=RPC_RATE, confirmations=CONFIRMATIONS):
+    """
+    Ingest the history between the last ingested block and to_block
+    (default: the confirmed head) with logs fetched and decoded by a pool of
+    processes, `workers` shards at a time. Shards are applied here, strictly
+    in block order and one transaction each, through the same path as
+    sync(), so a restart continues after the last applied shard. Yields
+    (shard start, shard end, events) as each shard is applied.
+    """
+    head = web3_instance.get_latest_block()
+    if head is None:
+        raise ConnectionError("Could not read the latest block")
+    end = head - confirmations if to_block is None else min(head - confirmations, to_block)
+    start = synced_block() + 1
+    if start > end:
+        return
+    # Only the newest blocks are worth journaling; sync() takes over from here
+    journal_from = end - JOURNAL_SIZE + 1
+    todo = deque(shards(start, end, shard_size))
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context(MP_CONTEXT),
+                               initializer=_init_worker, initargs=(rpc_rate,))
+    try:
+        pending = deque()
+        while todo or pending:
+            # Keep every worker busy while the oldest shard is applied
+            while todo and len(pending) < 2 * workers:
+                shard_start, shard_end = todo.popleft()
+                pending.append(pool.submit(fetch_shard, shard_start, shard_end, journal_from))
+            shard_start, shard_end, events, headers = pending.popleft().result()
+            count = apply_range(shard_start, shard_end, journal_from, events, headers, notify=False)
+            yield shard_start, shard_end, count
+    finally:
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,425 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_save
+from . import abi_registry
+from .auctions import schedule_auctions
+from .fields import normalize_address
+from .models import NFT, ChainBlock, Transaction
+from .profile_stats import apply_profile_deltas
+from .rarity import collection_key, index_many_in_background, index_pairs, schedule_rank, unindex_nft
+from .web3_utils import ZERO_ADDRESS, from_wei, web3_instance
+
+logger = logging.getLogger(__name__)
+
+CONFIRMATIONS = getattr(settings, 'CHAIN_CONFIRMATIONS', 12)
+START_BLOCK = getattr(settings, 'CHAIN_START_BLOCK', 0)
+JOURNAL_SIZE = getattr(settings, 'CHAIN_JOURNAL_SIZE', 128)
+# Blocks per eth_getLogs call and per database transaction
+LOG_RANGE = 2000
+# Journaled hashes compared with the chain per request while looking for a fork
+FORK_PROBE = 32
+# Block headers per batched request
+HEADER_BATCH = 500
+
+# The Transaction row recorded for a chain transaction takes its type from
+# the most telling event it emitted (a sale also emits Transfer, a mint
+# Transfer and NFTMinted, ...), earliest in this list first
+EVENT_PRECEDENCE = ('NFTSold', 'NFTMinted', 'Transfer', 'AuctionEnded', 'NFTListed', 'BidPlaced', 'NFTDelisted')
+
+
+class ReorgTooDeep(RuntimeError):
+    """No journaled block is on the canonical chain any more; only a full resync can recover"""
+
+
+class ChainMoved(RuntimeError):
+    """The chain reorganised while a range was being read; the next pass rolls it back"""
+
+
+def decode_logs(logs):
+    """
+    (block, log index, tx hash, event name, args) for every marketplace
+    event among raw logs, in chain order
+    """
+    return abi_registry.registry().decode_logs(logs)
+
+
+def synced_block():
+    """Last block ingested (START_BLOCK - 1 before the first pass)"""
+    last = ChainBlock.objects.aggregate(last=Max('number'))['last']
+    return START_BLOCK - 1 if last is None else last
+
+
+def _empty_undo():
+    return {'nfts': {}, 'created_nfts': [], 'transactions': [], 'profiles': defaultdict(lambda: defaultdict(int)),
+            # token_id -> [(trait_type, value)] taken out of the rarity index by a burn
+            'unindexed': {}}
+
+
+class RangeIngest:
+    """
+    Applies the events of a block range to NFT, Transaction and profile
+    rows, keeping per block what it takes to undo them (ChainBlock.undo)
+    """
+
+    def __init__(self, events, headers):
+        self.events = events
+        self.timestamps = {number: datetime.fromtimestamp(header[2], dt_timezone.utc)
+                           for number, header in headers.items()}
+        self.contract = normalize_address(web3_instance.contract_address)
+        self.nfts = NFT.objects.in_bulk({event[4]['tokenId'] for event in events if 'tokenId' in event[4]},
+                                        field_name='token_id')
+        # token_id -> block it was first seen minted in, for NFTs created here
+        self.created = {}
+        # token_id -> block it was burned in
+        self.burned = {}
+        self.changed = set()
+        self.changed_fields = set()
+        self.undo = defaultdict(_empty_undo)
+        self.deltas = defaultdict(lambda: defaultdict(int))
+        # tx hash -> [(precedence, block, Transaction kwargs)]
+        self.activity = defaultdict(list)
+
+    def run(self):
+        for block, _, tx_hash, name, args in self.events:
+            handler = getattr(self, f'on_{name}', None)
+            nft = self.nfts.get(args.get('tokenId'))
+            if handler is None or (nft is None and name != 'Transfer'):
+                continue
+            handler(block, tx_hash, nft, args)
+
+    def _set(self, block, nft, field, value):
+        old = getattr(nft, field)
+        if old == value:
+            return
+        # NFTs created in this block are undone by deleting them
+        if self.created.get(nft.token_id) != block:
+            self.undo[block]['nfts'].setdefault(str(nft.token_id), {}).setdefault(field, old)
+        setattr(nft, field, value)
+        self.changed.add(nft.token_id)
+        self.changed_fields.add(field)
+
+    def _delta(self, block, address, field, amount):
+        self.deltas[address][field] += amount
+        self.undo[block]['profiles'][address][field] += amount
+
+    def _record(self, name, block, tx_hash, nft, from_address, to_address, price=None):
+        self.activity[tx_hash].append((EVENT_PRECEDENCE.index(name), block, {
+            'nft': nft, 'from_address': from_address, 'to_address': to_address, 'price': price,
+        }))
+
+    def _move(self, block, nft, to_address):
+        if not nft.is_burned and nft.owner_address != to_address:
+            self._delta(block, nft.owner_address, 'nfts_owned', -1)
+            self._delta(block, to_address, 'nfts_owned', 1)
+            self._set(block, nft, 'owner_address', to_address)
+
+    def on_Transfer(self, block, tx_hash, nft, args):
+        token_id, sender, receiver = args['tokenId'], normalize_address(args['from']), normalize_address(args['to'])
+        if sender == ZERO_ADDRESS:
+            if nft is None:
+                # Minted without being registered here: a placeholder, as sync_blockchain creates
+                nft = self.nfts[token_id] = NFT(
+                    token_id=token_id, name=f'NFT #{token_id}', description=f'Token ID: {token_id}',
+                    image_url='', token_uri='', owner_address=receiver, creator_address=receiver,
+                )
+                self.created[token_id] = block
+                self.undo[block]['created_nfts'].append(token_id)
+                self._delta(block, receiver, 'nfts_created', 1)
+                self._delta(block, receiver, 'total_created', 1)
+                self._delta(block, receiver, 'nfts_owned', 1)
+            else:
+                self._move(block, nft, receiver)
+            self._record('Transfer', block, tx_hash, nft, ZERO_ADDRESS, receiver)
+        elif nft is None:
+            return
+        elif receiver == ZERO_ADDRESS:
+            if not nft.is_burned:
+                self._delta(block, nft.owner_address, 'nfts_owned', -1)
+                self._delta(block, nft.creator_address, 'nfts_created', -1)
+                self._set(block, nft, 'is_burned', True)
+                self._set(block, nft, 'burned_at', self.timestamps[block])
+                self._set(block, nft, 'is_listed', False)
+                self.burned[nft.token_id] = block
+            self._record('Transfer', block, tx_hash, nft, sender, ZERO_ADDRESS)
+        else:
+            self._move(block, nft, receiver)
+            self._record('Transfer', block, tx_hash, nft, sender, receiver)
+
+    def on_NFTMinted(self, block, tx_hash, nft, args):
+        if nft.token_id in self.created:
+            self._set(block, nft, 'token_uri', args['tokenURI'])
+            self._set(block, nft, 'image_url', args['tokenURI'])
+            # Basis points on-chain, a percentage here
+            self._set(block, nft, 'royalty_percentage', Decimal(args['royaltyPercentage']) / 100)
+        self._record('NFTMinted', block, tx_hash, nft, ZERO_ADDRESS, normalize_address(args['creator']))
+
+    def on_NFTListed(self, block, tx_hash, nft, args):
+        seller = normalize_address(args['seller'])
+        price = from_wei(args['price'])
+        for field, value in (('is_listed', True), ('price', price), ('is_auction', args['isAuction']),
+                             ('current_bid', None), ('highest_bidder', None),
+                             ('auction_closed_at', None), ('auction_settle_tx', None)):
+            self._set(block, nft, field, value)
+        if not args['isAuction']:
+            self._set(block, nft, 'auction_end_time', None)
+        self._record('NFTListed', block, tx_hash, nft, seller, self.contract, price)
+
+    def on_AuctionCreated(self, block, tx_hash, nft, args):
+        self._set(block, nft, 'auction_end_time', self.timestamps[block] + timedelta(seconds=args['duration']))
+
+    def on_BidPlaced(self, block, tx_hash, nft, args):
+        bidder, amount = normalize_address(args['bidder']), from_wei(args['amount'])
+        self._set(block, nft, 'current_bid', amount)
+        self._set(block, nft, 'highest_bidder', bidder)
+        self._record('BidPlaced', block, tx_hash, nft, bidder, nft.owner_address, amount)
+
+    def on_NFTSold(self, block, tx_hash, nft, args):
+        seller, buyer, price = normalize_address(args['seller']), normalize_address(args['buyer']), from_wei(args['price'])
+        self._set(block, nft, 'is_listed', False)
+        self._delta(block, buyer, 'total_collected', 1)
+        self._delta(block, buyer, 'total_volume', price)
+        self._delta(block, seller, 'total_volume', price)
+        self._record('NFTSold', block, tx_hash, nft, seller, buyer, price)
+
+    def on_AuctionEnded(self, block, tx_hash, nft, args):
+        self._set(block, nft, 'is_listed', False)
+        if nft.auction_closed_at is None:
+            self._set(block, nft, 'auction_closed_at', self.timestamps[block])
+        self._set(block, nft, 'auction_settle_tx', tx_hash)
+        # With a winner NFTSold is recorded instead
+        self._record('AuctionEnded', block, tx_hash, nft, self.contract, nft.owner_address)
+
+    def on_NFTDelisted(self, block, tx_hash, nft, args):
+        seller = normalize_address(args['seller'])
+        self._set(block, nft, 'is_listed', False)
+        self._record('NFTDelisted', block, tx_hash, nft, self.contract, seller)
+
+    def save(self, notify):
+        """Write everything in the caller's transaction; returns the new Transaction rows"""
+        created = [nft for token_id, nft in self.nfts.items() if token_id in self.created]
+        NFT.objects.bulk_create(created)
+        existing = [nft for token_id, nft in self.nfts.items() if token_id in self.changed and nft.pk
+                    and token_id not in self.created]
+        if existing:
+            now = datetime.now(dt_timezone.utc)
+            for nft in existing:
+                nft.updated_at = now
+            NFT.objects.bulk_update(existing, sorted(self.changed_fields) + ['updated_at'])
+        apply_profile_deltas(self.deltas)
+        # NFTs created here are not indexed yet, and burned ones will not be
+        unindexed = set()
+        for token_id, block in self.burned.items():
+            if token_id in self.created:
+                continue
+            nft = self.nfts[token_id]
+            pairs = unindex_nft(nft)
+            if pairs:
+                self.undo[block]['unindexed'][str(token_id)] = [list(pair) for pair in pairs]
+                unindexed.add(collection_key(nft.collection))
+
+        recorded = set(Transaction.objects.filter(transaction_hash__in=list(self.activity)).values_list(
+            'transaction_hash', flat=True))
+        rows = []
+        for tx_hash, candidates in self.activity.items():
+            if tx_hash in recorded:
+                continue
+            _, block, fields = min(candidates, key=lambda candidate: candidate[0])
+            rows.append(Transaction(
+                transaction_hash=tx_hash, transaction_type=self._type(candidates), block_number=block,
+                timestamp=self.timestamps[block], gas_used=0, gas_price=0, **fields,
+            ))
+            self.undo[block]['transactions'].append(tx_hash)
+        Transaction.objects.bulk_create(rows)
+        if notify:
+            # Activity feed and timelines hang off post_save, which bulk_create skips
+            for tx in rows:
+                post_save.send(sender=Transaction, instance=tx, created=True, raw=False, using='default',
+                               update_fields=None)
+        changed = existing + created
+        transaction.on_commit(lambda: schedule_auctions(changed))
+        if created:
+            transaction.on_commit(lambda: index_many_in_background(
+                [nft for nft in created if nft.token_uri and not nft.is_burned]))
+        for key in unindexed:
+            transaction.on_commit(lambda key=key: schedule_rank(key))
+        return rows
+
+    @staticmethod
+    def _type(candidates):
+        precedence, _, fields = min(candidates, key=lambda candidate: candidate[0])
+        name = EVENT_PRECEDENCE[precedence]
+        if name == 'Transfer':
+            if fields['from_address'] == ZERO_ADDRESS:
+                return 'mint'
+            return 'burn' if fields['to_address'] == ZERO_ADDRESS else 'transfer'
+        return {'NFTSold': 'buy', 'NFTMinted': 'mint', 'NFTListed': 'list', 'BidPlaced': 'bid',
+                'AuctionEnded': 'delist', 'NFTDelisted': 'delist'}[name]
+
+
+def _check_continuity(headers, start):
+    """Raise ChainMoved if consecutive fetched headers (or the last journaled block) do not link up"""
+    previous = dict(ChainBlock.objects.filter(number=start - 1).values_list('number', 'hash'))
+    previous.update({number: header[0] for number, header in headers.items()})
+    for number, (_, parent_hash, _) in headers.items():
+        if number - 1 in previous and previous[number - 1] != parent_hash:
+            raise ChainMoved(f"Block {number} does not follow the block {number - 1} read before it")
+
+
+def read_range(start, end, journal_from, throttle=None):
+    """
+    Everything ingesting [start, end] needs from the node, with no database
+    access: (events, {number: header}) for the blocks with events, the
+    journaled blocks from journal_from on, and `start` (which links the
+    range to the journal, see _check_continuity) and `end` (the new
+    cursor). throttle, if given, is called before each request.
+    """
+    events = []
+    for log_start in range(start, end + 1, LOG_RANGE):
+        if throttle:
+            throttle()
+        events += decode_logs(web3_instance.get_logs(log_start, min(log_start + LOG_RANGE - 1, end)))
+    numbers = sorted({event[0] for event in events} | set(range(max(start, journal_from), end + 1)) | {start, end})
+    headers = {}
+    for offset in range(0, len(numbers), HEADER_BATCH):
+        if throttle:
+            throttle()
+        headers.update(web3_instance.get_blocks(numbers[offset:offset + HEADER_BATCH]))
+    return events, headers
+
+
+def apply_range(start, end, journal_from, events, headers, notify=True):
+    """
+    Apply what read_range() returned for [start, end] in one transaction,
+    journaling the blocks from journal_from on (and any with events) so
+    they can be rolled back. Returns the number of events applied.
+    """
+    _check_continuity(headers, start)
+    ingest = RangeIngest(events, headers)
+    ingest.run()
+    with transaction.atomic():
+        ingest.save(notify)
+        # Older blocks are final as far as the journal goes; `end` is kept as the cursor
+        ChainBlock.objects.bulk_create([
+            ChainBlock(number=number, hash=header[0], undo=ingest.undo.get(number, {}))
+            for number, header in headers.items() if number >= journal_from or number == end
+        ])
+        ChainBlock.objects.filter(number__lt=journal_from).exclude(number=end).delete()
+    return len(events)
+
+
+def ingest_range(start, end, journal_from, notify=True):
+    """read_range() then apply_range() for [start, end]"""
+    events, headers = read_range(start, end, journal_from)
+    return apply_range(start, end, journal_from, events, headers, notify)
+
+
+def _undo(undo):
+    """
+    Reverse one journaled block's changes; returns (token ids restored,
+    rarity index collections whose counts changed)
+    """
+    if not undo:
+        return [], set()
+    Transaction.objects.filter(transaction_hash__in=undo['transactions']).delete()
+    for token_id, fields in undo['nfts'].items():
+        NFT.objects.filter(token_id=int(token_id)).update(
+            **{field: NFT._meta.get_field(field).to_python(value) for field, value in fields.items()})
+    collections = set()
+    # Burns rolled back go back into the index with the traits they left it with
+    for nft in NFT.objects.filter(token_id__in=[int(token_id) for token_id in undo.get('unindexed', {})]).only(
+            'id', 'token_id', 'collection'):
+        if index_pairs(nft, [tuple(pair) for pair in undo['unindexed'][str(nft.token_id)]]):
+            collections.add(collection_key(nft.collection))
+    created = NFT.objects.filter(token_id__in=undo['created_nfts'])
+    for nft in created.only('id', 'collection'):
+        if unindex_nft(nft):
+            collections.add(collection_key(nft.collection))
+    created.delete()
+    apply_profile_deltas({
+        address: {field: -(Decimal(str(amount)) if field == 'total_volume' else amount)
+                  for field, amount in changes.items()}
+        for address, changes in undo['profiles'].items()
+    })
+    return [int(token_id) for token_id in undo['nfts']], collections
+
+
+def rollback(to_block):
+    """Undo every journaled block after to_block, newest first; returns the number of blocks rolled back"""
+    with transaction.atomic():
+        blocks = list(ChainBlock.objects.filter(number__gt=to_block).order_by('-number'))
+        restored, collections = set(), set()
+        for block in blocks:
+            token_ids, keys = _undo(block.undo)
+            restored.update(token_ids)
+            collections.update(keys)
+        ChainBlock.objects.filter(number__gt=to_block).delete()
+        transaction.on_commit(lambda: schedule_auctions(NFT.objects.filter(token_id__in=restored)))
+        for key in collections:
+            transaction.on_commit(lambda key=key: schedule_rank(key))
+    return len(blocks)
+
+
+def find_fork():
+    """
+    None while the newest journaled block is still canonical; after a
+    reorg, the newest journaled block that is (everything after it has to
+    be rolled back). Raises ReorgTooDeep if none of the journal is.
+    """
+    journal = ChainBlock.objects.order_by('-number').values_list('number', 'hash')
+    offset, size, oldest = 0, 1, None
+    while True:
+        rows = list(journal[offset:offset + size])
+        if not rows:
+            if offset == 0:
+                return None
+            raise ReorgTooDeep(f"No journaled block back to #{oldest} is canonical; resync from CHAIN_START_BLOCK")
+        oldest = rows[-1][0]
+        canonical = web3_instance.get_blocks([number for number, _ in rows])
+        for number, block_hash in rows:
+            if canonical.get(number, (None,))[0] == block_hash:
+                return None if offset == 0 else number
+        offset, size = offset + size, FORK_PROBE
+
+
+def sync(to_block=None, confirmations=CONFIRMATIONS, notify=True, head=None):
+    """
+    One ingestion pass over every block at least `confirmations` deep
+    below head (default: ask the node) up to to_block, in LOG_RANGE-block
+    transactions. Each range's first block must follow the last one
+    ingested; when it does not, a reorg replaced journaled blocks, so they
+    are rolled back to the fork and re-ingested. That costs one undo per
+    block past the fork, never a rescan. Returns
+    {'rolled_back', 'from', 'to', 'events'}.
+    """
+    summary = {'rolled_back': 0, 'from': None, 'to': None, 'events': 0}
+    if head is None:
+        head = web3_instance.get_latest_block()
+        if head is None:
+            raise ConnectionError("Could not read the latest block")
+    end = head - confirmations if to_block is None else min(head - confirmations, to_block)
+    start = synced_block() + 1
+    if start > end:
+        return summary
+    journal_from = end - JOURNAL_SIZE + 1
+    summary.update({'from': start, 'to': end})
+    while start <= end:
+        range_end = min(start + LOG_RANGE - 1, end)
+        try:
+            summary['events'] += ingest_range(start, range_end, journal_from, notify)
+        except ChainMoved:
+            fork = find_fork()
+            # Once per pass; if the journal still matches, the chain moved mid-read and the next pass retries
+            if fork is None or summary['rolled_back']:
+                raise
+            summary['rolled_back'] = rollback(fork)
+            logger.warning("Chain reorganised: rolled back %d blocks after #%d", summary['rolled_back'], fork)
+            start = fork + 1
+            summary['from'] = min(summary['from'], start)
+            continue
+        start = range_end + 1
+    return summary
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .chain_sync import CONFIRMATIONS, ChainMoved, ReorgTooDeep, sync, synced_block
+from .web3_utils import web3_instance
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = getattr(settings, 'CHAIN_POLL_MIN_INTERVAL', 1.0)
+MAX_INTERVAL = getattr(settings, 'CHAIN_POLL_MAX_INTERVAL', 30.0)
+WS_URL = getattr(settings, 'CHAIN_WS_URL', '')
+# Weight of the newest gap in the block time estimate
+BLOCK_TIME_SMOOTHING = 0.2
+
+
+class PollSchedule:
+    """
+    When to ask for the block number next. After a new block the poller
+    sleeps for about one (estimated) block time, then polls every
+    min_interval, doubling the wait on every empty poll up to max_interval,
+    so an idle chain costs a poll every max_interval and a busy one a few
+    polls per block.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.block_time = None
+        self.head = None
+        self.head_seen_at = None
+        self.backoff = min_interval
+
+    def observe(self, head, now=None):
+        """Record a polled head; returns the seconds to wait before the next poll"""
+        now = time.monotonic() if now is None else now
+        if self.head is not None and head > self.head:
+            gap = (now - self.head_seen_at) / (head - self.head)
+            self.block_time = gap if self.block_time is None else (
+                BLOCK_TIME_SMOOTHING * gap + (1 - BLOCK_TIME_SMOOTHING) * self.block_time)
+        if self.head is None or head > self.head:
+            self.head, self.head_seen_at = head, now
+            self.backoff = self.min_interval
+            if self.block_time is not None:
+                # Sleep through most of the next block rather than polling it
+                return min(max(self.block_time - self.min_interval, self.min_interval), self.max_interval)
+            return self.min_interval
+        wait, self.backoff = self.backoff, min(self.backoff * 2, self.max_interval)
+        return wait
+
+    def failed(self):
+        """Seconds to wait after a failed poll"""
+        wait, self.backoff = self.backoff, min(self.backoff * 2, self.max_interval)
+        return wait
+
+
+def _ingest(head, confirmations, notify):
+    close_old_connections()
+    try:
+        summary = sync(confirmations=confirmations, notify=notify, head=head)
+    except ChainMoved as e:
+        logger.warning("%s; retrying on the next block", e)
+        return None
+    except ReorgTooDeep:
+        raise
+    except Exception:
+        # Node hiccups: the range is retried with the next head
+        logger.exception("Ingestion up to block %s failed", head)
+        return None
+    if summary['from'] is not None:
+        logger.info("Ingested blocks %d-%d (%d events, %d rolled back)",
+                    summary['from'], summary['to'], summary['events'], summary['rolled_back'])
+    return summary
+
+
+def follow_by_polling(stop, confirmations=CONFIRMATIONS, notify=True, schedule=None):
+    """Follow the head with eth_blockNumber on a PollSchedule until stop (a threading.Event) is set"""
+    schedule = schedule or PollSchedule()
+    while not stop.is_set():
+        head = web3_instance.get_latest_block()
+        if head is None:
+            wait = schedule.failed()
+            logger.warning("Could not read the block number; next try in %.1fs", wait)
+        else:
+            wait = schedule.observe(head)
+            if head - confirmations > synced_block():
+                _ingest(head, confirmations, notify)
+        stop.wait(wait)
+
+
+async def _follow_heads(url, stop, confirmations, notify):
+    from web3 import AsyncWeb3, WebSocketProvider
+    async with AsyncWeb3(WebSocketProvider(url)) as w3:
+        await w3.eth.subscribe('newHeads')
+        logger.info("Subscribed to new heads at %s", url)
+        # Blocks that arrived while the subscription was down
+        await asyncio.to_thread(_ingest, None, confirmations, notify)
+        async for message in w3.socket.process_subscriptions():
+            if stop.is_set():
+                return
+            # The ORM is synchronous; keep it off the event loop
+            await asyncio.to_thread(_ingest, message['result']['number'], confirmations, notify)
+
+
+def follow_by_subscription(url, stop, confirmations=CONFIRMATIONS, notify=True):
+    """
+    Follow the head from a newHeads subscription, reconnecting with backoff
+    until stop is set. Nothing is polled while the connection is up.
+    """
+    schedule = PollSchedule()
+    while not stop.is_set():
+        try:
+            asyncio.run(_follow_heads(url, stop, confirmations, notify))
+        except ReorgTooDeep:
+            raise
+        except Exception as e:
+            wait = schedule.failed()
+            logger.warning("Subscription to %s dropped (%s); reconnecting in %.1fs", url, e, wait)
+            stop.wait(wait)
+
@@ -0,0 +1,42 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+
+# Replica alias chosen for the current request (None = use default)
+_current_replica = ContextVar('current_replica', default=None)
+
+
+def pick_replica():
+    """Pick a replica alias from the configured pool, or None if there are none"""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    if not replicas:
+        return None
+    return random.choice(replicas)
+
+
+def use_replica(alias):
+    """Route reads in the current context to the given replica alias"""
+    return _current_replica.set(alias)
+
+
+def reset_replica(token):
+    """Restore routing to what it was before use_replica()"""
+    _current_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to a replica only when the current request has opted in
+    (see ReplicaRoutingMiddleware). Everything else, including all writes,
+    goes to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _current_replica.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as default, so relations are always fine
+        return True
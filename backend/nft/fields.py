@@ -0,0 +1,47 @@
+from django.db import models
+
+
+def normalize_address(address):
+    """Canonical (lowercase, trimmed) form of a wallet/contract address; None and '' pass through"""
+    if isinstance(address, str):
+        return address.strip().lower()
+    return address
+
+
+class AddressField(models.CharField):
+    """
+    Ethereum address stored in canonical lowercase form.
+
+    Values are lowercased on save and in every lookup, so
+    filter(owner_address=checksummed) is an exact match on the index
+    rather than a case-insensitive scan.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 42)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('max_length') == 42:
+            del kwargs['max_length']
+        return name, path, args, kwargs
+
+    def get_prep_value(self, value):
+        return normalize_address(super().get_prep_value(value))
+
+    def pre_save(self, model_instance, add):
+        value = normalize_address(getattr(model_instance, self.attname))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class AddressConverter:
+    """URL converter that hands views the canonical form of an address path segment"""
+    regex = '[^/]+'
+
+    def to_python(self, value):
+        return normalize_address(value)
+
+    def to_url(self, value):
+        return value
@@ -1,59 +1,96 @@
 import os
+import re
 import base64
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from .thumbnails import (content_hash, existing_variants, render_source, schedule_profile_variants, variant_name,
+                         variant_sizes, FORMATS, HASH_LENGTH, PROFILE_FIELDS)
+
+DIRECTORIES = {'avatar': 'profile_images', 'banner': 'cover_images'}
+
+
+def _store_profile_image(profile, request, kind, digest, ext, content):
+    """
+    Store an uploaded image under its content hash and queue its resized
+    variants; returns the original's URL. Identical uploads share one file
+    and reuse variants that were already rendered.
+    """
+    url_field, variants_field = PROFILE_FIELDS[kind]
+    directory = DIRECTORIES[kind]
+
+    # Get old file name if exists to delete later
+    old_url = getattr(profile, url_field)
+
+    ext = re.sub(r'[^a-z0-9]', '', ext.lower())[:8] or 'img'
+    filename = f'{directory}/{digest}.{ext}'
 
-def handle_profile_image(profile, image_data, wallet_address, request):
-    """Handle profile image upload"""
-    if not image_data.startswith('data:image'):
-        return None
-        
-    # Get old file path if exists to delete later
-    old_avatar = profile.avatar_url.split('/')[-1] if profile.avatar_url else None
-    
-    format, imgstr = image_data.split(';base64,')
-    ext = format.split('/')[-1]
-    filename = f'profile_{wallet_address}.{ext}'
-    file_data = ContentFile(base64.b64decode(imgstr))
-    
     # Ensure directory exists
-    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'profile_images'), exist_ok=True)
-    
-    file_path = default_storage.save(f'profile_images/{filename}', file_data)
-    url = request.build_absolute_uri(default_storage.url(file_path))
-    
-    # Delete old file if exists
-    if old_avatar:
-        old_path = os.path.join(settings.MEDIA_ROOT, 'profile_images', old_avatar)
-        if os.path.exists(old_path):
-            os.remove(old_path)
-            
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, directory), exist_ok=True)
+
+    if not default_storage.exists(filename):
+        # A streamed upload's temporary file is moved into place, not copied
+        filename = default_storage.save(filename, content)
+    url = request.build_absolute_uri(default_storage.url(filename))
+    base_url = request.build_absolute_uri('/').rstrip('/')
+
+    variants = existing_variants(digest, kind, base_url)
+    setattr(profile, variants_field, variants or {})
+    if variants is None:
+        source = render_source(filename)
+        # After the profile row is saved, so the worker's update cannot be overwritten by it
+        transaction.on_commit(lambda: schedule_profile_variants(profile.id, kind, source, digest, url, base_url))
+
+    if old_url and old_url != url:
+        # Only once the new URL is committed; a failed save keeps the old file
+        transaction.on_commit(lambda: _delete_unused(old_url, directory, kind))
     return url
 
-def handle_cover_image(profile, image_data, wallet_address, request):
-    """Handle cover image upload"""
+
+def _delete_unused(old_url, directory, kind):
+    """
+    Delete a replaced upload and its rendered variants unless a profile
+    still uses the same (content-addressed) file. Runs after the replacing
+    save commits; the check and delete share a write transaction, so a
+    profile that picked up the same file meanwhile has committed first.
+    """
+    from .models import UserProfile
+    with transaction.atomic():
+        if UserProfile.objects.filter(Q(avatar_url=old_url) | Q(banner_url=old_url)).exists():
+            return
+        filename = old_url.split('/')[-1]
+        names = [f'{directory}/{filename}']
+        digest = filename.rsplit('.', 1)[0]
+        if re.fullmatch(f'[0-9a-f]{{{HASH_LENGTH}}}', digest):
+            names += [variant_name(digest, kind, size, fmt) for size in variant_sizes(kind) for fmt in FORMATS]
+        for name in names:
+            if default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def _save_data_url(profile, image_data, request, kind):
     if not image_data.startswith('data:image'):
         return None
-        
-    # Get old file path if exists to delete later
-    old_banner = profile.banner_url.split('/')[-1] if profile.banner_url else None
-    
     format, imgstr = image_data.split(';base64,')
-    ext = format.split('/')[-1]
-    filename = f'cover_{wallet_address}.{ext}'
-    file_data = ContentFile(base64.b64decode(imgstr))
-    
-    # Ensure directory exists
-    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'cover_images'), exist_ok=True)
-    
-    file_path = default_storage.save(f'cover_images/{filename}', file_data)
-    url = request.build_absolute_uri(default_storage.url(file_path))
-    
-    # Delete old file if exists
-    if old_banner:
-        old_path = os.path.join(settings.MEDIA_ROOT, 'cover_images', old_banner)
-        if os.path.exists(old_path):
-            os.remove(old_path)
-            
-    return url
+    raw = base64.b64decode(imgstr)
+    return _store_profile_image(profile, request, kind, content_hash(raw), format.split('/')[-1], ContentFile(raw))
+
+
+def handle_profile_image(profile, image_data, wallet_address, request):
+    """Handle profile image upload (base64 data: URL)"""
+    return _save_data_url(profile, image_data, request, 'avatar')
+
+
+def handle_cover_image(profile, image_data, wallet_address, request):
+    """Handle cover image upload (base64 data: URL)"""
+    return _save_data_url(profile, image_data, request, 'banner')
+
+
+def handle_uploaded_image(profile, upload, kind, request):
+    """
+    Store a file streamed in by nft.uploads.ProfileImageUploadHandler
+    ('avatar' or 'banner'), named after the format sniffed from its bytes
+    """
+    return _store_profile_image(profile, request, kind, upload.sha256[:HASH_LENGTH], upload.image_ext, upload)
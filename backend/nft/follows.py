@@ -0,0 +1,110 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .fields import normalize_address
+from .models import UserProfile
+from .thumbnails import list_avatar_url
+from .timeline import on_follow, on_unfollow
+
+# Edge table behind UserProfile.following: (from_userprofile -> to_userprofile)
+Follow = UserProfile.following.through
+
+FOLLOW_PAGE_SIZE = 50
+MAX_FOLLOW_PAGE_SIZE = 200
+MAX_FOLLOW_CHECK = 200
+
+
+def _followers_count(user):
+    """user's followers_count as just updated; the instance still holds the old value"""
+    return UserProfile.objects.filter(id=user.id).values_list('followers_count', flat=True).get()
+
+
+def follow(user, follower):
+    """
+    Add the follower -> user edge and bump both denormalized counts in the
+    same transaction, seeding the follower's timeline with user's recent
+    activity. Returns False if the edge already existed.
+    """
+    try:
+        with transaction.atomic():
+            # The unique (from, to) constraint rejects duplicates, so no exists() first
+            Follow.objects.create(from_userprofile_id=follower.id, to_userprofile_id=user.id)
+            UserProfile.objects.filter(id=user.id).update(followers_count=F('followers_count') + 1)
+            UserProfile.objects.filter(id=follower.id).update(following_count=F('following_count') + 1)
+            on_follow(follower, user, _followers_count(user))
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, follower):
+    """Remove the follower -> user edge, its counts and timeline entries; returns False if there was none"""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(from_userprofile_id=follower.id, to_userprofile_id=user.id).delete()
+        if not deleted:
+            return False
+        UserProfile.objects.filter(id=user.id).update(followers_count=F('followers_count') - 1)
+        UserProfile.objects.filter(id=follower.id).update(following_count=F('following_count') - 1)
+        on_unfollow(follower, user, _followers_count(user))
+    return True
+
+
+def follow_counts(user, follower):
+    """(user's followers_count, follower's following_count) after a follow/unfollow, in one query"""
+    rows = {row['id']: row for row in UserProfile.objects.filter(id__in=(user.id, follower.id))
+            .values('id', 'followers_count', 'following_count')}
+    return rows[user.id]['followers_count'], rows[follower.id]['following_count']
+
+
+def parse_page_params(params, default=FOLLOW_PAGE_SIZE, maximum=MAX_FOLLOW_PAGE_SIZE):
+    """(cursor, limit) from ?cursor=&limit=; raises ValueError on junk"""
+    cursor = params.get('cursor')
+    cursor = int(cursor) if cursor else None
+    limit = int(params.get('limit', default))
+    if limit < 1 or (cursor is not None and cursor < 1):
+        raise ValueError('cursor and limit must be positive integers')
+    return cursor, min(limit, maximum)
+
+
+def _edge_page(edges, profile_side, cursor, limit):
+    """
+    Newest-first page of follow edges keyed by the edge id, so each page is
+    an index range scan on (profile, id) however many followers the profile
+    has, and pages stay stable while people follow and unfollow.
+    """
+    if cursor:
+        edges = edges.filter(id__lt=cursor)
+    rows = list(edges.order_by('-id').values(
+        'id',
+        f'{profile_side}__wallet_address',
+        f'{profile_side}__username',
+        f'{profile_side}__avatar_url',
+        f'{profile_side}__avatar_variants',
+    )[:limit + 1])
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    profiles = [{
+        'wallet_address': row[f'{profile_side}__wallet_address'],
+        'username': row[f'{profile_side}__username'],
+        'avatar_url': row[f'{profile_side}__avatar_url'],
+        'avatar_thumbnail_url': list_avatar_url(row[f'{profile_side}__avatar_variants']),
+    } for row in rows[:limit]]
+    return profiles, next_cursor
+
+
+def followers_page(user, cursor=None, limit=FOLLOW_PAGE_SIZE):
+    """Profiles following `user`, newest first: (profiles, next_cursor)"""
+    return _edge_page(Follow.objects.filter(to_userprofile_id=user.id), 'from_userprofile', cursor, limit)
+
+
+def following_page(user, cursor=None, limit=FOLLOW_PAGE_SIZE):
+    """Profiles `user` follows, newest first: (profiles, next_cursor)"""
+    return _edge_page(Follow.objects.filter(from_userprofile_id=user.id), 'to_userprofile', cursor, limit)
+
+
+def following_among(follower_address, addresses):
+    """{address: bool} for whether follower_address follows each of addresses, in one query"""
+    addresses = list(dict.fromkeys(normalize_address(address) for address in addresses if address))
+    followed = set(Follow.objects.filter(
+        from_userprofile__wallet_address=follower_address,
+        to_userprofile__wallet_address__in=addresses,
+    ).values_list('to_userprofile__wallet_address', flat=True))
+    return {address: address in followed for address in addresses}
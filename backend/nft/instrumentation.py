@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.http import JsonResponse as DjangoJsonResponse
+
+# Timings for the request currently being handled (None outside a request)
+_request_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Accumulated time (seconds) and call counts per kind for one request"""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, kind, seconds):
+        self.durations[kind] += seconds
+        self.counts[kind] += 1
+
+
+def start_request():
+    """Begin collecting timings; returns (timings, token) for end_request()"""
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token):
+    _request_timings.reset(token)
+
+
+def add_timing(kind, seconds):
+    """Record `seconds` spent in `kind` (db, rpc, ipfs, ser) for the current request"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(kind, seconds)
+
+
+@contextmanager
+def timed(kind):
+    """Time the enclosed block as `kind` for the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(kind, time.perf_counter() - start)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper hook that times every query"""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add_timing('db', time.perf_counter() - start)
+
+
+class JsonResponse(DjangoJsonResponse):
+    """JsonResponse that records its encoding time as serialization"""
+
+    def __init__(self, *args, **kwargs):
+        start = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        add_timing('ser', time.perf_counter() - start)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class EndpointStats:
+    """
+    In-memory, per-process latency samples per endpoint and metric.
+    Keeps the last `window` samples of each so percentiles track recent traffic.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        # Request threads append while /api/perf/ reads; a deque must not change while it is copied
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, metrics):
+        with self._lock:
+            for metric, value in metrics.items():
+                key = (endpoint, metric)
+                samples = self._samples.get(key)
+                if samples is None:
+                    samples = self._samples[key] = deque(maxlen=self.window)
+                samples.append(value)
+
+    def summary(self):
+        with self._lock:
+            snapshot = [(key, list(samples)) for key, samples in self._samples.items()]
+        result = {}
+        for (endpoint, metric), values in snapshot:
+            values.sort()
+            result.setdefault(endpoint, {})[metric] = {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+endpoint_stats = EndpointStats(window=getattr(settings, 'PERF_SAMPLE_WINDOW', 1000))
@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from nft.archive import TransactionArchive, ARCHIVE_BATCH_SIZE, MIN_HORIZON_DAYS
+
+
+class Command(BaseCommand):
+    help = ('Move transactions older than the horizon out of the hot table into monthly '
+            'gzipped NDJSON archive files (see TRANSACTION_ARCHIVE_DIR)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, default=settings.TRANSACTION_ARCHIVE_HORIZON_DAYS,
+                            help=f'Archive rows older than this many days '
+                                 f'(default {settings.TRANSACTION_ARCHIVE_HORIZON_DAYS}, min {MIN_HORIZON_DAYS})')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help=f'Rows per archive part / database transaction (default {ARCHIVE_BATCH_SIZE})')
+        parser.add_argument('--archive-dir', help='Archive directory (default TRANSACTION_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        horizon = options['horizon_days']
+        if horizon < MIN_HORIZON_DAYS:
+            raise CommandError(
+                f'--horizon-days must be at least {MIN_HORIZON_DAYS}: the activity feed and stats '
+                f'read windows up to {MIN_HORIZON_DAYS} days from the hot table'
+            )
+        archive = TransactionArchive(options['archive_dir'])
+        cutoff = timezone.now() - timedelta(days=horizon)
+        started = time.perf_counter()
+        try:
+            summary = archive.archive_before(cutoff, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for month, rows in sorted(summary['months'].items()):
+            self.stdout.write(f'  {month}: {rows} rows')
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['rows']} transactions older than {cutoff:%Y-%m-%d} "
+            f"in {time.perf_counter() - started:.1f}s ({archive.root})"
+        ))
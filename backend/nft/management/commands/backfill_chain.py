@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from nft.chain_backfill import RPC_RATE, SHARD_SIZE, WORKERS, backfill
+from nft.chain_sync import CONFIRMATIONS, ChainMoved, synced_block
+
+
+class Command(BaseCommand):
+    help = ('Ingest marketplace history from the last ingested block (CHAIN_START_BLOCK on a fresh database) '
+            'with logs fetched in parallel by a process pool; rerun to resume after the last applied shard')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to-block', type=int, help='Stop at this block (default: head - confirmations)')
+        parser.add_argument('--confirmations', type=int, default=CONFIRMATIONS,
+                            help=f'Leave blocks newer than this for sync_chain / tail_chain (default {CONFIRMATIONS})')
+        parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                            help=f'Blocks per worker task and per database transaction (default {SHARD_SIZE})')
+        parser.add_argument('--workers', type=int, default=WORKERS,
+                            help=f'Worker processes fetching and decoding logs (default {WORKERS})')
+        parser.add_argument('--rpc-rate', type=float, default=RPC_RATE,
+                            help=f'Requests per second per worker, 0 for no limit (default CHAIN_BACKFILL_RPC_RATE = {RPC_RATE})')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Backfilling from block {synced_block() + 1} with {options["workers"]} workers')
+        started = time.perf_counter()
+        blocks = events = 0
+        try:
+            for shard_start, shard_end, count in backfill(
+                    to_block=options['to_block'], shard_size=options['shard_size'], workers=options['workers'],
+                    rpc_rate=options['rpc_rate'], confirmations=options['confirmations']):
+                blocks += shard_end - shard_start + 1
+                events += count
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  {shard_start}-{shard_end}: {count} events '
+                                  f'({blocks / elapsed:.0f} blocks/s, {events / elapsed:.0f} events/s)')
+        except ChainMoved as e:
+            raise CommandError(f'{e}; run sync_chain to roll back the reorg, then rerun the backfill')
+        except ConnectionError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {blocks} blocks, {events} events in {time.perf_counter() - started:.1f}s; '
+            f'now at block {synced_block()}'
+        ))
@@ -0,0 +1,283 @@
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from nft import urls as nft_urls
+from nft.instrumentation import percentile
+from nft.models import NFT
+from nft.seeding import seed_dataset, synthetic_address
+from nft.web3_utils import web3_instance
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# NFTs per register_nfts_batch request
+DROP_SIZE = 100
+
+QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+# Endpoints that need external services the benchmark cannot stand in for
+SKIPPED = {
+    'upload_ipfs': 'uploads to Pinata',
+    'stream_activities': 'long-lived event stream',
+}
+
+
+class OfflineWeb3:
+    """Canned answers for the NFTMarketplaceWeb3 methods the views call"""
+
+    def get_contract_info(self):
+        return {'name': 'NFTMarketplace', 'symbol': 'NFTM', 'address': '0x' + '0' * 40, 'network': 'offline'}
+
+    def get_nft_owner(self, token_id):
+        return synthetic_address(token_id % 100)
+
+    def get_user_nfts(self, user_address):
+        return {'balance': 0, 'user_address': user_address}
+
+    def get_nft_metadata(self, token_id):
+        return {'token_id': token_id, 'token_uri': f"https://example.com/metadata/{token_id}.json",
+                'owner': synthetic_address(token_id % 100)}
+
+    def get_listing(self, token_id):
+        return {'seller': synthetic_address(token_id % 100), 'price': 10 ** 17, 'isActive': True, 'isAuction': False,
+                'auctionEndTime': 0, 'startingPrice': 0, 'highestBid': 0, 'highestBidder': '0x' + '0' * 40}
+
+    def is_connected(self):
+        return True
+
+    def get_latest_block(self):
+        return 0
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class Scenarios:
+    """Builds (method, path, json_body) for each URL name from the seeded data"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        nfts = list(NFT.objects.order_by('id').values_list('id', 'token_id', 'owner_address', 'creator_address'))
+        if not nfts:
+            raise CommandError('No NFTs to benchmark against')
+        self.nfts = nfts
+        self.addresses = sorted({row[2] for row in nfts[:5000]} | {row[3] for row in nfts[:5000]})
+        self.next_token_id = max(row[1] for row in nfts) + 1
+        self.counter = 0
+
+    def _pick(self):
+        with self.lock:
+            self.counter += 1
+            return self.rng.choice(self.nfts), self.rng.choice(self.addresses), self.counter
+
+    def _page_of_cards(self, size=24):
+        with self.lock:
+            return ','.join(f"local_{row[0]}" for row in self.rng.sample(self.nfts, min(size, len(self.nfts))))
+
+    def build(self, name):
+        (nft_id, token_id, owner, creator), address, n = self._pick()
+        combined = f"local_{nft_id}"
+        page = 1 + n % 20
+        return {
+            'get_nfts': ('GET', f'/api/nfts/?page={page}', None),
+            'get_nft_detail': ('GET', f'/api/nfts/{token_id}/', None),
+            'get_nft_by_combined_id': ('GET', f'/api/nfts/combined/{combined}/', None),
+            'search_nfts': ('GET', f'/api/nfts/search/?q=NFT+%23{token_id}', None),
+            'register_nft': ('POST', '/api/nfts/register/', {
+                'token_id': self.next_token_id + n, 'name': f'Bench NFT {n}', 'description': 'benchmark',
+                'image_url': 'https://example.com/bench.png', 'creator_address': address, 'owner_address': address,
+            }),
+            'register_nfts_batch': ('POST', '/api/nfts/register/batch/', {'nfts': [{
+                # Clear of register_nft's token ids
+                'token_id': self.next_token_id + 10 ** 8 + n * DROP_SIZE + i, 'name': f'Bench drop {n} #{i}',
+                'description': 'benchmark', 'image_url': 'https://example.com/bench.png',
+                'creator_address': address, 'owner_address': address, 'collection': f'Bench drop {n}',
+            } for i in range(DROP_SIZE)]}),
+            'update_nft_owner': ('POST', f'/api/nfts/{token_id}/transfer/', {
+                'new_owner': address, 'transaction_hash': f'bench_transfer_{n}_{token_id}',
+            }),
+            'toggle_nft_like': ('POST', f'/api/nfts/{combined}/toggle-like/', {'user_address': address}),
+            'get_nft_stats': ('GET', f'/api/nfts/{combined}/stats/', None),
+            'get_nft_stats_batch': ('GET', f'/api/nfts/stats/?ids={self._page_of_cards()}', None),
+            'track_nft_view': ('POST', f'/api/nfts/{combined}/track-view/', {'viewer_address': address}),
+            'get_combined_nfts': ('GET', f'/api/nfts/combined/?user_address={address}', None),
+            'burn_nft': ('POST', f'/api/nfts/{token_id}/burn/', {'creator_address': creator}),
+            'hide_nft': ('POST', f'/api/nfts/{token_id}/hide/', {'user_address': owner}),
+            'unhide_nft': ('POST', f'/api/nfts/{token_id}/unhide/', {'user_address': owner}),
+            'get_collections': ('GET', '/api/collections/', None),
+            'get_trending_collections': ('GET', '/api/collections/trending/', None),
+            'get_collections_by_likes': ('GET', '/api/collections/by-likes/', None),
+            'get_user_profile': ('GET', f'/api/profiles/{address}/', None),
+            'update_profile': ('POST', f'/api/profiles/{address}/update/', {'bio': f'bio {n}'}),
+            'get_user_nfts': ('GET', f'/api/profiles/{owner}/nfts/', None),
+            'get_user_created_nfts': ('GET', f'/api/profiles/{creator}/created/', None),
+            'get_user_liked_nfts': ('GET', f'/api/profiles/{address}/liked/', None),
+            'follow_user': ('POST', f'/api/profiles/{owner}/follow/', {'follower_address': address}),
+            'unfollow_user': ('POST', f'/api/profiles/{owner}/unfollow/', {'follower_address': address}),
+            'get_followers': ('GET', f'/api/profiles/{owner}/followers/', None),
+            'get_following': ('GET', f'/api/profiles/{address}/following/', None),
+            'get_home_timeline': ('GET', f'/api/profiles/{address}/timeline/', None),
+            'check_following': ('GET', f'/api/profiles/{address}/following/check/?addresses={owner},{creator}', None),
+            'get_contract_info': ('GET', '/api/contract/info/', None),
+            'get_activities': ('GET', f'/api/activities/?time_filter=7d&page={page}', None),
+            'get_activity_stats': ('GET', '/api/activities/stats/', None),
+            'get_perf_stats': ('GET', '/api/perf/', None),
+            'set_nft_listed': ('POST', f'/api/nfts/{token_id}/set_listed/', None),
+        }.get(name)
+
+
+class Command(BaseCommand):
+    help = ('Offline API benchmark: seed a deterministic dataset into a throwaway test database, '
+            'drive every endpoint in nft/urls.py with the Django test client and write a JSON report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='10k',
+                            help='Dataset size: 10k, 100k, 1m or a number of NFTs (default 10k)')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint (default 200)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads (default 8)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for data and request mix')
+        parser.add_argument('--endpoints', help='Comma-separated URL names to run (default: all)')
+        parser.add_argument('--output', default='benchmark_report.json', help="Report path, or '-' for stdout")
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database between runs (reuses seeded data)')
+
+    def handle(self, *args, **options):
+        size = options['size'].lower()
+        nfts = SIZES.get(size) or int(size)
+        names = [p.name for p in nft_urls.urlpatterns if p.name]
+        if options['endpoints']:
+            wanted = set(options['endpoints'].split(','))
+            names = [name for name in names if name in wanted]
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            # The default in-memory test database fails concurrent writers with
+            # "table is locked" instead of letting them wait their turn
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'nft_benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        previous_web3 = web3_instance._instance
+        web3_instance.set_instance(OfflineWeb3())
+        try:
+            with override_settings(DATABASE_REPLICAS=[]):
+                report = self.run_benchmark(nfts, names, options)
+        finally:
+            web3_instance.set_instance(previous_web3)
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        body = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(body)
+        else:
+            with open(options['output'], 'w') as f:
+                f.write(body)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def run_benchmark(self, nfts, names, options):
+        seed_started = time.perf_counter()
+        if options['keepdb'] and NFT.objects.exists():
+            counts = {'nfts': NFT.objects.count(), 'reused': True}
+        else:
+            self.stdout.write(f'Seeding {nfts} NFTs...')
+            counts = seed_dataset(nfts, seed=options['seed'])
+        seed_seconds = time.perf_counter() - seed_started
+        rss_after_seed = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        scenarios = Scenarios(options['seed'])
+        endpoints = {}
+        for name in names:
+            if name in SKIPPED:
+                endpoints[name] = {'skipped': SKIPPED[name]}
+                continue
+            if scenarios.build(name) is None:
+                endpoints[name] = {'skipped': 'no scenario defined'}
+                continue
+            self.stdout.write(f'  {name}')
+            endpoints[name] = self.run_endpoint(name, scenarios, options['requests'], options['concurrency'])
+
+        return {
+            'meta': {
+                'git_commit': _git_commit(),
+                'started_at': datetime.now(dt_timezone.utc).isoformat(),
+                'size': nfts,
+                'seed': options['seed'],
+                'requests_per_endpoint': options['requests'],
+                'concurrency': options['concurrency'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': counts,
+            'seed_seconds': round(seed_seconds, 3),
+            'peak_rss_kb': {
+                'after_seed': rss_after_seed,
+                'after_run': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            },
+            'endpoints': endpoints,
+        }
+
+    def run_endpoint(self, name, scenarios, requests, concurrency):
+        local = threading.local()
+
+        def one_request(_):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+            method, path, body = scenarios.build(name)
+            started = time.perf_counter()
+            if method == 'GET':
+                response = client.get(path)
+            else:
+                response = client.post(path, json.dumps(body or {}), content_type='application/json')
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            match = QUERIES_RE.search(response.get('Server-Timing', ''))
+            return elapsed_ms, response.status_code, int(match.group(1)) if match else None
+
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one_request, range(requests)))
+        wall_seconds = time.perf_counter() - wall_started
+
+        latencies = sorted(r[0] for r in results)
+        queries = sorted(r[2] for r in results if r[2] is not None)
+        statuses = {}
+        for _, status, _ in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'requests': len(results),
+            'status_codes': statuses,
+            'errors': sum(1 for r in results if r[1] >= 500),
+            'throughput_rps': round(len(results) / wall_seconds, 1) if wall_seconds else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(latencies[-1], 3),
+            },
+            'queries': {
+                'p50': percentile(queries, 50),
+                'max': queries[-1] if queries else None,
+            },
+        }
@@ -0,0 +1,109 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from eth_abi import encode
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+from nft import abi_registry
+from nft.seeding import synthetic_address
+
+# Event mix of the synthetic logs, roughly what a busy marketplace emits
+MIX = {'Transfer': 40, 'NFTMinted': 10, 'NFTListed': 15, 'AuctionCreated': 3, 'BidPlaced': 15, 'NFTSold': 10,
+       'AuctionEnded': 2, 'NFTDelisted': 5}
+
+CONTRACT_ADDRESS = '0x' + '1' * 40
+
+
+def synthetic_logs(registry, count, rng):
+    """count raw JSON-RPC logs of MIX events with random arguments, a block per 20 logs"""
+    topics = {decoder.name: topic for topic, decoder in registry.events.items()}
+    inputs = {entry['name']: entry['inputs'] for entry in registry.abi if entry.get('type') == 'event'}
+    names, weights = list(MIX), list(MIX.values())
+    values = {
+        'address': lambda: synthetic_address(rng.randrange(1000)),
+        'uint256': lambda: rng.randrange(10 ** 20),
+        'bool': lambda: rng.random() < 0.5,
+        'string': lambda: f'ipfs://Qm{rng.getrandbits(160):040x}',
+    }
+    logs = []
+    for i, name in enumerate(rng.choices(names, weights, k=count)):
+        event_topics, data_types, data_values = ['0x' + topics[name].hex()], [], []
+        for arg in inputs[name]:
+            value = values[arg['type']]()
+            if arg['indexed']:
+                event_topics.append('0x' + encode([arg['type']], [value]).hex())
+            else:
+                data_types.append(arg['type'])
+                data_values.append(value)
+        logs.append({
+            'address': CONTRACT_ADDRESS, 'topics': event_topics, 'data': '0x' + encode(data_types, data_values).hex(),
+            'blockNumber': hex(1_000_000 + i // 20), 'logIndex': hex(i % 20),
+            'transactionHash': f'0x{rng.getrandbits(256):064x}', 'blockHash': '0x' + '0' * 64,
+            'transactionIndex': hex(i % 20), 'removed': False,
+        })
+    return logs
+
+
+def web3_formatted(log):
+    """A raw log in the shape w3.eth.get_logs() returns it"""
+    return AttributeDict({
+        'address': Web3.to_checksum_address(log['address']), 'topics': [HexBytes(topic) for topic in log['topics']],
+        'data': HexBytes(log['data']), 'blockNumber': int(log['blockNumber'], 16),
+        'logIndex': int(log['logIndex'], 16), 'transactionHash': HexBytes(log['transactionHash']),
+        'blockHash': HexBytes(log['blockHash']), 'transactionIndex': int(log['transactionIndex'], 16),
+        'removed': False,
+    })
+
+
+def _canonical(value):
+    if isinstance(value, str) and Web3.is_address(value):
+        return value.lower()
+    if isinstance(value, bytes):
+        return bytes(value)
+    return value
+
+
+class Command(BaseCommand):
+    help = ('Time decoding synthetic marketplace event logs with web3 (contract.events.X().process_log, per log) '
+            'against the precompiled nft.abi_registry decoder, and check both agree')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logs', type=int, default=100_000, help='Logs to decode (default 100000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic logs')
+
+    def handle(self, *args, **options):
+        registry = abi_registry.registry()
+        raw = synthetic_logs(registry, options['logs'], random.Random(options['seed']))
+        formatted = [web3_formatted(log) for log in raw]
+        self.stdout.write(f"{len(raw)} logs: " + ', '.join(f'{name} {share}%' for name, share in MIX.items()))
+
+        contract = Web3().eth.contract(address=Web3.to_checksum_address(CONTRACT_ADDRESS), abi=registry.abi)
+        events = {topic: getattr(contract.events, decoder.name)() for topic, decoder in registry.events.items()}
+        started = time.perf_counter()
+        reference = []
+        for log in formatted:
+            data = events[bytes(log['topics'][0])].process_log(log)
+            reference.append((data['blockNumber'], data['logIndex'], data['transactionHash'].to_0x_hex(),
+                              data['event'], dict(data['args'])))
+        web3_secs = time.perf_counter() - started
+
+        timings = {}
+        for label, logs in (('raw JSON-RPC logs', raw), ('web3-formatted logs', formatted)):
+            started = time.perf_counter()
+            decoded = registry.decode_logs(logs)
+            timings[label] = time.perf_counter() - started
+            if len(decoded) != len(reference):
+                raise CommandError(f'{label}: decoded {len(decoded)} events, web3 decoded {len(reference)}')
+            for ours, theirs in zip(decoded, reference):
+                expected = theirs[:4] + ({name: _canonical(value) for name, value in theirs[4].items()},)
+                if ours != expected:
+                    raise CommandError(f'{label}: decoded {ours!r}, web3 decoded {theirs!r}')
+
+        self.stdout.write(f"  web3 process_log:          {web3_secs:7.3f}s  {len(raw) / web3_secs:>10,.0f} logs/s")
+        for label, secs in timings.items():
+            self.stdout.write(f"  abi_registry, {label + ':':<20} {secs:7.3f}s  {len(raw) / secs:>10,.0f} logs/s  "
+                              f"({web3_secs / secs:.1f}x)")
+        self.stdout.write(self.style.SUCCESS('Decoded events match web3 for every log'))
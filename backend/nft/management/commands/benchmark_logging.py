@@ -0,0 +1,117 @@
+import atexit
+import io
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from nft.logging_utils import QueueLogHandler
+from nft.seeding import synthetic_address
+
+PAGE_SIZE = 50
+
+
+def synthetic_page(rng):
+    """A get_combined_nfts page: PAGE_SIZE NFT dicts shaped like the view builds them"""
+    created = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    return [{
+        'id': f'local_{i}', 'token_id': i, 'name': f'NFT #{i}', 'description': 'A synthetic NFT ' * 4,
+        'image_url': f'https://gateway.pinata.cloud/ipfs/Qm{rng.getrandbits(160):040x}',
+        'price': round(rng.uniform(0.01, 5), 4), 'is_listed': rng.random() < 0.5, 'is_auction': False,
+        'owner_address': synthetic_address(rng.randrange(1000)), 'creator_address': synthetic_address(i),
+        'collection': 'Synthetic', 'category': 'art', 'created_at': (created + timedelta(hours=i)).isoformat(),
+        'source': 'local', 'liked': False, 'like_count': rng.randrange(100),
+    } for i in range(1, PAGE_SIZE + 1)]
+
+
+def print_statements(out, user_address, liked_nft_ids, local_nfts_data):
+    """
+    The debug output get_combined_nfts printed on every request before it
+    moved to logging. "Found N local NFTs" also ran a count() query; only
+    its print is kept here.
+    """
+    print("[DEBUG] get_combined_nfts called", file=out)
+    print(f"[DEBUG] User address for like status: {user_address}", file=out)
+    print(f"[DEBUG] User liked {len(liked_nft_ids)} local NFTs", file=out)
+    print(f"[DEBUG] Found {len(local_nfts_data)} local NFTs", file=out)
+    print(f"[DEBUG] Processed {len(local_nfts_data)} local NFTs", file=out)
+    print(f"[DEBUG] Total NFTs: {len(local_nfts_data)}", file=out)
+    print(f"[DEBUG] Sample NFT IDs: {[nft['id'] for nft in local_nfts_data[:3]]}", file=out)
+    print(f"[DEBUG] First NFT full data: {local_nfts_data[0] if local_nfts_data else 'No NFTs'}", file=out)
+
+
+def logger_statements(logger, user_address, liked_nft_ids, local_nfts_data):
+    """The logger.debug calls that replaced them"""
+    logger.debug("get_combined_nfts called, user address for like status: %s", user_address)
+    logger.debug("User liked %d local NFTs", len(liked_nft_ids))
+    logger.debug("get_combined_nfts returning %d NFTs", len(local_nfts_data))
+
+
+def drained_pipe():
+    """(writable text stream, thread) for a pipe whose other end a thread reads and discards"""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        with io.FileIO(read_fd, 'r') as reader:
+            while reader.read(1 << 16):
+                pass
+
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    return open(write_fd, 'w'), thread
+
+
+class Command(BaseCommand):
+    help = ('Time the debug output of get_combined_nfts per request: the print() calls it made before the '
+            'logging change against logger.debug with DEBUG disabled and enabled, all writing to a pipe')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20_000, help='Simulated requests (default 20000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic page')
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        page = synthetic_page(random.Random(options['seed']))
+        user_address, liked = synthetic_address(1), {1, 2, 3}
+
+        out, drainer = drained_pipe()
+        # A logger of its own, so the project's LOGGING config is left alone
+        logger = logging.getLogger('nft.benchmark_logging')
+        logger.propagate = False
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+        def run(statement, *target):
+            started = time.perf_counter()
+            for _ in range(requests):
+                statement(*target, user_address, liked, page)
+            return (time.perf_counter() - started) / requests * 1e6
+
+        timings = {'print() (before)': run(print_statements, out)}
+
+        logger.setLevel(logging.INFO)
+        timings['logger.debug, DEBUG disabled'] = run(logger_statements, logger)
+
+        logger.setLevel(logging.DEBUG)
+        for label, handler in (('logger.debug, StreamHandler', logging.StreamHandler(out)),
+                               ('logger.debug, QueueLogHandler', QueueLogHandler(out))):
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+            timings[label] = run(logger_statements, logger)
+            logger.removeHandler(handler)
+            if isinstance(handler, QueueLogHandler):
+                # Wait for the listener to write everything queued before the pipe is closed
+                handler.listener.stop()
+                atexit.unregister(handler.listener.stop)
+            handler.flush()
+
+        out.close()
+        drainer.join()
+
+        baseline = timings['print() (before)']
+        self.stdout.write(f"{requests} simulated get_combined_nfts requests, {PAGE_SIZE} NFTs per page, output piped")
+        for label, micros in timings.items():
+            self.stdout.write(f"  {label + ':':<32} {micros:7.2f} us/request  ({baseline / micros:.1f}x)")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from nft.auctions import CLOSE_BATCH_SIZE, close_due_auctions, pending_settlement, settle_auctions
+
+
+class Command(BaseCommand):
+    help = ('Close every auction whose end time has passed (normally done as they end by '
+            'run_auction_scheduler) and, with --settle, resend endAuction for closed auctions not yet settled')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settle', action='store_true',
+                            help='Send endAuction for closed auctions without a settlement transaction '
+                                 '(needs AUCTION_SETTLER_PRIVATE_KEY)')
+
+    def handle(self, *args, **options):
+        closed = 0
+        while True:
+            batch = close_due_auctions()
+            closed += len(batch)
+            if len(batch) < CLOSE_BATCH_SIZE:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Closed {closed} auctions'))
+
+        if options['settle']:
+            sent = 0
+            token_ids = list(pending_settlement().values_list('token_id', flat=True))
+            for start in range(0, len(token_ids), CLOSE_BATCH_SIZE):
+                sent += settle_auctions(token_ids[start:start + CLOSE_BATCH_SIZE])
+            self.stdout.write(self.style.SUCCESS(f'Sent endAuction for {sent} of {len(token_ids)} pending auctions'))
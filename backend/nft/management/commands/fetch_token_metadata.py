@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.models import NFT
+from nft.token_metadata import FETCH_CONCURRENCY, prefetch_metadata
+
+
+class Command(BaseCommand):
+    help = ('Fetch IPFS token metadata that is not cached yet, racing the configured gateways '
+            '(IPFS_GATEWAYS). Cached CIDs and non-IPFS token URIs are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token-id', type=int, action='append', help='Only this token (repeatable)')
+        parser.add_argument('--concurrency', type=int, default=FETCH_CONCURRENCY,
+                            help=f'CIDs fetched at a time (default {FETCH_CONCURRENCY})')
+
+    def handle(self, *args, **options):
+        nfts = NFT.objects.exclude(token_uri='')
+        if options['token_id']:
+            nfts = nfts.filter(token_id__in=options['token_id'])
+        started = time.perf_counter()
+        fetched, failed = prefetch_metadata(
+            nfts.values_list('token_uri', flat=True).iterator(), concurrency=options['concurrency'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Fetched {fetched} metadata documents ({failed} failed) in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.thumbnails import regenerate_profile_variants
+
+
+class Command(BaseCommand):
+    help = ('Render WebP/AVIF avatar and banner variants for profile images that do not have them yet '
+            '(e.g. uploaded before thumbnails existed)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have variants')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rendered = regenerate_profile_variants(force=options['force'], workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered variants for {rendered} images in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.profile_stats import rebuild_profile_stats, REBUILD_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Recompute UserProfile aggregates (owned/created counts, collected, volume, follow counts) '
+            'from NFTs, sale transactions and follow edges')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE,
+                            help=f'Profiles per bulk update (default {REBUILD_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = rebuild_profile_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} profiles in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.rarity import rank_pending, rebuild_rarity
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the trait rarity index from cached token metadata and re-rank every collection '
+            '(run fetch_token_metadata first to fill the cache)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pending', action='store_true',
+                            help='Only re-rank collections whose traits changed since they were last ranked')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['pending']:
+            updated = rank_pending()
+            self.stdout.write(self.style.SUCCESS(
+                f'Re-ranked {updated} NFTs in {time.perf_counter() - started:.2f}s'
+            ))
+            return
+        indexed, collections = rebuild_rarity()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} NFTs across {collections} collections in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.timeline import rebuild_timelines, TIMELINE_LENGTH
+
+
+class Command(BaseCommand):
+    help = ('Refill every home timeline from the follow graph and recent transactions '
+            '(e.g. after seed_data or changing ACTIVITY_TIMELINE_FANOUT_LIMIT)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=TIMELINE_LENGTH,
+                            help=f'Entries per timeline (default {TIMELINE_LENGTH})')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_timelines(length=options['length'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} timeline entries in {time.perf_counter() - started:.2f}s'
+        ))
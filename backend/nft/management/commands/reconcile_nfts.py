@@ -0,0 +1,78 @@
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from nft.reconcile import BATCH_SIZE, CONCURRENCY, reconcile
+
+
+class Command(BaseCommand):
+    help = ('Compare every NFT\'s owner and listing with the chain (ownerOf / getListing, batched) and fix '
+            'the rows that drifted, writing each difference to a drift report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Tokens per batched RPC request (default {BATCH_SIZE})')
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                            help=f'RPC batches in flight at once (default {CONCURRENCY})')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, change nothing')
+        parser.add_argument('--report', help='Drift report file, one JSON object per line '
+                                             '(default reconcile-<timestamp>.jsonl in the progress directory)')
+        parser.add_argument('--progress-file',
+                            default=str(Path(settings.BASE_DIR) / 'cache' / 'reconcile' / 'progress.json'),
+                            help='Where the last reconciled id is kept while a sweep runs')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted sweep from the progress file (and its report)')
+
+    def handle(self, *args, **options):
+        progress_path = Path(options['progress_file'])
+        progress = {'last_id': 0, 'checked': 0, 'drifted': 0, 'fixed': 0, 'drift': {}}
+        if options['resume']:
+            if not progress_path.exists():
+                raise CommandError(f'Nothing to resume: {progress_path} does not exist')
+            with open(progress_path) as f:
+                progress = json.load(f)
+            self.stdout.write(f"Resuming after id {progress['last_id']} ({progress['checked']} NFTs checked)")
+        report_path = Path(options['report'] or progress.get('report') or
+                           progress_path.parent / f'reconcile-{time.strftime("%Y%m%d-%H%M%S")}.jsonl')
+        progress['report'] = str(report_path)
+        progress_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+
+        drift = Counter(progress['drift'])
+        checked = 0
+        started = time.perf_counter()
+        try:
+            with open(report_path, 'a') as report:
+                for batch in reconcile(after_id=progress['last_id'], batch_size=options['batch_size'],
+                                       concurrency=options['concurrency'], apply=not options['dry_run']):
+                    for record in batch.drift:
+                        report.write(json.dumps(record, default=str) + '\n')
+                        drift[record['field']] += 1
+                    report.flush()
+                    checked += batch.checked
+                    progress.update(last_id=batch.last_id, checked=progress['checked'] + batch.checked,
+                                    drifted=progress['drifted'] + batch.drifted,
+                                    fixed=progress['fixed'] + batch.fixed, drift=dict(drift))
+                    self._save(progress_path, progress)
+        except OSError as e:
+            # Node or network trouble (requests' errors are OSErrors too); progress is kept
+            raise CommandError(f'{e} (rerun with --resume to continue)')
+
+        elapsed = time.perf_counter() - started
+        for field, count in sorted(drift.items()):
+            self.stdout.write(f'  {field}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {progress['checked']} NFTs ({checked / elapsed if elapsed else 0:.0f}/s this run): "
+            f"{progress['drifted']} drifted, {progress['fixed']} fixed; drift report: {report_path}"
+        ))
+        # A finished sweep leaves nothing to resume
+        progress_path.unlink(missing_ok=True)
+
+    def _save(self, path, progress):
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp, path)
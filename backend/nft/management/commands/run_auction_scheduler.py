@@ -0,0 +1,29 @@
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from nft.auctions import RELOAD_INTERVAL, scheduler
+
+
+class Command(BaseCommand):
+    help = ('Close auctions as they end (see nft.auctions). Run exactly one per deployment, '
+            'next to the web workers; close_auctions is the one-off catch-up')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                            help='Seconds between re-reads of open auctions, which picks up auctions listed '
+                                 f'through the web workers (default AUCTION_SCHEDULER_RELOAD = {RELOAD_INTERVAL})')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        scheduler.reload_interval = options['reload_interval']
+        # Auctions that ended while no scheduler ran are due at once
+        scheduler.start()
+        self.stdout.write(f"Closing auctions as they end, re-reading open auctions every {scheduler.reload_interval}s")
+        try:
+            while not stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        scheduler.stop(timeout=30)
+        self.stdout.write('Stopped')
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.seeding import seed_dataset, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic, production-sized synthetic dataset (NFTs, profiles, follows, '
+            'favorites, views, transactions) with Zipfian popularity and bursty timestamps')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nfts', type=int, default=10_000, help='Number of NFTs (default 10000)')
+        parser.add_argument('--users', type=int, help='Number of profiles (default nfts/10, min 100)')
+        parser.add_argument('--transactions', type=int, help='Number of transactions (default 2 x nfts)')
+        parser.add_argument('--favorites', type=int, help='Number of likes (default nfts)')
+        parser.add_argument('--views', type=int, help='Number of views (default nfts)')
+        parser.add_argument('--follows', type=int, help='Number of follow edges (default 5 x users)')
+        parser.add_argument('--collections', type=int, default=50, help='Number of collections (default 50)')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent for NFT/user/collection popularity, 0 = uniform (default 1.1)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default 42)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'Rows per insert batch (default {BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = seed_dataset(
+            options['nfts'],
+            users=options['users'],
+            transactions=options['transactions'],
+            favorites=options['favorites'],
+            views=options['views'],
+            follows=options['follows'],
+            collections=options['collections'],
+            skew=options['skew'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/sec)'
+        ))
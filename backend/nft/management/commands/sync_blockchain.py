@@ -1,9 +1,16 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 from nft.models import NFT, Collection, Transaction
 from nft.web3_utils import web3_instance
+from nft.profile_stats import record_registration, record_transfer
+from nft.token_metadata import cached_metadata, fetch_metadata, prefetch_metadata
+from nft.rarity import collection_key, index_nft, rank_collection, rank_pending
 import json
 
+# NFTs read per query while indexing traits
+INDEX_PAGE_SIZE = 500
+
 class Command(BaseCommand):
     help = 'Sync blockchain data with local database'
 
@@ -53,34 +60,48 @@ class Command(BaseCommand):
                 return
 
             # Create or update NFT in database
-            nft, created = NFT.objects.get_or_create(
-                token_id=token_id,
-                defaults={
-                    'name': f'NFT #{token_id}',
-                    'description': f'Token ID: {token_id}',
-                    'image_url': 'https://via.placeholder.com/400x400',
-                    'token_uri': blockchain_data.get('token_uri', ''),
-                    'owner_address': blockchain_data.get('owner', ''),
-                    'creator_address': blockchain_data.get('owner', ''),
-                    'price': None,
-                    'is_listed': False,
-                    'is_auction': False,
-                    'royalty_percentage': 0,
-                }
-            )
-
-            if created:
-                self.stdout.write(
-                    self.style.SUCCESS(f'Created NFT {token_id}')
+            with transaction.atomic():
+                nft, created = NFT.objects.get_or_create(
+                    token_id=token_id,
+                    defaults={
+                        'name': f'NFT #{token_id}',
+                        'description': f'Token ID: {token_id}',
+                        'image_url': 'https://via.placeholder.com/400x400',
+                        'token_uri': blockchain_data.get('token_uri', ''),
+                        'owner_address': blockchain_data.get('owner', ''),
+                        'creator_address': blockchain_data.get('owner', ''),
+                        'price': None,
+                        'is_listed': False,
+                        'is_auction': False,
+                        'royalty_percentage': 0,
+                    }
                 )
-            else:
-                # Update existing NFT
-                nft.owner_address = blockchain_data.get('owner', nft.owner_address)
-                nft.token_uri = blockchain_data.get('token_uri', nft.token_uri)
-                nft.save()
+
+                if created:
+                    record_registration(nft)
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Created NFT {token_id}')
+                    )
+                else:
+                    # Update existing NFT
+                    old_owner = nft.owner_address
+                    nft.owner_address = blockchain_data.get('owner', nft.owner_address)
+                    nft.token_uri = blockchain_data.get('token_uri', nft.token_uri)
+                    nft.save()
+                    if nft.owner_address != old_owner:
+                        record_transfer(nft, old_owner)
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Updated NFT {token_id}')
+                    )
+
+            # Outside the transaction: no lock held while waiting on gateways
+            metadata = fetch_metadata(nft.token_uri) if nft.token_uri else None
+            if metadata is None:
                 self.stdout.write(
-                    self.style.SUCCESS(f'Updated NFT {token_id}')
+                    self.style.WARNING(f'No IPFS metadata cached for NFT {token_id} ({nft.token_uri})')
                 )
+            elif index_nft(nft, metadata):
+                rank_collection(collection_key(nft.collection))
 
         except Exception as e:
             self.stdout.write(
@@ -121,12 +142,35 @@ class Command(BaseCommand):
                         }
                     )
                     if created:
+                        record_registration(nft)
                         self.stdout.write(f'Created test NFT: {nft.name}')
             else:
                 self.stdout.write(
                     self.style.SUCCESS(f'Found {existing_nfts.count()} existing NFTs')
                 )
 
+            fetched, failed = prefetch_metadata(
+                NFT.objects.exclude(token_uri='').values_list('token_uri', flat=True).iterator()
+            )
+            self.stdout.write(f'Token metadata: {fetched} fetched, {failed} failed')
+
+            indexed = 0
+            # Keyset pages rather than iterator(): index_nft() writes the very
+            # rows the traits__isnull predicate reads, on the same connection
+            after_id = 0
+            while True:
+                page = list(NFT.objects.filter(is_burned=False, traits__isnull=True, id__gt=after_id)
+                            .exclude(token_uri='').order_by('id')[:INDEX_PAGE_SIZE])
+                if not page:
+                    break
+                for nft in page:
+                    metadata = cached_metadata(nft.token_uri)
+                    if metadata is not None and index_nft(nft, metadata):
+                        indexed += 1
+                after_id = page[-1].id
+            rank_pending()
+            self.stdout.write(f'Trait index: {indexed} NFTs added')
+
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error syncing all NFTs: {str(e)}')
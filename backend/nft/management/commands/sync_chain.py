@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from nft.chain_sync import CONFIRMATIONS, ReorgTooDeep, ChainMoved, sync, synced_block
+
+
+class Command(BaseCommand):
+    help = ('Ingest marketplace events into NFTs and transactions from the last ingested block up to the '
+            'newest block with enough confirmations, rolling back first if a reorg replaced ingested blocks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to-block', type=int, help='Stop at this block (default: head - confirmations)')
+        parser.add_argument('--confirmations', type=int, default=CONFIRMATIONS,
+                            help=f'Only ingest blocks this deep (default CHAIN_CONFIRMATIONS = {CONFIRMATIONS})')
+        parser.add_argument('--quiet-feed', action='store_true',
+                            help='Do not push the new transactions to the live activity feed and timelines')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            summary = sync(to_block=options['to_block'], confirmations=options['confirmations'],
+                           notify=not options['quiet_feed'])
+        except (ReorgTooDeep, ChainMoved, ConnectionError) as e:
+            raise CommandError(str(e))
+
+        if summary['rolled_back']:
+            self.stdout.write(self.style.WARNING(f"Rolled back {summary['rolled_back']} reorganised blocks"))
+        if summary['from'] is None:
+            self.stdout.write(f'Up to date at block {synced_block()}')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested blocks {summary['from']}-{summary['to']}: {summary['events']} events "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,41 @@
+import signal
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from nft.chain_sync import CONFIRMATIONS, ReorgTooDeep
+from nft.chain_tail import MAX_INTERVAL, MIN_INTERVAL, WS_URL, PollSchedule, follow_by_polling, follow_by_subscription
+
+
+class Command(BaseCommand):
+    help = ('Keep ingesting marketplace events as blocks reach the confirmation depth (a long-running '
+            'sync_chain), from a newHeads subscription or adaptive eth_blockNumber polling')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--confirmations', type=int, default=CONFIRMATIONS,
+                            help=f'Only ingest blocks this deep (default CHAIN_CONFIRMATIONS = {CONFIRMATIONS})')
+        parser.add_argument('--ws-url', default=WS_URL,
+                            help='WebSocket endpoint to subscribe to new heads on (default CHAIN_WS_URL); '
+                                 'without one the head is polled')
+        parser.add_argument('--min-interval', type=float, default=MIN_INTERVAL,
+                            help=f'Shortest wait between polls in seconds (default {MIN_INTERVAL})')
+        parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL,
+                            help=f'Longest wait between polls while the chain is idle (default {MAX_INTERVAL})')
+        parser.add_argument('--quiet-feed', action='store_true',
+                            help='Do not push the new transactions to the live activity feed and timelines')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        notify = not options['quiet_feed']
+        try:
+            if options['ws_url']:
+                self.stdout.write(f"Following new heads from {options['ws_url']}")
+                follow_by_subscription(options['ws_url'], stop, options['confirmations'], notify)
+            else:
+                self.stdout.write(f"Polling for new blocks every {options['min_interval']}-{options['max_interval']}s")
+                follow_by_polling(stop, options['confirmations'], notify,
+                                  PollSchedule(options['min_interval'], options['max_interval']))
+        except KeyboardInterrupt:
+            pass
+        except ReorgTooDeep as e:
+            raise CommandError(str(e))
+        self.stdout.write('Stopped')
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from nft.timeline import trim_timelines, TIMELINE_LENGTH
+
+
+class Command(BaseCommand):
+    help = 'Cap every home timeline at its newest entries (see ACTIVITY_TIMELINE_LENGTH)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=TIMELINE_LENGTH,
+                            help=f'Entries to keep per timeline (default {TIMELINE_LENGTH})')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = trim_timelines(length=options['length'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} timeline entries in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,105 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (an empty, writable directory)
+# before the workers start; every worker then writes its samples there and
+# /metrics aggregates all of them. backend/gunicorn.conf.py marks exited
+# workers dead so their live gauges drop out.
+
+REQUEST_LATENCY = Histogram(
+    'nft_http_request_duration_seconds',
+    'Request latency by URL name',
+    ['view', 'method'],
+)
+DB_QUERIES = Counter(
+    'nft_db_queries_total',
+    'Database queries executed, by URL name',
+    ['view'],
+)
+DB_TIME = Counter(
+    'nft_db_query_seconds_total',
+    'Time spent in database queries, by URL name',
+    ['view'],
+)
+WEB3_LATENCY = Histogram(
+    'nft_web3_call_duration_seconds',
+    'Web3 RPC latency by contract function (or RPC method for non-contract calls)',
+    ['function'],
+)
+IPFS_UPLOAD_BYTES = Counter(
+    'nft_ipfs_upload_bytes_total',
+    'Bytes uploaded to Pinata',
+)
+IPFS_UPLOAD_LATENCY = Histogram(
+    'nft_ipfs_upload_duration_seconds',
+    'Pinata upload latency',
+)
+IPFS_FETCH_LATENCY = Histogram(
+    'nft_ipfs_fetch_duration_seconds',
+    'Latency of the winning gateway when resolving token metadata, by gateway',
+    ['gateway'],
+)
+CACHE_REQUESTS = Counter(
+    'nft_cache_requests_total',
+    'Cache lookups by cache name and result (hit/miss)',
+    ['cache', 'result'],
+)
+
+# Labelled children are looked up once and reused; labels() takes a lock
+_request_children = {}
+
+# Any other verb a client sends is counted as 'other', so it cannot mint label values
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'CONNECT', 'TRACE'})
+
+
+def observe_request(view, method, seconds, queries, db_seconds):
+    if method not in HTTP_METHODS:
+        method = 'other'
+    children = _request_children.get((view, method))
+    if children is None:
+        children = (
+            REQUEST_LATENCY.labels(view, method),
+            DB_QUERIES.labels(view),
+            DB_TIME.labels(view),
+        )
+        _request_children[(view, method)] = children
+    latency, query_count, query_time = children
+    latency.observe(seconds)
+    if queries:
+        query_count.inc(queries)
+        query_time.inc(db_seconds)
+
+
+def observe_web3(function, seconds):
+    WEB3_LATENCY.labels(function).observe(seconds)
+
+
+def observe_ipfs_upload(num_bytes, seconds):
+    IPFS_UPLOAD_BYTES.inc(num_bytes)
+    IPFS_UPLOAD_LATENCY.observe(seconds)
+
+
+def observe_ipfs_fetch(gateway, seconds):
+    IPFS_FETCH_LATENCY.labels(gateway).observe(seconds)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def render():
+    """Return (body, content_type) in the Prometheus text format"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
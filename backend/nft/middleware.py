@@ -0,0 +1,129 @@
+import json
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from .db_routers import pick_replica, use_replica, reset_replica
+from .instrumentation import start_request, end_request, db_execute_wrapper, endpoint_stats
+from .metrics import observe_request
+
+REPLICA_PIN_COOKIE = 'db_pin'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route read-only views listed in settings.REPLICA_READ_VIEWS to a replica.
+
+    After a client makes a successful write (POST/PUT/PATCH/DELETE) it gets a
+    short-lived cookie that pins its reads to the default database, so e.g.
+    toggle_nft_like followed by get_combined_nfts sees its own like.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                reset_replica(request._replica_token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(
+                REPLICA_PIN_COOKIE,
+                str(time.time() + sticky_seconds),
+                max_age=sticky_seconds,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        match = request.resolver_match
+        if not match or match.url_name not in getattr(settings, 'REPLICA_READ_VIEWS', ()):
+            return None
+        if self._is_pinned(request):
+            return None
+        alias = pick_replica()
+        if alias:
+            request._replica_token = use_replica(alias)
+        return None
+
+    def _is_pinned(self, request):
+        """True while the client is inside its read-your-writes window"""
+        pinned_until = request.COOKIES.get(REPLICA_PIN_COOKIE)
+        if not pinned_until:
+            return False
+        try:
+            return float(pinned_until) > time.time()
+        except ValueError:
+            return False
+
+
+class PerformanceMiddleware:
+    """
+    Time each request's DB queries, Web3 RPC calls, IPFS uploads and JSON
+    serialization, report them in a Server-Timing header and feed the
+    per-endpoint percentiles served by get_perf_stats and the Prometheus
+    metrics served at /metrics.
+
+    With settings.PERF_DEBUG_FOOTER on, ?debug_timing=1 also adds the
+    breakdown to JSON responses under "_timing".
+    """
+
+    TIMED_KINDS = ('db', 'rpc', 'ipfs', 'ser')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(db_execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        metrics = {kind: timings.durations[kind] * 1000 for kind in self.TIMED_KINDS}
+        metrics['app'] = max(0.0, total_ms - sum(metrics.values()))
+        metrics['total'] = total_ms
+        metrics['queries'] = timings.counts['db']
+        metrics['rpc_calls'] = timings.counts['rpc']
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics["db"]:.2f};desc="{metrics["queries"]} queries"',
+            f'rpc;dur={metrics["rpc"]:.2f};desc="{metrics["rpc_calls"]} calls"',
+            f'ipfs;dur={metrics["ipfs"]:.2f}',
+            f'ser;dur={metrics["ser"]:.2f}',
+            f'app;dur={metrics["app"]:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unmatched'
+        if view != 'unmatched':
+            endpoint_stats.record(view, metrics)
+        observe_request(view, request.method, total_ms / 1000, metrics['queries'], timings.durations['db'])
+
+        if getattr(settings, 'PERF_DEBUG_FOOTER', False) and request.GET.get('debug_timing'):
+            self._add_footer(response, metrics)
+        return response
+
+    def _add_footer(self, response, metrics):
+        if not response.get('Content-Type', '').startswith('application/json') or response.streaming:
+            return
+        try:
+            data = json.loads(response.content)
+        except ValueError:
+            return
+        if isinstance(data, dict):
+            data['_timing'] = {key: round(value, 3) for key, value in metrics.items()}
+            response.content = json.dumps(data)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:28
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def backfill_nft_counts(apps, schema_editor):
+    """
+    nfts_owned and nfts_created from the same grouped queries as
+    rebuild_profile_stats, creating profiles for owners and creators without
+    one. Addresses are not canonical until 0004, so they are grouped and
+    matched case-insensitively.
+    """
+    NFT = apps.get_model('nft', 'NFT')
+    UserProfile = apps.get_model('nft', 'UserProfile')
+    live = NFT.objects.filter(is_burned=False)
+    counts = {}
+    for column, field in (('owner_address', 'nfts_owned'), ('creator_address', 'nfts_created')):
+        for address, n in (live.annotate(address=Lower(column)).values('address').annotate(n=Count('id'))
+                           .values_list('address', 'n')):
+            if address:
+                counts.setdefault(address, {})[field] = n
+    existing = set(UserProfile.objects.annotate(address=Lower('wallet_address')).values_list('address', flat=True))
+    UserProfile.objects.bulk_create(
+        [UserProfile(wallet_address=address, username=f"User{address[-4:]}") for address in counts
+         if address not in existing],
+        batch_size=2000,
+    )
+    for address, fields in counts.items():
+        UserProfile.objects.filter(wallet_address__iexact=address).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0002_add_nft_management_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='nfts_created',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='nfts_owned',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_nft_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:32
+
+import nft.fields
+from django.db import migrations, transaction
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Lower
+
+# Rows per UPDATE when lowercasing; each chunk commits on its own
+CHUNK_SIZE = 10_000
+
+ADDRESS_COLUMNS = [
+    ('UserProfile', ['wallet_address']),
+    ('NFT', ['owner_address', 'creator_address', 'highest_bidder']),
+    ('Collection', ['creator_address']),
+    ('Transaction', ['from_address', 'to_address']),
+    ('Favorite', ['user_address']),
+    ('NFTView', ['viewer_address']),
+]
+
+PROFILE_FIELDS = ['username', 'avatar_url', 'banner_url', 'bio', 'website', 'twitter', 'instagram', 'discord']
+
+
+def merge_duplicate_profiles(apps):
+    """Fold profiles whose wallet_address differs only by case into the oldest one"""
+    UserProfile = apps.get_model('nft', 'UserProfile')
+    Follow = UserProfile.following.through
+    duplicates = (UserProfile.objects.annotate(canonical=Lower('wallet_address'))
+                  .values('canonical').annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1))
+    for group in duplicates:
+        with transaction.atomic():
+            keeper = UserProfile.objects.get(id=group['keep'])
+            others = list(UserProfile.objects.filter(wallet_address__iexact=group['canonical']).exclude(id=keeper.id))
+            for other in others:
+                for field in PROFILE_FIELDS:
+                    if not getattr(keeper, field) and getattr(other, field):
+                        setattr(keeper, field, getattr(other, field))
+            keeper.save()
+            other_ids = [other.id for other in others]
+            edges = set(Follow.objects.filter(
+                Q(from_userprofile_id__in=other_ids) | Q(to_userprofile_id__in=other_ids)
+            ).values_list('from_userprofile_id', 'to_userprofile_id'))
+            Follow.objects.filter(Q(from_userprofile_id__in=other_ids) | Q(to_userprofile_id__in=other_ids)).delete()
+            remap = lambda profile_id: keeper.id if profile_id in other_ids else profile_id
+            Follow.objects.bulk_create([
+                Follow(from_userprofile_id=source, to_userprofile_id=target)
+                for source, target in {(remap(a), remap(b)) for a, b in edges}
+                if source != target
+            ], ignore_conflicts=True)
+            UserProfile.objects.filter(id__in=other_ids).delete()
+
+
+def drop_duplicate_rows(apps, model_name, address_field, other_fields):
+    """Delete rows that would collide on a unique constraint once the address is lowercased"""
+    Model = apps.get_model('nft', model_name)
+    duplicates = (Model.objects.annotate(canonical=Lower(address_field))
+                  .values('canonical', *other_fields).annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1))
+    for group in duplicates:
+        Model.objects.filter(
+            **{f'{address_field}__iexact': group['canonical']},
+            **{field: group[field] for field in other_fields},
+        ).exclude(id=group['keep']).delete()
+
+
+def lowercase_addresses(apps, schema_editor):
+    merge_duplicate_profiles(apps)
+    drop_duplicate_rows(apps, 'Favorite', 'user_address', ['nft'])
+    drop_duplicate_rows(apps, 'NFTView', 'viewer_address', ['nft', 'ip_address'])
+    for model_name, fields in ADDRESS_COLUMNS:
+        Model = apps.get_model('nft', model_name)
+        bounds = Model.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, CHUNK_SIZE):
+            chunk = Model.objects.filter(id__gte=start, id__lt=start + CHUNK_SIZE)
+            with transaction.atomic():
+                for field in fields:
+                    chunk.exclude(**{field: Lower(field)}).exclude(**{f'{field}__isnull': True}).update(
+                        **{field: Lower(field)}
+                    )
+
+
+class Migration(migrations.Migration):
+
+    # Backfill commits chunk by chunk instead of holding one long transaction
+    atomic = False
+
+    dependencies = [
+        ('nft', '0003_add_profile_nft_counts'),
+    ]
+
+    operations = [
+        # Lowercase first so the new indexes are built once over canonical values
+        migrations.RunPython(lowercase_addresses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='collection',
+            name='creator_address',
+            field=nft.fields.AddressField(),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user_address',
+            field=nft.fields.AddressField(default='0x0000000000000000000000000000000000000000'),
+        ),
+        migrations.AlterField(
+            model_name='nft',
+            name='creator_address',
+            field=nft.fields.AddressField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='nft',
+            name='highest_bidder',
+            field=nft.fields.AddressField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nft',
+            name='owner_address',
+            field=nft.fields.AddressField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='nftview',
+            name='viewer_address',
+            field=nft.fields.AddressField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='from_address',
+            field=nft.fields.AddressField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='to_address',
+            field=nft.fields.AddressField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='wallet_address',
+            field=nft.fields.AddressField(unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_follow_counts(apps, schema_editor):
+    UserProfile = apps.get_model('nft', 'UserProfile')
+    Follow = UserProfile.following.through
+    for column, field in (('to_userprofile_id', 'followers_count'), ('from_userprofile_id', 'following_count')):
+        counts = Follow.objects.values(column).annotate(n=Count('id')).values_list(column, 'n')
+        for profile_id, n in counts:
+            UserProfile.objects.filter(id=profile_id).update(**{field: n})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0004_canonical_addresses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
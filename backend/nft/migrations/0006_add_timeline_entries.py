@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0005_add_profile_follow_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='nft.userprofile')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='nft.transaction')),
+            ],
+            options={
+                'db_table': 'timeline_entries',
+                'unique_together': {('owner', 'transaction')},
+            },
+        ),
+    ]
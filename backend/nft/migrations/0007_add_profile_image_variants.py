@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0006_add_timeline_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='banner_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
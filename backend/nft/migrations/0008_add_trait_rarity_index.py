@@ -0,0 +1,81 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0007_add_profile_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NFTTrait',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'db_table': 'nft_traits',
+            },
+        ),
+        migrations.CreateModel(
+            name='TraitCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=255, unique=True)),
+                ('nft_count', models.IntegerField(default=0)),
+                ('version', models.IntegerField(default=0)),
+                ('ranked_version', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'trait_collections',
+            },
+        ),
+        migrations.CreateModel(
+            name='TraitValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=255)),
+                ('trait_type', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'trait_values',
+            },
+        ),
+        migrations.AddField(
+            model_name='nft',
+            name='rarity_rank',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='nft',
+            name='rarity_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='nft',
+            index=models.Index(fields=['collection', 'rarity_rank'], name='nfts_collection_rarity_idx'),
+        ),
+        migrations.AddField(
+            model_name='nfttrait',
+            name='nft',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='traits', to='nft.nft'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='traitvalue',
+            unique_together={('collection', 'trait_type', 'value')},
+        ),
+        migrations.AddField(
+            model_name='nfttrait',
+            name='trait',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='nft.traitvalue'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='nfttrait',
+            unique_together={('nft', 'trait')},
+        ),
+    ]
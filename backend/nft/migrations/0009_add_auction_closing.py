@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0008_add_trait_rarity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nft',
+            name='auction_closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='nft',
+            name='auction_settle_tx',
+            field=models.CharField(blank=True, max_length=66, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='nft',
+            index=models.Index(condition=models.Q(('auction_closed_at__isnull', True), ('is_auction', True)), fields=['auction_end_time'], name='nfts_open_auctions_idx'),
+        ),
+    ]
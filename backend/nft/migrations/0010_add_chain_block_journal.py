@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:14
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0009_add_auction_closing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainBlock',
+            fields=[
+                ('number', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('hash', models.CharField(max_length=66)),
+                ('undo', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('ingested_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'chain_blocks',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:46
+
+from django.db import migrations, models
+
+
+def fold_archived_sales(apps, schema_editor):
+    """Credit sales archived before these fields existed to their NFTs"""
+    from nft.archive import SALE_TYPES, TransactionArchive, fold_sales
+    NFT = apps.get_model('nft', 'NFT')
+    archive = TransactionArchive()
+    for transaction_type in SALE_TYPES:
+        fold_sales(((tx.nft_id, tx.price, tx.timestamp) for tx in archive.iter_transactions(transaction_type)), NFT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nft', '0010_add_chain_block_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nft',
+            name='archived_last_sale_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='nft',
+            name='archived_last_sale_price',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='nft',
+            name='archived_sales_volume',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=18),
+        ),
+        migrations.RunPython(fold_archived_sales, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,17 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
+from .fields import AddressField
 
 class UserProfile(models.Model):
     id = models.AutoField(primary_key=True)  # Explicit id field
-    wallet_address = models.CharField(max_length=42, unique=True)
+    wallet_address = AddressField(unique=True)
     username = models.CharField(max_length=255, null=True, blank=True)
     avatar_url = models.URLField(null=True, blank=True)
     banner_url = models.URLField(null=True, blank=True)
+    # Resized copies of the uploads, {format: {size: url}}; empty while rendering (nft.thumbnails)
+    avatar_variants = models.JSONField(default=dict, blank=True)
+    banner_variants = models.JSONField(default=dict, blank=True)
     bio = models.TextField(null=True, blank=True)
     website = models.URLField(null=True, blank=True)
     twitter = models.CharField(max_length=255, null=True, blank=True)
@@ -15,6 +20,12 @@ class UserProfile(models.Model):
     total_created = models.IntegerField(default=0)
     total_collected = models.IntegerField(default=0)
     total_volume = models.DecimalField(max_digits=18, decimal_places=8, default=0)
+    # Maintained by nft.profile_stats; rebuild with `manage.py rebuild_profile_stats`
+    nfts_owned = models.IntegerField(default=0)
+    nfts_created = models.IntegerField(default=0)
+    # Maintained by nft.follows alongside the following M2M
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
@@ -31,14 +42,17 @@ class NFT(models.Model):
     description = models.TextField()
     image_url = models.URLField()
     token_uri = models.URLField()
-    owner_address = models.CharField(max_length=42)  # Ethereum address
-    creator_address = models.CharField(max_length=42)
+    owner_address = AddressField(db_index=True)  # Ethereum address
+    creator_address = AddressField(db_index=True)
     price = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
     is_listed = models.BooleanField(default=False)
     is_auction = models.BooleanField(default=False)
     auction_end_time = models.DateTimeField(null=True, blank=True)
+    # Set by nft.auctions when auction_end_time passes; settle_tx is the endAuction sent for it, if any
+    auction_closed_at = models.DateTimeField(null=True, blank=True)
+    auction_settle_tx = models.CharField(max_length=66, null=True, blank=True)
     current_bid = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
-    highest_bidder = models.CharField(max_length=42, null=True, blank=True)
+    highest_bidder = AddressField(null=True, blank=True)
     royalty_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     collection = models.CharField(max_length=255, null=True, blank=True)
     category = models.CharField(max_length=100, null=True, blank=True)
@@ -48,12 +62,25 @@ class NFT(models.Model):
     burned_at = models.DateTimeField(null=True, blank=True)  # When it was burned
     hidden_at = models.DateTimeField(null=True, blank=True)  # When it was hidden
     hidden_reason = models.CharField(max_length=255, null=True, blank=True)  # Reason for hiding
+    # Maintained by nft.rarity from the trait index; null until the token's metadata is indexed
+    rarity_score = models.FloatField(null=True, blank=True)
+    rarity_rank = models.IntegerField(null=True, blank=True)  # 1 = rarest in its collection
+    # Sales moved to the archive by archive_transactions, folded in as each part is written
+    archived_sales_volume = models.DecimalField(max_digits=18, decimal_places=8, default=0)
+    archived_last_sale_price = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
+    archived_last_sale_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'nfts'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['collection', 'rarity_rank'], name='nfts_collection_rarity_idx'),
+            # Only auctions still waiting to close, ordered by deadline
+            models.Index(fields=['auction_end_time'], name='nfts_open_auctions_idx',
+                         condition=models.Q(is_auction=True, auction_closed_at__isnull=True)),
+        ]
 
     def __str__(self):
         return f"{self.name} (Token ID: {self.token_id})"
@@ -80,7 +107,7 @@ class NFT(models.Model):
 class Collection(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
-    creator_address = models.CharField(max_length=42)
+    creator_address = AddressField()
     image_url = models.URLField(null=True, blank=True)
     banner_url = models.URLField(null=True, blank=True)
     floor_price = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
@@ -114,8 +141,8 @@ class Transaction(models.Model):
 
     transaction_hash = models.CharField(max_length=66, unique=True)
     nft = models.ForeignKey(NFT, on_delete=models.CASCADE, null=True, blank=True)
-    from_address = models.CharField(max_length=42)
-    to_address = models.CharField(max_length=42)
+    from_address = AddressField(db_index=True)
+    to_address = AddressField(db_index=True)
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     price = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
     block_number = models.IntegerField()
@@ -132,7 +159,7 @@ class Transaction(models.Model):
         return f"{self.transaction_type} - {self.transaction_hash[:10]}..."
 
 class Favorite(models.Model):
-    user_address = models.CharField(max_length=42, default='0x0000000000000000000000000000000000000000')
+    user_address = AddressField(default='0x0000000000000000000000000000000000000000')
     nft = models.ForeignKey(NFT, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -145,7 +172,7 @@ class Favorite(models.Model):
 
 class NFTView(models.Model):
     nft = models.ForeignKey(NFT, on_delete=models.CASCADE, related_name='views')
-    viewer_address = models.CharField(max_length=42, null=True, blank=True)  # Can be null for anonymous views
+    viewer_address = AddressField(null=True, blank=True)  # Can be null for anonymous views
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
     viewed_at = models.DateTimeField(auto_now_add=True)
@@ -159,3 +186,84 @@ class NFTView(models.Model):
         return f"{self.nft.name} viewed by {self.viewer_address or self.ip_address}"
 
 
+class TimelineEntry(models.Model):
+    """
+    A transaction pushed into a follower's home timeline (see nft.timeline).
+    Read newest first through the (owner, transaction) unique index.
+    """
+    # Indexed by the (owner, transaction) unique constraint
+    owner = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='+', db_index=False)
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'timeline_entries'
+        unique_together = ['owner', 'transaction']
+
+    def __str__(self):
+        return f"{self.owner_id} <- {self.transaction_id}"
+
+
+class TraitCollection(models.Model):
+    """
+    Per-collection totals behind the trait rarity index (see nft.rarity).
+    `version` is bumped whenever the collection's trait counts change;
+    ranks are current once `ranked_version` catches up.
+    """
+    # NFT.collection, with '' for NFTs outside any collection
+    collection = models.CharField(max_length=255, unique=True)
+    nft_count = models.IntegerField(default=0)
+    version = models.IntegerField(default=0)
+    ranked_version = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'trait_collections'
+
+    def __str__(self):
+        return f"{self.collection or '(none)'}: {self.nft_count} NFTs"
+
+
+class TraitValue(models.Model):
+    """How many NFTs of a collection have trait_type = value"""
+    collection = models.CharField(max_length=255)
+    trait_type = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'trait_values'
+        unique_together = ['collection', 'trait_type', 'value']
+
+    def __str__(self):
+        return f"{self.collection} {self.trait_type}={self.value} ({self.count})"
+
+
+class NFTTrait(models.Model):
+    """A trait of one NFT, from its token metadata"""
+    # Indexed by the (nft, trait) unique constraint
+    nft = models.ForeignKey(NFT, on_delete=models.CASCADE, related_name='traits', db_index=False)
+    trait = models.ForeignKey(TraitValue, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'nft_traits'
+        unique_together = ['nft', 'trait']
+
+    def __str__(self):
+        return f"{self.nft_id}: {self.trait_id}"
+
+
+class ChainBlock(models.Model):
+    """
+    A recently ingested block (see nft.chain_sync): its hash, to notice
+    when a reorg replaces it, and how to undo what its events changed
+    """
+    number = models.BigIntegerField(primary_key=True)
+    hash = models.CharField(max_length=66)
+    # {'nfts': {token_id: {field: old value}}, 'created_nfts': [...], 'transactions': [...], 'profiles': {...}}
+    undo = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    ingested_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'chain_blocks'
+
+    def __str__(self):
+        return f"#{self.number} {self.hash[:10]}"
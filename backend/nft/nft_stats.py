@@ -0,0 +1,84 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from .archive import SALE_TYPES
+from .models import NFT, NFTView, Favorite, Transaction
+from .rarity import traits_of
+from .token_metadata import local_metadata, metadata_attributes
+
+# Cards hydrated per get_nft_stats_batch call (a couple of grid pages)
+MAX_STATS_BATCH = 100
+
+
+def parse_nft_id(nft_id):
+    """Database id or token id from a card id ('local_12' or '12'), or None"""
+    nft_id = str(nft_id)
+    if nft_id.startswith('local_'):
+        nft_id = nft_id[len('local_'):]
+    try:
+        return int(nft_id)
+    except ValueError:
+        return None
+
+
+def resolve_nfts(nft_ids):
+    """
+    {requested id: NFT} for card ids, in one query. Like get_nft_stats, a
+    number is tried as the database id first and then as the token id.
+    Unknown ids are left out. Each NFT carries `last_sale_price`, from the
+    archive when it has no sales left in the hot table.
+    """
+    numbers = {nft_id: parse_nft_id(nft_id) for nft_id in nft_ids}
+    wanted = {n for n in numbers.values() if n is not None}
+    if not wanted:
+        return {}
+    last_sale = Transaction.objects.filter(
+        nft=OuterRef('pk'), transaction_type__in=SALE_TYPES,
+    ).order_by('-timestamp').values('price')[:1]
+    nfts = list(NFT.objects.filter(Q(id__in=wanted) | Q(token_id__in=wanted))
+                .annotate(last_sale_price=Coalesce(Subquery(last_sale), F('archived_last_sale_price'))))
+    by_id = {nft.id: nft for nft in nfts}
+    by_token = {nft.token_id: nft for nft in nfts}
+    resolved = {}
+    for nft_id, number in numbers.items():
+        nft = by_id.get(number) or by_token.get(number)
+        if nft is not None:
+            resolved[nft_id] = nft
+    return resolved
+
+
+def _counts(model, nft_ids):
+    return dict(model.objects.filter(nft_id__in=nft_ids).values('nft_id')
+                .annotate(n=Count('id')).values_list('nft_id', 'n'))
+
+
+def nft_stats(nfts):
+    """
+    {nft id: get_nft_stats payload} for NFTs from resolve_nfts(), with a
+    fixed number of grouped queries however many there are
+    """
+    ids = [nft.id for nft in nfts]
+    likes = _counts(Favorite, ids)
+    views = _counts(NFTView, ids)
+    volumes = dict(Transaction.objects.filter(nft_id__in=ids, transaction_type__in=SALE_TYPES, price__isnull=False)
+                   .values('nft_id').annotate(total=Sum('price')).values_list('nft_id', 'total'))
+    traits = traits_of(nfts)
+
+    stats = {}
+    for nft in nfts:
+        total_volume = (volumes.get(nft.id) or 0) + nft.archived_sales_volume
+        properties = traits.get(nft.id)
+        if properties is None:
+            # Not indexed yet: the bare traits from its cached metadata (if any)
+            properties = metadata_attributes(local_metadata(nft.token_uri))
+        stats[nft.id] = {
+            'views': views.get(nft.id, 0),
+            'likes': likes.get(nft.id, 0),
+            # Ownership history is not tracked
+            'owners': 1,
+            'last_sale': f"Ξ{float(nft.last_sale_price)}" if nft.last_sale_price else 'No sales yet',
+            'total_volume': f"Ξ{float(total_volume)}" if total_volume > 0 else "0 ETH",
+            'properties': properties,
+            'rarity_rank': nft.rarity_rank,
+            'rarity_score': nft.rarity_score,
+        }
+    return stats
@@ -0,0 +1,162 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from .models import NFT, Transaction, UserProfile
+from .archive import TransactionArchive
+
+# Aggregates kept on UserProfile:
+#   nfts_owned      unburned NFTs currently owned
+#   nfts_created    unburned NFTs created
+#   total_created   NFTs ever created (burns do not decrement it)
+#   total_collected NFTs bought
+#   total_volume    sale volume as buyer or seller
+#   followers_count / following_count  follow edges in and out (kept by nft.follows)
+STAT_FIELDS = ('nfts_owned', 'nfts_created', 'total_created', 'total_collected', 'total_volume',
+               'followers_count', 'following_count')
+
+SALE_TYPE = 'buy'
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def apply_profile_deltas(deltas):
+    """
+    Apply {wallet_address: {field: delta}} to UserProfile rows, creating
+    profiles that do not exist yet. Each profile is bumped with a single
+    UPDATE ... SET field = field + delta, so concurrent writers never lose
+    each other's increments.
+    """
+    deltas = {
+        address: {field: delta for field, delta in changes.items() if delta}
+        for address, changes in deltas.items() if address
+    }
+    deltas = {address: changes for address, changes in deltas.items() if changes}
+    if not deltas:
+        return
+    with transaction.atomic():
+        UserProfile.objects.bulk_create(
+            [UserProfile(wallet_address=address, username=f"User{address[-4:]}") for address in deltas],
+            ignore_conflicts=True,
+        )
+        for address, changes in deltas.items():
+            UserProfile.objects.filter(wallet_address=address).update(
+                **{field: F(field) + delta for field, delta in changes.items()}
+            )
+
+
+def record_registration(nft):
+    """Count a newly registered NFT for its creator and owner"""
+    deltas = defaultdict(dict)
+    deltas[nft.creator_address].update(nfts_created=1, total_created=1)
+    deltas[nft.owner_address]['nfts_owned'] = 1
+    apply_profile_deltas(deltas)
+
+
+def record_transfer(nft, old_owner, price=None, sale=False):
+    """
+    Count nft (already saved with its new owner) as moving from old_owner;
+    sales also add to the buyer's collected count and both sides' volume
+    """
+    new_owner = nft.owner_address
+    deltas = defaultdict(lambda: defaultdict(int))
+    if not nft.is_burned:
+        deltas[old_owner]['nfts_owned'] -= 1
+        deltas[new_owner]['nfts_owned'] += 1
+    if sale:
+        volume = Decimal(str(price)) if price else Decimal(0)
+        deltas[new_owner]['total_collected'] += 1
+        deltas[new_owner]['total_volume'] += volume
+        deltas[old_owner]['total_volume'] += volume
+    apply_profile_deltas(deltas)
+
+
+def record_burn(nft):
+    """Drop a burned NFT from its owner's and creator's current counts"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    deltas[nft.owner_address]['nfts_owned'] -= 1
+    deltas[nft.creator_address]['nfts_created'] -= 1
+    apply_profile_deltas(deltas)
+
+
+def rebuild_profile_stats(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute every profile's aggregates from NFTs, sale transactions
+    (hot and archived) and follow edges with one grouped query per
+    aggregate, creating profiles for addresses that only appear as owners,
+    creators or traders.
+    Returns the number of profiles whose aggregates changed.
+    """
+    stats = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+
+    owned = (NFT.objects.filter(is_burned=False).values('owner_address')
+             .annotate(n=Count('id')).values_list('owner_address', 'n'))
+    for address, n in owned:
+        stats[address]['nfts_owned'] = n
+
+    created = (NFT.objects.values('creator_address')
+               .annotate(total=Count('id'), live=Count('id', filter=Q(is_burned=False)))
+               .values_list('creator_address', 'total', 'live'))
+    for address, total, live in created:
+        stats[address]['total_created'] = total
+        stats[address]['nfts_created'] = live
+
+    sales = Transaction.objects.filter(transaction_type=SALE_TYPE)
+    for address, n, volume in (sales.values('to_address')
+                               .annotate(n=Count('id'), volume=Sum('price'))
+                               .values_list('to_address', 'n', 'volume')):
+        stats[address]['total_collected'] = n
+        stats[address]['total_volume'] += volume or 0
+    for address, volume in (sales.values('from_address').annotate(volume=Sum('price'))
+                            .values_list('from_address', 'volume')):
+        stats[address]['total_volume'] += volume or 0
+    # Sales moved out of the hot table by archive_transactions
+    for sale in TransactionArchive().iter_transactions(transaction_type=SALE_TYPE):
+        stats[sale.to_address]['total_collected'] += 1
+        stats[sale.to_address]['total_volume'] += sale.price or 0
+        stats[sale.from_address]['total_volume'] += sale.price or 0
+    stats.pop('', None)
+
+    Follow = UserProfile.following.through
+    for side, field in (('to_userprofile', 'followers_count'), ('from_userprofile', 'following_count')):
+        for address, n in (Follow.objects.values(f'{side}__wallet_address').annotate(n=Count('id'))
+                           .values_list(f'{side}__wallet_address', 'n')):
+            stats[address][field] = n
+
+    with transaction.atomic():
+        UserProfile.objects.bulk_create(
+            [UserProfile(wallet_address=address, username=f"User{address[-4:]}") for address in stats],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        zero = dict.fromkeys(STAT_FIELDS, 0)
+        profiles = UserProfile.objects.only('id', 'wallet_address', *STAT_FIELDS).order_by('id')
+        # bulk_update builds a CASE expression per field in Python, which
+        # dominated the rebuild; a plain executemany UPDATE avoids that
+        fields = [UserProfile._meta.get_field(name) for name in STAT_FIELDS]
+        qn = connection.ops.quote_name
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            qn(UserProfile._meta.db_table),
+            ', '.join(f'{qn(field.column)} = %s' for field in fields),
+            qn(UserProfile._meta.pk.column),
+        )
+        written = 0
+        last_id = 0
+        with connection.cursor() as cursor:
+            # Page by primary key rather than iterating one cursor while updating the same table
+            while True:
+                page = list(profiles.filter(id__gt=last_id)[:batch_size])
+                if not page:
+                    break
+                last_id = page[-1].id
+                changed = []
+                for profile in page:
+                    values = stats.get(profile.wallet_address, zero)
+                    if any(getattr(profile, name) != values[name] for name in STAT_FIELDS):
+                        changed.append(tuple(
+                            field.get_db_prep_save(values[field.name], connection) for field in fields
+                        ) + (profile.id,))
+                if changed:
+                    cursor.executemany(sql, changed)
+                    written += len(changed)
+    return written
@@ -0,0 +1,279 @@
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from .models import NFT, NFTTrait, TraitCollection, TraitValue
+from .token_metadata import FETCH_CONCURRENCY, cached_metadata, fetch_metadata, metadata_attributes, request_metadata
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait after a collection's traits change before re-ranking it,
+# so a burst of registrations costs one pass over the collection
+RANK_DELAY = getattr(settings, 'RARITY_RANK_DELAY', 5)
+# Traits indexed per NFT; metadata with more is truncated
+MAX_TRAITS = 50
+BATCH_SIZE = 1000
+
+
+def collection_key(collection):
+    """TraitCollection/TraitValue key for NFT.collection ('' for none)"""
+    return collection or ''
+
+
+def in_collection(key):
+    """NFTs (as a Q) whose collection has the given key"""
+    return Q(collection=key) if key else Q(collection__isnull=True) | Q(collection='')
+
+
+def trait_pairs(metadata):
+    """Distinct (trait_type, value) strings of metadata, cut to the column sizes"""
+    pairs = {}
+    for attr in metadata_attributes(metadata)[:MAX_TRAITS]:
+        value = attr['value']
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        pairs[(attr['trait_type'][:100], str(value)[:255])] = None
+    return list(pairs)
+
+
+def _trait_ids(key, pairs):
+    """TraitValue ids for pairs in collection key, creating the missing rows"""
+    match = Q()
+    for trait_type, value in pairs:
+        match |= Q(trait_type=trait_type, value=value)
+    existing = TraitValue.objects.filter(match, collection=key)
+    ids = {(t, v): pk for pk, t, v in existing.values_list('id', 'trait_type', 'value')}
+    missing = [pair for pair in pairs if pair not in ids]
+    if missing:
+        TraitValue.objects.bulk_create(
+            [TraitValue(collection=key, trait_type=t, value=v) for t, v in missing], ignore_conflicts=True,
+        )
+        ids.update({(t, v): pk for pk, t, v in existing.values_list('id', 'trait_type', 'value')})
+    return [ids[pair] for pair in pairs]
+
+
+def index_nft(nft, metadata):
+    """
+    Add nft's traits (from its token metadata) to the index and bump the
+    counts they touch. Scores and ranks follow with the next
+    rank_collection(). Returns False if nft has no traits or is already
+    indexed.
+    """
+    return index_pairs(nft, trait_pairs(metadata))
+
+
+def index_pairs(nft, pairs):
+    """index_nft() for (trait_type, value) pairs already extracted, e.g. those unindex_nft() returned"""
+    if not pairs:
+        return False
+    key = collection_key(nft.collection)
+    with transaction.atomic():
+        if NFTTrait.objects.filter(nft_id=nft.id).exists():
+            return False
+        TraitCollection.objects.get_or_create(collection=key)
+        TraitCollection.objects.filter(collection=key).update(
+            nft_count=F('nft_count') + 1, version=F('version') + 1)
+        trait_ids = _trait_ids(key, pairs)
+        TraitValue.objects.filter(id__in=trait_ids).update(count=F('count') + 1)
+        NFTTrait.objects.bulk_create([NFTTrait(nft_id=nft.id, trait_id=trait_id) for trait_id in trait_ids])
+    return True
+
+
+def unindex_nft(nft):
+    """
+    Take nft (e.g. burned) out of its collection's trait counts. Returns
+    the (trait_type, value) pairs it was indexed with, so index_pairs() can
+    put it back; empty if it was not indexed.
+    """
+    key = collection_key(nft.collection)
+    with transaction.atomic():
+        traits = list(NFTTrait.objects.filter(nft_id=nft.id).values_list('trait_id', 'trait__trait_type', 'trait__value'))
+        if not traits:
+            return []
+        trait_ids = [trait_id for trait_id, _, _ in traits]
+        NFTTrait.objects.filter(nft_id=nft.id).delete()
+        TraitValue.objects.filter(id__in=trait_ids).update(count=F('count') - 1)
+        TraitValue.objects.filter(id__in=trait_ids, count__lte=0).delete()
+        TraitCollection.objects.filter(collection=key).update(
+            nft_count=F('nft_count') - 1, version=F('version') + 1)
+        NFT.objects.filter(id=nft.id).update(rarity_score=None, rarity_rank=None)
+    return [(trait_type, value) for _, trait_type, value in traits]
+
+
+def score(counts, size):
+    """Information content of a set of traits: sum of -log2(share of the collection with each)"""
+    return sum(math.log2(size / count) for count in counts)
+
+
+def rank_collection(key):
+    """
+    Recompute rarity_score and rarity_rank of every indexed NFT in a
+    collection from the trait counts; rank 1 is the rarest and equal scores
+    share a rank. Only rows whose score or rank moved are written. Returns
+    the number of NFTs updated.
+    """
+    stats = TraitCollection.objects.filter(collection=key).values('nft_count', 'version').first()
+    if stats is None:
+        return 0
+    counts = defaultdict(list)
+    for nft_id, count in NFTTrait.objects.filter(trait__collection=key).values_list(
+            'nft_id', 'trait__count').iterator():
+        counts[nft_id].append(count)
+    size = max(stats['nft_count'], 1)
+    scores = {nft_id: round(score(trait_counts, size), 6) for nft_id, trait_counts in counts.items()}
+
+    ranks = {}
+    previous = None
+    for position, nft_id in enumerate(sorted(scores, key=scores.get, reverse=True), 1):
+        if scores[nft_id] != previous:
+            rank, previous = position, scores[nft_id]
+        ranks[nft_id] = rank
+
+    changed = [
+        NFT(id=nft_id, rarity_score=scores.get(nft_id), rarity_rank=ranks.get(nft_id))
+        for nft_id, old_score, old_rank in NFT.objects.filter(in_collection(key)).values_list(
+            'id', 'rarity_score', 'rarity_rank').iterator()
+        if (old_score, old_rank) != (scores.get(nft_id), ranks.get(nft_id))
+    ]
+    with transaction.atomic():
+        NFT.objects.bulk_update(changed, ['rarity_score', 'rarity_rank'], batch_size=BATCH_SIZE)
+        # Changes made meanwhile bump version again and keep the collection pending
+        TraitCollection.objects.filter(collection=key).update(ranked_version=stats['version'])
+    return len(changed)
+
+
+def rank_pending():
+    """Re-rank every collection whose traits changed since it was last ranked; returns NFTs updated"""
+    keys = TraitCollection.objects.exclude(version=F('ranked_version')).values_list('collection', flat=True)
+    return sum(rank_collection(key) for key in list(keys))
+
+
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def schedule_rank(key):
+    """Re-rank collection key after RANK_DELAY seconds, once however many times it is called meanwhile"""
+    with _scheduled_lock:
+        if key in _scheduled:
+            return
+        _scheduled.add(key)
+    timer = threading.Timer(RANK_DELAY, _run_rank, args=(key,))
+    timer.daemon = True
+    timer.start()
+
+
+def _run_rank(key):
+    with _scheduled_lock:
+        _scheduled.discard(key)
+    try:
+        rank_collection(key)
+    except Exception:
+        logger.exception("Failed to rank collection %r", key)
+    finally:
+        # The timer thread ends here; do not leave its connection behind
+        connections.close_all()
+
+
+def index_in_background(nft):
+    """Fetch nft's metadata if needed, index its traits and re-rank its collection, off the request path"""
+    def indexed(metadata):
+        if metadata is not None and index_nft(nft, metadata):
+            schedule_rank(collection_key(nft.collection))
+
+    request_metadata(nft.token_uri, callback=indexed)
+
+
+def index_many_in_background(nfts):
+    """
+    index_in_background for a batch (e.g. a collection drop) as one job:
+    metadata fetched FETCH_CONCURRENCY CIDs at a time, each NFT indexed as
+    its metadata arrives, and each affected collection ranked once at the end
+    """
+    nfts = list(nfts)
+    if nfts:
+        threading.Thread(target=_index_many, args=(nfts,), name='rarity-index', daemon=True).start()
+
+
+def _index_many(nfts):
+    try:
+        with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix='rarity-fetch') as pool:
+            # Fetches run in the pool; the index is written from this thread only
+            for nft, metadata in zip(nfts, pool.map(fetch_metadata, [nft.token_uri for nft in nfts])):
+                if metadata is not None:
+                    index_nft(nft, metadata)
+        rank_pending()
+    except Exception:
+        logger.exception("Failed to index %d NFTs", len(nfts))
+    finally:
+        connections.close_all()
+
+
+def rebuild_rarity():
+    """
+    Rebuild the whole index from cached token metadata (NFTs whose metadata
+    is not cached are left out; see fetch_token_metadata) and rank every
+    collection. Burned NFTs are not counted. Returns (NFTs indexed,
+    collections).
+    """
+    traits = {}
+    for nft_id, collection, token_uri in NFT.objects.filter(is_burned=False).exclude(
+            token_uri='').values_list('id', 'collection', 'token_uri').iterator():
+        pairs = trait_pairs(cached_metadata(token_uri))
+        if pairs:
+            traits[nft_id] = (collection_key(collection), pairs)
+
+    values = Counter((key, t, v) for key, pairs in traits.values() for t, v in pairs)
+    sizes = Counter(key for key, _ in traits.values())
+    with transaction.atomic():
+        NFTTrait.objects.all().delete()
+        TraitValue.objects.all().delete()
+        TraitCollection.objects.all().delete()
+        NFT.objects.filter(rarity_rank__isnull=False).update(rarity_score=None, rarity_rank=None)
+        TraitCollection.objects.bulk_create(
+            [TraitCollection(collection=key, nft_count=n, version=1) for key, n in sizes.items()],
+            batch_size=BATCH_SIZE,
+        )
+        TraitValue.objects.bulk_create(
+            [TraitValue(collection=key, trait_type=t, value=v, count=n) for (key, t, v), n in values.items()],
+            batch_size=BATCH_SIZE,
+        )
+        ids = {(key, t, v): pk for pk, key, t, v in TraitValue.objects.values_list(
+            'id', 'collection', 'trait_type', 'value').iterator()}
+        NFTTrait.objects.bulk_create(
+            (NFTTrait(nft_id=nft_id, trait_id=ids[key, t, v])
+             for nft_id, (key, pairs) in traits.items() for t, v in pairs),
+            batch_size=BATCH_SIZE,
+        )
+    for key in sizes:
+        rank_collection(key)
+    return len(traits), len(sizes)
+
+
+def traits_of(nfts):
+    """
+    Indexed traits of each of nfts with their share of its collection, in
+    two queries: {nft id: [{'trait_type', 'value', 'count', 'rarity'}]}.
+    NFTs that are not indexed are left out.
+    """
+    rows = defaultdict(list)
+    for nft_id, trait_type, value, count in NFTTrait.objects.filter(nft_id__in=[nft.id for nft in nfts]).order_by(
+            'trait__trait_type').values_list('nft_id', 'trait__trait_type', 'trait__value', 'trait__count'):
+        rows[nft_id].append((trait_type, value, count))
+    if not rows:
+        return {}
+    keys = {collection_key(nft.collection) for nft in nfts if nft.id in rows}
+    sizes = dict(TraitCollection.objects.filter(collection__in=keys).values_list('collection', 'nft_count'))
+    traits = {}
+    for nft in nfts:
+        if nft.id in rows:
+            size = sizes.get(collection_key(nft.collection)) or 1
+            traits[nft.id] = [
+                {'trait_type': trait_type, 'value': value, 'count': count, 'rarity': f"{100 * count / size:.3g}%"}
+                for trait_type, value, count in rows[nft.id]
+            ]
+    return traits
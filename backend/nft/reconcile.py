@@ -0,0 +1,168 @@
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .auctions import schedule_auctions
+from .fields import normalize_address
+from .models import NFT
+from .profile_stats import apply_profile_deltas
+from .web3_utils import LISTING_FIELDS, PRICE_QUANTUM, ZERO_ADDRESS, from_wei, web3_instance
+
+# Tokens per JSON-RPC batch (two eth_calls each) and batches in flight at once
+BATCH_SIZE = 250
+CONCURRENCY = 8
+
+# DB columns checked against the chain, in the order of the snapshot rows
+FIELDS = ('owner_address', 'is_listed', 'is_auction', 'price', 'auction_end_time', 'current_bid', 'highest_bidder')
+
+
+def chain_state(token_ids, block):
+    """
+    {token_id: (owner or None, listing dict or None)} for token_ids at
+    block, from one batched request (ownerOf and getListing per token).
+    None means the call reverted, e.g. the token was never minted.
+    """
+    calls = []
+    for token_id in token_ids:
+        calls.append(('ownerOf', [token_id]))
+        calls.append(('getListing', [token_id]))
+    results = web3_instance.batch_call(calls, block)
+    state = {}
+    for i, token_id in enumerate(token_ids):
+        owner, listing = results[2 * i], results[2 * i + 1]
+        state[token_id] = (normalize_address(owner) if owner else None,
+                           dict(zip(LISTING_FIELDS, listing)) if listing else None)
+    return state
+
+
+def expected_fields(row, owner, listing):
+    """The FIELDS values the chain implies for a snapshot row, for the fields it says anything about"""
+    expected = {'owner_address': owner}
+    if listing is None:
+        return expected
+    closed = row[-1] is not None
+    if listing['isActive'] and listing['isAuction'] and closed:
+        # Closed here, waiting for endAuction on-chain (see nft.auctions)
+        return expected
+    expected['is_listed'] = listing['isActive']
+    if listing['isActive']:
+        expected['is_auction'] = listing['isAuction']
+        expected['price'] = from_wei(listing['price'])
+        if listing['isAuction']:
+            expected['auction_end_time'] = datetime.fromtimestamp(listing['auctionEndTime'], dt_timezone.utc)
+            expected['current_bid'] = from_wei(listing['highestBid']) if listing['highestBid'] else None
+            bidder = normalize_address(listing['highestBidder'])
+            expected['highest_bidder'] = bidder if bidder != ZERO_ADDRESS else None
+    return expected
+
+
+def _same(field, db, chain):
+    if field == 'auction_end_time' and db is not None and chain is not None:
+        return int(db.timestamp()) == int(chain.timestamp())
+    if field in ('price', 'current_bid') and db is not None and chain is not None:
+        return Decimal(db).quantize(PRICE_QUANTUM) == chain
+    return db == chain
+
+
+def find_drift(row, owner, listing):
+    """[(field, db value, chain value)] where a snapshot row disagrees with the chain"""
+    current = dict(zip(FIELDS, row[2:2 + len(FIELDS)]))
+    return [(field, current[field], value) for field, value in expected_fields(row, owner, listing).items()
+            if not _same(field, current[field], value)]
+
+
+class BatchResult:
+    """What reconciling one batch found: last_id is the resume point once it is recorded"""
+
+    def __init__(self, last_id, checked):
+        self.last_id = last_id
+        self.checked = checked
+        # [{'token_id', 'field', 'db', 'chain', 'fixed'}], plus not-on-chain tokens
+        self.drift = []
+        self.drifted = 0
+        self.fixed = 0
+
+
+def _apply(rows, state, apply):
+    result = BatchResult(rows[-1][0], len(rows))
+    fixes = {}
+    for row in rows:
+        nft_id, token_id = row[0], row[1]
+        owner, listing = state[token_id]
+        if owner is None:
+            result.drift.append({'token_id': token_id, 'field': 'token', 'db': 'registered',
+                                 'chain': 'not minted or burned', 'fixed': False})
+            continue
+        drift = find_drift(row, owner, listing)
+        if drift:
+            fixes[nft_id] = (row, drift)
+    result.drifted = len(fixes)
+    if not fixes:
+        return result
+
+    applied = set()
+    if apply:
+        with transaction.atomic():
+            # Rows changed since the snapshot (a transfer or listing recorded
+            # meanwhile) are newer than `block`; leave them alone
+            current = {values[0]: values for values in NFT.objects.filter(id__in=list(fixes)).values_list(
+                'id', 'token_id', *FIELDS, 'auction_closed_at')}
+            nfts, deltas, now = [], defaultdict(lambda: defaultdict(int)), timezone.now()
+            for nft_id, (row, drift) in fixes.items():
+                if current.get(nft_id) != row:
+                    continue
+                nft = NFT(id=nft_id, updated_at=now, **dict(zip(FIELDS, row[2:2 + len(FIELDS)])))
+                for field, _, value in drift:
+                    setattr(nft, field, value)
+                if nft.owner_address != row[2]:
+                    deltas[row[2]]['nfts_owned'] -= 1
+                    deltas[nft.owner_address]['nfts_owned'] += 1
+                nfts.append(nft)
+                applied.add(nft_id)
+            NFT.objects.bulk_update(nfts, list(FIELDS) + ['updated_at'], batch_size=BATCH_SIZE)
+            apply_profile_deltas(deltas)
+            transaction.on_commit(lambda: schedule_auctions(nfts))
+        result.fixed = len(applied)
+
+    for nft_id, (row, drift) in fixes.items():
+        result.drift.extend({'token_id': row[1], 'field': field, 'db': db, 'chain': chain,
+                             'fixed': nft_id in applied} for field, db, chain in drift)
+    return result
+
+
+def _pages(after_id, batch_size):
+    """Snapshot rows in id order, a page per query, so writes between pages never disturb the scan"""
+    while True:
+        rows = list(NFT.objects.filter(is_burned=False, id__gt=after_id).order_by('id').values_list(
+            'id', 'token_id', *FIELDS, 'auction_closed_at')[:batch_size])
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def reconcile(after_id=0, batch_size=BATCH_SIZE, concurrency=CONCURRENCY, apply=True, block=None):
+    """
+    Compare every unburned NFT after after_id with the chain at `block`
+    (default: the current head) and, with apply, write the chain's owner and
+    listing state over rows that drifted. Chain reads run `concurrency`
+    batches at a time; DB writes stay on this thread, one transaction per
+    batch. Yields a BatchResult per batch in id order.
+    """
+    if block is None:
+        block = web3_instance.get_latest_block()
+        if block is None:
+            raise ConnectionError("Could not read the latest block")
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='reconcile') as pool:
+        for rows in _pages(after_id, batch_size):
+            pending.append((rows, pool.submit(chain_state, [row[1] for row in rows], block)))
+            # Read ahead enough to keep every worker busy while results are applied
+            if len(pending) >= 2 * concurrency:
+                rows, future = pending.popleft()
+                yield _apply(rows, future.result(), apply)
+        while pending:
+            rows, future = pending.popleft()
+            yield _apply(rows, future.result(), apply)
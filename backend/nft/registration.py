@@ -0,0 +1,151 @@
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from .auctions import schedule_auctions
+from .fields import normalize_address
+from .models import NFT
+from .profile_stats import apply_profile_deltas
+from .rarity import index_many_in_background, unindex_nft
+
+# NFTs accepted per register_nfts_batch call, and rows per INSERT inside it
+MAX_REGISTER_BATCH = 10000
+INSERT_BATCH_SIZE = 500
+
+REQUIRED_FIELDS = ('token_id', 'name', 'description', 'image_url', 'creator_address', 'owner_address')
+# What a re-registration may change on an existing NFT. Ownership, listing
+# and price are left alone: they move through transfers and listings.
+UPSERT_FIELDS = ('name', 'description', 'image_url', 'token_uri', 'collection', 'category', 'updated_at')
+
+ADDRESS_RE = re.compile(r'^0x[0-9a-f]{40}$')
+
+
+class RegistrationConflict(ValueError):
+    """Token ids of a batch already registered by another creator; nothing was written"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} token ids are already registered by another creator')
+        self.errors = errors
+
+
+def _validate(index, item, seen):
+    """(kwargs for NFT, None) or (None, error) for one register_nfts_batch item"""
+    if not isinstance(item, dict):
+        return None, 'not an object'
+    missing = [field for field in REQUIRED_FIELDS if item.get(field) in (None, '')]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    token_id = item['token_id']
+    if isinstance(token_id, bool) or not isinstance(token_id, int) or token_id < 0:
+        return None, 'token_id must be a non-negative integer'
+    if token_id in seen:
+        return None, f'token_id {token_id} repeats item {seen[token_id]}'
+    seen[token_id] = index
+    creator = normalize_address(item['creator_address'])
+    owner = normalize_address(item['owner_address'])
+    if not isinstance(creator, str) or not ADDRESS_RE.match(creator):
+        return None, 'creator_address is not an address'
+    if not isinstance(owner, str) or not ADDRESS_RE.match(owner):
+        return None, 'owner_address is not an address'
+    price = item.get('price')
+    if price is not None:
+        try:
+            price = Decimal(str(price))
+        except InvalidOperation:
+            return None, 'price is not a number'
+        if not price.is_finite() or price < 0:
+            return None, 'price is not a number'
+    auction_end_time = item.get('auction_end_time')
+    if auction_end_time is not None:
+        try:
+            auction_end_time = parse_datetime(str(auction_end_time))
+        except ValueError:
+            auction_end_time = None
+        if auction_end_time is None or auction_end_time.tzinfo is None:
+            return None, 'auction_end_time must be an ISO 8601 datetime with a UTC offset'
+    return {
+        'token_id': token_id,
+        'name': str(item['name'])[:255],
+        'description': str(item['description']),
+        'image_url': str(item['image_url']),
+        'token_uri': str(item.get('token_uri') or ''),
+        'creator_address': creator,
+        'owner_address': owner,
+        'price': price,
+        'is_listed': bool(item.get('is_listed', False)),
+        'is_auction': bool(item.get('is_auction', False)),
+        'auction_end_time': auction_end_time,
+        'collection': item.get('collection'),
+        'category': item.get('category'),
+    }, None
+
+
+def validate_registrations(items):
+    """
+    Check every item of a batch in one pass before anything is written:
+    (rows, errors) where errors is [{'index', 'token_id', 'error'}]
+    """
+    rows, errors, seen = [], [], {}
+    for index, item in enumerate(items):
+        row, error = _validate(index, item, seen)
+        if error:
+            errors.append({'index': index, 'token_id': item.get('token_id') if isinstance(item, dict) else None,
+                           'error': error})
+        else:
+            rows.append(row)
+    return rows, errors
+
+
+def register_nfts(rows):
+    """
+    Upsert validated rows (see validate_registrations) keyed on token_id, in
+    one transaction and INSERT_BATCH_SIZE-row statements. New NFTs are
+    counted on their creators' and owners' profiles and queued for trait
+    indexing; existing ones only get UPSERT_FIELDS refreshed, and only by
+    their own creator: otherwise RegistrationConflict is raised (errors in
+    validate_registrations' format) and nothing is written. Returns
+    [{'token_id', 'nft_id', 'created'}] in input order.
+    """
+    token_ids = [row['token_id'] for row in rows]
+    with transaction.atomic():
+        # The write lock is held from here (IMMEDIATE transactions), so this
+        # cannot go stale before the insert
+        existing, creators = {}, {}
+        for token_id, token_uri, collection, creator in NFT.objects.filter(token_id__in=token_ids).values_list(
+                'token_id', 'token_uri', 'collection', 'creator_address').iterator():
+            existing[token_id] = (token_uri, collection)
+            creators[token_id] = creator
+        conflicts = [
+            {'index': index, 'token_id': row['token_id'], 'error': 'token_id is already registered by another creator'}
+            for index, row in enumerate(rows)
+            if row['token_id'] in creators and creators[row['token_id']] != row['creator_address']
+        ]
+        if conflicts:
+            raise RegistrationConflict(conflicts)
+        nfts = NFT.objects.bulk_create(
+            [NFT(**row) for row in rows],
+            batch_size=INSERT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['token_id'],
+            update_fields=list(UPSERT_FIELDS),
+        )
+        deltas = defaultdict(lambda: defaultdict(int))
+        for nft in nfts:
+            if nft.token_id not in existing:
+                deltas[nft.creator_address]['nfts_created'] += 1
+                deltas[nft.creator_address]['total_created'] += 1
+                deltas[nft.owner_address]['nfts_owned'] += 1
+        apply_profile_deltas(deltas)
+
+        # Existing NFTs whose traits may have moved are re-indexed from scratch
+        changed = [nft for nft in nfts if nft.token_id in existing
+                   and existing[nft.token_id] != (nft.token_uri, nft.collection)]
+        for nft in changed:
+            old_uri, old_collection = existing[nft.token_id]
+            unindex_nft(NFT(id=nft.pk, collection=old_collection))
+        to_index = [nft for nft in nfts if nft.token_id not in existing] + changed
+        transaction.on_commit(lambda: index_many_in_background(to_index))
+        transaction.on_commit(lambda: schedule_auctions([nft for nft in nfts if nft.token_id not in existing]))
+
+    return [{'token_id': nft.token_id, 'nft_id': nft.pk, 'created': nft.token_id not in existing} for nft in nfts]
@@ -0,0 +1,339 @@
+import random
+import time
+from bisect import bisect
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import NFT, Transaction, Favorite, NFTView, UserProfile
+from .profile_stats import SALE_TYPE, apply_profile_deltas, rebuild_profile_stats
+from .timeline import rebuild_timelines
+
+BATCH_SIZE = 5000
+
+CATEGORIES = ['art', 'music', 'photography', 'gaming', 'collectibles', 'sports']
+TRANSACTION_TYPES = ['mint', 'list', 'buy', 'bid', 'transfer', 'delist']
+# Relative frequency of each type above (sales and listings dominate real traffic)
+TRANSACTION_TYPE_WEIGHTS = [10, 30, 20, 25, 10, 5]
+PRICED_TYPES = ('buy', 'bid', 'list')
+
+# Activity window and how much of it falls into bursts (drops, sell-offs)
+ACTIVITY_WINDOW_SECONDS = 60 * 86400
+BURST_SHARE = 0.7
+
+
+def synthetic_address(index):
+    """Deterministic, valid-looking wallet address for synthetic user #index"""
+    return f"0x{index + 1:040x}"
+
+
+def fast_insert(model, fields, rows, now, batch_size=BATCH_SIZE):
+    """
+    Insert value tuples (ordered like `fields`) with cursor.executemany,
+    one statement per batch. Skips model instantiation and per-field ORM
+    preparation, which cap bulk_create at ~10k rows/sec on SQLite.
+    Remaining columns get their model default (auto_now fields get `now`).
+    Values must already be in a form the driver accepts.
+    Returns the number of rows inserted.
+    """
+    opts = model._meta
+    given = [opts.get_field(name) for name in fields]
+    rest = [
+        field for field in opts.concrete_fields
+        if field not in given and not field.primary_key
+    ]
+    rest_values = tuple(
+        now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        else field.get_db_prep_save(field.get_default(), connection)
+        for field in rest
+    )
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(field.column) for field in given + rest)
+    placeholders = ', '.join(['%s'] * (len(given) + len(rest)))
+    sql = f"INSERT INTO {qn(opts.db_table)} ({columns}) VALUES ({placeholders})"
+
+    rows = iter(rows)
+    total = 0
+    with connection.cursor() as cursor:
+        while True:
+            batch = [row + rest_values for row in islice(rows, batch_size)]
+            if not batch:
+                return total
+            cursor.executemany(sql, batch)
+            total += len(batch)
+
+
+class ZipfSampler:
+    """
+    Draw indexes 0..n-1 with Zipfian popularity (weight 1/rank**s).
+    Ranks are shuffled onto indexes so the popular items are spread out;
+    s=0 gives a uniform distribution.
+    """
+
+    def __init__(self, rng, n, s):
+        self.rng = rng
+        self.cum_weights = list(accumulate(1 / rank ** s for rank in range(1, n + 1)))
+        self.total = self.cum_weights[-1]
+        self.index_of_rank = list(range(n))
+        rng.shuffle(self.index_of_rank)
+
+    def sample(self):
+        rank = bisect(self.cum_weights, self.rng.random() * self.total)
+        return self.index_of_rank[min(rank, len(self.index_of_rank) - 1)]
+
+
+class BurstyClock:
+    """
+    Timestamps over the last `window` seconds where BURST_SHARE of events
+    cluster around a few burst centres (exponential spread) and the rest
+    are spread uniformly.
+    """
+
+    def __init__(self, rng, now, bursts=40, window=ACTIVITY_WINDOW_SECONDS):
+        self.rng = rng
+        self.now = now
+        self.window = window
+        self.centres = [rng.randrange(window) for _ in range(bursts)]
+        self.widths = [rng.choice((300, 1800, 3600, 4 * 3600)) for _ in range(bursts)]
+        self.burst_picker = ZipfSampler(rng, bursts, 1.0)
+
+    def sample(self):
+        rng = self.rng
+        if rng.random() < BURST_SHARE:
+            burst = self.burst_picker.sample()
+            offset = self.centres[burst] + rng.expovariate(1 / self.widths[burst])
+            seconds_ago = min(int(offset), self.window)
+        else:
+            seconds_ago = rng.randrange(self.window)
+        return self.now - timedelta(seconds=seconds_ago)
+
+
+def _db_now():
+    """Current time as raw inserts expect it: SQLite stores naive UTC, other backends take aware datetimes"""
+    now = timezone.now()
+    return now.replace(tzinfo=None) if connection.vendor == 'sqlite' else now
+
+
+def _unique_pairs(count, limit, draw):
+    """Yield up to `count` distinct (a, b) pairs from draw(), giving up after `limit` tries"""
+    seen = set()
+    tries = 0
+    while len(seen) < count and tries < limit:
+        tries += 1
+        pair = draw()
+        if pair not in seen:
+            seen.add(pair)
+            yield pair
+
+
+def seed_dataset(nfts, users=None, transactions=None, favorites=None, views=None, follows=None,
+                 collections=50, skew=1.1, seed=42, batch_size=BATCH_SIZE, stdout=None):
+    """
+    Insert a deterministic synthetic dataset: `nfts` NFTs plus profiles,
+    follows, transactions, favorites and views (defaults scale with `nfts`).
+
+    NFT, collection and user popularity follow a Zipf distribution with
+    exponent `skew` (0 = uniform), and activity timestamps come in bursts.
+    The same arguments always produce the same rows.
+    Returns a dict of row counts per table.
+    """
+    users = max(2, users if users is not None else max(100, nfts // 10))
+    transactions = transactions if transactions is not None else nfts * 2
+    favorites = favorites if favorites is not None else nfts
+    views = views if views is not None else nfts
+    follows = follows if follows is not None else users * 5
+    # Unique pair tables cannot hold more than every possible pair
+    favorites = min(favorites, nfts * users)
+    follows = min(follows, users * (users - 1))
+
+    rng = random.Random(seed)
+    db_now = _db_now()
+    addresses = [synthetic_address(i) for i in range(users)]
+    collection_names = [f"Collection {i}" for i in range(collections)]
+    popular_user = ZipfSampler(rng, users, skew)
+    popular_collection = ZipfSampler(rng, collections, skew)
+    clock = BurstyClock(rng, db_now)
+    counts = {}
+    phase_started = [time.perf_counter()]
+
+    def progress(table):
+        elapsed = time.perf_counter() - phase_started[0]
+        if stdout:
+            stdout.write(f"  {table}: {counts[table]} rows in {elapsed:.2f}s")
+        phase_started[0] = time.perf_counter()
+
+    with transaction.atomic():
+        # Profiles may exist from an earlier run with the same user count
+        UserProfile.objects.bulk_create(
+            (UserProfile(wallet_address=address, username=f"User{address[-4:]}") for address in addresses),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        counts['users'] = users
+        progress('users')
+        profile_ids = dict(
+            UserProfile.objects.filter(wallet_address__gte=addresses[0], wallet_address__lte=addresses[-1])
+            .values_list('wallet_address', 'id')
+        )
+
+        Follow = UserProfile.following.through
+        counts['follows'] = fast_insert(Follow, ['from_userprofile', 'to_userprofile'], (
+            (profile_ids[addresses[follower]], profile_ids[addresses[followee]])
+            for follower, followee in _unique_pairs(
+                follows, follows * 4,
+                # Anyone may follow; the followed side is heavily skewed
+                lambda: (rng.randrange(users), popular_user.sample()),
+            )
+            if follower != followee
+        ), db_now, batch_size)
+        progress('follows')
+
+        first_token_id = (NFT.objects.aggregate(m=Max('token_id'))['m'] or 0) + 1
+
+        def nft_rows():
+            for i in range(nfts):
+                token_id = first_token_id + i
+                creator = addresses[popular_user.sample()]
+                listed = rng.random() < 0.3
+                yield (
+                    token_id,
+                    f"Synthetic NFT #{token_id}",
+                    f"Synthetic NFT {i} for load testing",
+                    f"https://example.com/images/{token_id}.png",
+                    f"https://example.com/metadata/{token_id}.json",
+                    creator if rng.random() < 0.6 else addresses[popular_user.sample()],
+                    creator,
+                    f"{rng.uniform(0.01, 10):.4f}" if listed else None,
+                    listed,
+                    collection_names[popular_collection.sample()],
+                    rng.choice(CATEGORIES),
+                )
+
+        counts['nfts'] = fast_insert(NFT, [
+            'token_id', 'name', 'description', 'image_url', 'token_uri', 'owner_address',
+            'creator_address', 'price', 'is_listed', 'collection', 'category',
+        ], nft_rows(), db_now, batch_size)
+        progress('nfts')
+        nft_ids = list(
+            NFT.objects.filter(token_id__gte=first_token_id)
+            .order_by('token_id').values_list('id', flat=True)
+        )
+        popular_nft = ZipfSampler(rng, nfts, skew)
+
+        counts['transactions'] = fast_insert(Transaction, TRANSACTION_FIELDS, generate_transactions(
+            rng, transactions, nft_ids, addresses, popular_nft, popular_user, clock,
+            hash_prefix=f"{seed:08x}{first_token_id:016x}",
+        ), db_now, batch_size)
+        progress('transactions')
+
+        counts['favorites'] = fast_insert(Favorite, ['user_address', 'nft'], (
+            (addresses[user], nft_ids[nft])
+            for user, nft in _unique_pairs(
+                favorites, favorites * 4,
+                lambda: (rng.randrange(users), popular_nft.sample()),
+            )
+        ), db_now, batch_size)
+        progress('favorites')
+
+        def view_rows():
+            for i in range(views):
+                # Roughly a third of views are anonymous
+                viewer = addresses[rng.randrange(users)] if rng.random() < 0.66 else None
+                yield (
+                    nft_ids[popular_nft.sample()],
+                    viewer,
+                    # Unique per row, so the (nft, viewer, ip) constraint always holds
+                    f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" if i < 1 << 24 else f"fd00::{i:x}",
+                    'seed',
+                )
+
+        counts['views'] = fast_insert(NFTView, ['nft', 'viewer_address', 'ip_address', 'user_agent'],
+                                      view_rows(), db_now, batch_size)
+        progress('views')
+
+        # Raw inserts skip the incremental profile counters
+        updated = rebuild_profile_stats(batch_size)
+        if stdout:
+            stdout.write(f"  profile stats: {updated} profiles in {time.perf_counter() - phase_started[0]:.2f}s")
+        # ... and the timeline fan-out (needs the follower counts above)
+        phase_started[0] = time.perf_counter()
+        counts['timeline_entries'] = rebuild_timelines()
+        progress('timeline_entries')
+
+    return counts
+
+
+TRANSACTION_FIELDS = [
+    'transaction_hash', 'nft', 'from_address', 'to_address', 'transaction_type',
+    'price', 'block_number', 'gas_used', 'gas_price', 'timestamp',
+]
+
+
+def generate_transactions(rng, count, nft_ids, addresses, popular_nft, popular_user, clock, hash_prefix,
+                          first_block=1_000_000):
+    """Yield `count` rows (ordered like TRANSACTION_FIELDS) with skewed NFTs/users and bursty timestamps"""
+    users = len(addresses)
+    types = rng.choices(TRANSACTION_TYPES, TRANSACTION_TYPE_WEIGHTS, k=count)
+    for i in range(count):
+        tx_type = types[i]
+        from_index = popular_user.sample()
+        to_index = (from_index + 1 + rng.randrange(users - 1)) % users
+        yield (
+            f"0x{hash_prefix}{i:040x}",
+            nft_ids[popular_nft.sample()],
+            addresses[from_index],
+            addresses[to_index],
+            tx_type,
+            f"{rng.uniform(0.01, 10):.4f}" if tx_type in PRICED_TYPES else None,
+            first_block + i,
+            rng.randint(50_000, 500_000),
+            f"{rng.uniform(1, 100):.2f}",
+            clock.sample(),
+        )
+
+
+def add_activities(count, users=20, window_seconds=86400, skew=1.1, seed=None, batch_size=BATCH_SIZE):
+    """
+    Insert `count` transactions against the NFTs already in the database,
+    between `users` synthetic profiles, over the last `window_seconds`.
+    Returns the number of transactions inserted (0 when there are no NFTs).
+    """
+    nft_ids = list(NFT.objects.order_by('id').values_list('id', flat=True))
+    if not nft_ids or count <= 0:
+        return 0
+    users = max(2, users)
+    rng = random.Random(seed)
+    db_now = _db_now()
+    addresses = [synthetic_address(i) for i in range(users)]
+    with transaction.atomic():
+        UserProfile.objects.bulk_create(
+            (UserProfile(wallet_address=address, username=f"User{address[-4:]}") for address in addresses),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # Raw inserts skip the incremental profile counters; sales are tallied on the way through
+        deltas = defaultdict(lambda: defaultdict(int))
+
+        def tally_sales(rows):
+            for row in rows:
+                if row[4] == SALE_TYPE:
+                    volume = Decimal(row[5])
+                    deltas[row[3]]['total_collected'] += 1
+                    deltas[row[3]]['total_volume'] += volume
+                    deltas[row[2]]['total_volume'] += volume
+                yield row
+
+        inserted = fast_insert(Transaction, TRANSACTION_FIELDS, tally_sales(generate_transactions(
+            rng, count, nft_ids, addresses,
+            ZipfSampler(rng, len(nft_ids), skew),
+            ZipfSampler(rng, users, skew),
+            BurstyClock(rng, db_now, bursts=8, window=window_seconds),
+            # Random prefix keeps hashes unique across repeated runs
+            hash_prefix=f"{rng.getrandbits(96):024x}",
+            first_block=rng.randint(1_000_000, 9_000_000),
+        )), db_now, batch_size)
+        apply_profile_deltas(deltas)
+        return inserted
@@ -1,3 +1,1119 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile
+from django.db import transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from eth_abi import encode
+
+from . import abi_registry, auctions, chain_backfill, chain_sync, rarity, reconcile, timeline, token_metadata
+from .activity_stream import activity_payloads
+from .archive import TransactionArchive
+from .file_handlers import handle_profile_image
+from .follows import follow, unfollow
+from .instrumentation import EndpointStats
+from .metrics import REQUEST_LATENCY, observe_request
+from .nft_stats import nft_stats, resolve_nfts
+from .profile_stats import apply_profile_deltas, rebuild_profile_stats
+from .registration import register_nfts, validate_registrations
+from .seeding import add_activities
+from .web3_utils import web3_instance
+from .uploads import ProfileImageUploadHandler
+from .thumbnails import AVATAR_SIZES, FORMATS, content_hash, variant_name
+from .models import NFT, ChainBlock, Favorite, NFTTrait, TimelineEntry, TraitCollection, TraitValue, Transaction, UserProfile
+
+
+def make_nft(token_id, **fields):
+    fields.setdefault('owner_address', f'0x{token_id:040x}')
+    fields.setdefault('creator_address', fields['owner_address'])
+    return NFT.objects.create(token_id=token_id, name=f'NFT #{token_id}', description='',
+                              image_url='https://example.com/image.png',
+                              token_uri='https://example.com/token.json', **fields)
+
+
+def make_transaction(n, nft, from_address, to_address, transaction_type, **fields):
+    fields.setdefault('timestamp', timezone.now())
+    return Transaction.objects.create(transaction_hash=f'0x{n:064x}', nft=nft, from_address=from_address,
+                                      to_address=to_address, transaction_type=transaction_type, block_number=n,
+                                      gas_used=21000, gas_price=1, **fields)
+
+
+def make_auction(token_id, end_time, **fields):
+    return make_nft(token_id, is_listed=True, is_auction=True, price=1, auction_end_time=end_time, **fields)
+
+
+class CloseDueAuctionsTests(TestCase):
+    def test_closes_only_ended_auctions(self):
+        now = timezone.now()
+        ended = make_auction(1, now - timedelta(minutes=1))
+        running = make_auction(2, now + timedelta(minutes=1))
+        self.assertEqual(auctions.close_due_auctions(now), [1])
+        ended.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(ended.auction_closed_at, now)
+        self.assertFalse(ended.is_listed)
+        self.assertIsNone(running.auction_closed_at)
+        self.assertEqual(auctions.close_due_auctions(now), [])
+
+    def test_rows_closed_by_another_closer_are_skipped(self):
+        # A closer that read the due rows before another one committed (READ COMMITTED without row locks)
+        now = timezone.now()
+        make_auction(1, now - timedelta(minutes=2))
+        make_auction(2, now - timedelta(minutes=1))
+        stale = NFT.objects.filter(token_id__in=[1, 2])
+        NFT.objects.filter(token_id=1).update(auction_closed_at=now - timedelta(seconds=5), is_listed=False)
+        with mock.patch.object(auctions, 'open_auctions', return_value=stale), \
+                mock.patch.object(auctions, 'settle_auctions') as settle:
+            self.assertEqual(auctions.close_due_auctions(now), [2])
+        settle.assert_called_once_with([2])
+        self.assertEqual(NFT.objects.get(token_id=1).auction_closed_at, now - timedelta(seconds=5))
+
+
+class ConcurrentCloseTests(TransactionTestCase):
+    def test_concurrent_closers_close_each_auction_once(self):
+        now = timezone.now()
+        for token_id in range(1, 51):
+            make_auction(token_id, now - timedelta(seconds=token_id))
+        closed, settled, errors = [], [], []
+        start = threading.Barrier(4)
+
+        def closer():
+            try:
+                start.wait()
+                closed.extend(auctions.close_due_auctions())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(auctions, 'settle_auctions', side_effect=settled.extend):
+            threads = [threading.Thread(target=closer) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(closed), list(range(1, 51)))
+        self.assertEqual(sorted(settled), list(range(1, 51)))
+        self.assertFalse(auctions.open_auctions().exists())
+
+
+class RaritySortTests(TestCase):
+    def test_requires_a_collection(self):
+        response = self.client.get(reverse('nft:get_nfts'), {'sort_by': 'rarity'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    def test_rarest_first_with_id_tiebreak(self):
+        for token_id, rank in ((1, 2), (2, 1), (3, 2), (4, None), (5, 1)):
+            make_nft(token_id, collection='apes', rarity_rank=rank)
+        make_nft(6, collection='cats', rarity_rank=1)
+        response = self.client.get(reverse('nft:get_nfts'), {'sort_by': 'rarity', 'collection': 'apes', 'limit': 10})
+        self.assertEqual([row['token_id'] for row in response.json()['data']], [2, 5, 1, 3, 4])
+
+
+class ArchivedSaleStatsTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.archive = TransactionArchive(root)
+
+    def stats(self, *nfts):
+        resolved = resolve_nfts([nft.id for nft in nfts])
+        return nft_stats(list(resolved.values()))
+
+    def test_archiving_sales_leaves_nft_stats_unchanged(self):
+        old, mixed, unsold = make_nft(1), make_nft(2), make_nft(3)
+        now = timezone.now()
+        for n, nft, price, days in ((1, old, '1.5', 200), (2, old, '2', 150), (3, mixed, '4', 120), (4, mixed, '3', 1)):
+            make_transaction(n, nft, ALICE, BOB, 'buy', price=Decimal(price), timestamp=now - timedelta(days=days))
+        make_transaction(5, unsold, ALICE, CAROL, 'transfer', timestamp=now - timedelta(days=300))
+        before = self.stats(old, mixed, unsold)
+        self.assertEqual(before[old.id]['last_sale'], 'Ξ2.0')
+
+        self.assertEqual(self.archive.archive_before(now - timedelta(days=90))['rows'], 4)
+        self.assertEqual(list(Transaction.objects.values_list('transaction_hash', flat=True)), [f'0x{4:064x}'])
+        self.assertEqual(self.stats(old, mixed, unsold), before)
+        self.assertEqual(before[mixed.id]['total_volume'], 'Ξ7.0')
+
+
+class StatsBatchTests(TestCase):
+    def post(self, body):
+        return self.client.post(reverse('nft:get_nft_stats_batch'), body, content_type='application/json')
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ('{"ids": [1', '[1, 2]', '"local_1"', b'\xff'):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertFalse(response.json()['success'])
+        self.assertEqual(self.post('{"ids": "local_1"}').status_code, 400)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        now = timezone.now()
+        for token_id in range(1, 51):
+            nft = make_nft(token_id, collection='Apes')
+            rarity.index_pairs(nft, [('Hat', str(token_id % 3))])
+            Favorite.objects.create(nft=nft, user_address=ALICE)
+            make_transaction(token_id, nft, ALICE, BOB, 'buy', price=1, timestamp=now)
+        with CaptureQueriesContext(connection) as single:
+            response = self.post(json.dumps({'ids': ['local_1']}))
+        self.assertEqual(len(response.json()['data']), 1)
+        with self.assertNumQueries(len(single)):
+            response = self.post(json.dumps({'ids': [f'local_{n}' for n in range(1, 51)] + ['local_999']}))
+        self.assertEqual(len(response.json()['data']), 50)
+        self.assertEqual(response.json()['missing'], ['local_999'])
+        self.assertEqual(response.json()['data']['local_7']['likes'], 1)
+
+
+class EndpointStatsTests(TestCase):
+    def test_summary_while_recording(self):
+        stats = EndpointStats(window=100)
+        stop, errors = threading.Event(), []
+
+        def record():
+            while not stop.is_set():
+                stats.record('get_nfts', {'total': 1.0, 'db': 0.5})
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(2000):
+                try:
+                    stats.summary()
+                except RuntimeError as e:
+                    errors.append(e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(stats.summary()['get_nfts']['total']['count'], 100)
+
+
+class AddActivitiesTests(TestCase):
+    def test_profile_aggregates_match_a_rebuild(self):
+        for token_id in range(1, 21):
+            make_nft(token_id)
+        rebuild_profile_stats()
+        self.assertEqual(add_activities(500, users=10, seed=7), 500)
+        counted = list(UserProfile.objects.order_by('wallet_address').values_list(
+            'wallet_address', 'total_collected', 'total_volume'))
+        self.assertTrue(any(collected for _, collected, _ in counted))
+        self.assertEqual(rebuild_profile_stats(), 0)
+        self.assertEqual(list(UserProfile.objects.order_by('wallet_address').values_list(
+            'wallet_address', 'total_collected', 'total_volume')), counted)
+
+
+
+class OwnerLookup:
+    """Stand-in for NFTMarketplaceWeb3 that only answers ownerOf"""
+
+    def __init__(self, owners):
+        self.owners = owners
+
+    def get_nft_owner(self, token_id):
+        return self.owners.get(token_id)
+
+
+class ProfileDeltaTests(TestCase):
+    def setUp(self):
+        make_nft(1, owner_address=ALICE)
+        make_nft(2, owner_address=ALICE)
+        rebuild_profile_stats()
+        self.addCleanup(web3_instance.set_instance, None)
+
+    def profile(self, address):
+        return UserProfile.objects.filter(wallet_address=address).values(
+            'nfts_owned', 'nfts_created', 'total_created', 'total_collected', 'total_volume').get()
+
+    def post(self, name, token_id, payload):
+        return self.client.post(reverse(f'nft:{name}', args=[token_id]), json.dumps(payload),
+                                content_type='application/json')
+
+    def test_apply_profile_deltas_creates_profiles_and_skips_zeroes(self):
+        apply_profile_deltas({CAROL: {'nfts_owned': 2, 'total_collected': 0}, ALICE: {'nfts_owned': -1}, '': {'nfts_owned': 1}})
+        self.assertEqual(self.profile(CAROL)['nfts_owned'], 2)
+        self.assertEqual(UserProfile.objects.get(wallet_address=CAROL).username, 'Usercccc')
+        self.assertEqual(self.profile(ALICE)['nfts_owned'], 1)
+        self.assertFalse(UserProfile.objects.filter(wallet_address='').exists())
+
+    def test_transfer_read_from_the_chain(self):
+        web3_instance.set_instance(OwnerLookup({1: '0x' + 'B' * 40}))
+        self.assertEqual(self.post('update_nft_owner', 1, {}).status_code, 200)
+        self.assertEqual(self.profile(ALICE)['nfts_owned'], 1)
+        self.assertEqual(self.profile(BOB)['nfts_owned'], 1)
+        self.assertEqual(rebuild_profile_stats(), 0)
+
+    def test_sale_moves_ownership_and_volume(self):
+        response = self.post('update_nft_owner', 1, {'new_owner': BOB, 'price': '1.5'})
+        self.assertEqual(response.json()['owner_address'], BOB)
+        self.assertEqual(self.profile(ALICE), {'nfts_owned': 1, 'nfts_created': 2, 'total_created': 2,
+                                               'total_collected': 0, 'total_volume': Decimal('1.5')})
+        self.assertEqual(self.profile(BOB), {'nfts_owned': 1, 'nfts_created': 0, 'total_created': 0,
+                                             'total_collected': 1, 'total_volume': Decimal('1.5')})
+        self.assertEqual(rebuild_profile_stats(), 0)
+
+    def test_burn_drops_current_counts_only(self):
+        self.assertEqual(self.post('burn_nft', 2, {'creator_address': ALICE}).status_code, 200)
+        self.assertEqual(self.profile(ALICE), {'nfts_owned': 1, 'nfts_created': 1, 'total_created': 2,
+                                               'total_collected': 0, 'total_volume': 0})
+        self.assertEqual(rebuild_profile_stats(), 0)
+
+
+class RegistrationTests(TestCase):
+    def item(self, token_id, **fields):
+        item = {'token_id': token_id, 'name': f'NFT #{token_id}', 'description': 'A test NFT',
+                'image_url': 'https://example.com/image.png', 'creator_address': ALICE, 'owner_address': ALICE}
+        item.update(fields)
+        return item
+
+    def post(self, items):
+        return self.client.post(reverse('nft:register_nfts_batch'), json.dumps({'nfts': items}),
+                                content_type='application/json')
+
+    def profile(self, address):
+        return UserProfile.objects.filter(wallet_address=address).values(
+            'nfts_owned', 'nfts_created', 'total_created').get()
+
+    def test_token_id_repeated_within_a_batch_writes_nothing(self):
+        response = self.post([self.item(1), self.item(2), self.item(1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'index': 2, 'token_id': 1, 'error': 'token_id 1 repeats item 0'}])
+        self.assertFalse(NFT.objects.exists())
+
+    def test_one_invalid_item_writes_nothing(self):
+        response = self.post([self.item(1), self.item(2, owner_address='nobody'), self.item(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertFalse(NFT.objects.exists())
+        self.assertFalse(UserProfile.objects.exists())
+
+    def test_token_id_of_another_creator_writes_nothing(self):
+        make_nft(2, owner_address=BOB)
+        response = self.post([self.item(1), self.item(2, name='Taken')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            {'index': 1, 'token_id': 2, 'error': 'token_id is already registered by another creator'}])
+        self.assertEqual(list(NFT.objects.values_list('token_id', 'name')), [(2, 'NFT #2')])
+
+    def test_existing_token_id_is_refreshed_not_duplicated(self):
+        make_nft(1, owner_address=BOB, creator_address=ALICE, price=Decimal('2'))
+        rebuild_profile_stats()
+        response = self.post([self.item(1, name='Renamed', owner_address=CAROL, price='9'), self.item(2)])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['created'], body['existing']), (1, 1))
+        self.assertEqual([(r['token_id'], r['created']) for r in body['results']], [(1, False), (2, True)])
+        nft = NFT.objects.get(token_id=1)
+        self.assertEqual((nft.name, nft.owner_address, nft.price), ('Renamed', BOB, Decimal('2')))
+        self.assertEqual(NFT.objects.count(), 2)
+        self.assertEqual(rebuild_profile_stats(), 0)
+
+    def test_profile_deltas_count_new_nfts(self):
+        response = self.post([self.item(1), self.item(2, owner_address=BOB), self.item(3, creator_address=BOB)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profile(ALICE), {'nfts_owned': 2, 'nfts_created': 2, 'total_created': 2})
+        self.assertEqual(self.profile(BOB), {'nfts_owned': 1, 'nfts_created': 1, 'total_created': 1})
+        self.assertEqual(rebuild_profile_stats(), 0)
+
+    def test_moving_collection_unindexes_and_reindexes(self):
+        rows, _ = validate_registrations([self.item(1, collection='Old')])
+        [result] = register_nfts(rows)
+        rarity.index_pairs(NFT.objects.get(pk=result['nft_id']), [('Eyes', 'Blue')])
+        self.assertEqual(TraitCollection.objects.get(collection='Old').nft_count, 1)
+
+        rows, _ = validate_registrations([self.item(1, collection='New')])
+        with mock.patch('nft.registration.index_many_in_background') as index_many, \
+                self.captureOnCommitCallbacks(execute=True):
+            register_nfts(rows)
+        self.assertEqual(TraitCollection.objects.get(collection='Old').nft_count, 0)
+        self.assertFalse(TraitValue.objects.filter(collection='Old').exists())
+        self.assertFalse(NFTTrait.objects.filter(nft_id=result['nft_id']).exists())
+        [(reindexed,), _] = index_many.call_args
+        self.assertEqual([(nft.pk, nft.collection) for nft in reindexed], [(result['nft_id'], 'New')])
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs the test against the schema at migrate_from, then migrates to migrate_to"""
+    migrate_from = migrate_to = None
+
+    def setUp(self):
+        MigrationExecutor(connection).migrate([('nft', self.migrate_from)])
+        self.addCleanup(self.migrate_to_latest)
+        self.old_apps = MigrationExecutor(connection).loader.project_state(('nft', self.migrate_from)).apps
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('nft', self.migrate_to)])
+        return executor.loader.project_state(('nft', self.migrate_to)).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class BackfillNftCountsMigrationTests(MigrationTestCase):
+    migrate_from, migrate_to = '0002_add_nft_management_fields', '0003_add_profile_nft_counts'
+
+    def test_counts_are_backfilled(self):
+        NFT = self.old_apps.get_model('nft', 'NFT')
+        UserProfile = self.old_apps.get_model('nft', 'UserProfile')
+        UserProfile.objects.create(wallet_address=ALICE.replace('a', 'A'), username='alice')
+        for token_id, owner, creator, burned in ((1, ALICE, ALICE, False), (2, ALICE.replace('a', 'A'), ALICE, False),
+                                                 (3, BOB, ALICE, False), (4, ALICE, ALICE, True)):
+            NFT.objects.create(token_id=token_id, name='', description='', image_url='', token_uri='',
+                               owner_address=owner, creator_address=creator, is_burned=burned)
+        apps = self.migrate()
+        counts = dict((address.lower(), (owned, created)) for address, owned, created in
+                      apps.get_model('nft', 'UserProfile').objects.values_list(
+                          'wallet_address', 'nfts_owned', 'nfts_created'))
+        self.assertEqual(counts, {ALICE: (2, 3), BOB: (1, 0)})
+
+
+
+class CanonicalAddressMigrationTests(MigrationTestCase):
+    migrate_from, migrate_to = '0003_add_profile_nft_counts', '0004_canonical_addresses'
+
+    def test_mixed_case_duplicates_are_merged(self):
+        UserProfile = self.old_apps.get_model('nft', 'UserProfile')
+        Follow = UserProfile.following.through
+        NFT = self.old_apps.get_model('nft', 'NFT')
+        Favorite = self.old_apps.get_model('nft', 'Favorite')
+        NFTView = self.old_apps.get_model('nft', 'NFTView')
+        mixed = '0x' + 'A' * 40
+        alice = UserProfile.objects.create(wallet_address=mixed, username='alice')
+        twin = UserProfile.objects.create(wallet_address=ALICE, username='alice2', bio='hi', twitter='al')
+        bob = UserProfile.objects.create(wallet_address=BOB)
+        carol = UserProfile.objects.create(wallet_address=CAROL)
+        for source, target in ((twin, bob), (bob, twin), (alice, bob), (twin, alice), (carol, alice)):
+            Follow.objects.create(from_userprofile_id=source.id, to_userprofile_id=target.id)
+        nfts = [NFT.objects.create(token_id=n, name='', description='', image_url='', token_uri='',
+                                   owner_address=mixed, creator_address=mixed) for n in (1, 2)]
+        first_favorite = Favorite.objects.create(nft=nfts[0], user_address=mixed)
+        for nft, address in ((nfts[0], ALICE), (nfts[1], ALICE), (nfts[0], BOB)):
+            Favorite.objects.create(nft=nft, user_address=address)
+        first_view = NFTView.objects.create(nft=nfts[0], viewer_address=mixed, ip_address='10.0.0.1')
+        for address, ip in ((ALICE, '10.0.0.1'), (ALICE, '10.0.0.2'), (None, '10.0.0.1')):
+            NFTView.objects.create(nft=nfts[0], viewer_address=address, ip_address=ip)
+
+        apps = self.migrate()
+        UserProfile = apps.get_model('nft', 'UserProfile')
+        profiles = {profile.wallet_address: profile for profile in UserProfile.objects.all()}
+        self.assertEqual(set(profiles), {ALICE, BOB, CAROL})
+        merged = profiles[ALICE]
+        self.assertEqual((merged.id, merged.username, merged.bio, merged.twitter), (alice.id, 'alice', 'hi', 'al'))
+        edges = set(UserProfile.following.through.objects.values_list(
+            'from_userprofile__wallet_address', 'to_userprofile__wallet_address'))
+        self.assertEqual(edges, {(ALICE, BOB), (BOB, ALICE), (CAROL, ALICE)})
+        self.assertEqual(set(apps.get_model('nft', 'NFT').objects.values_list('owner_address', 'creator_address')),
+                         {(ALICE, ALICE)})
+        favorites = apps.get_model('nft', 'Favorite').objects
+        self.assertEqual(sorted(favorites.values_list('nft__token_id', 'user_address')), [(1, ALICE), (1, BOB), (2, ALICE)])
+        self.assertTrue(favorites.filter(id=first_favorite.id).exists())
+        views = apps.get_model('nft', 'NFTView').objects
+        self.assertEqual(sorted(views.values_list('viewer_address', 'ip_address'), key=str),
+                         sorted([(ALICE, '10.0.0.1'), (ALICE, '10.0.0.2'), (None, '10.0.0.1')], key=str))
+        self.assertTrue(views.filter(id=first_view.id).exists())
+
+
+def data_url(payload):
+    import base64
+    return 'data:image/png;base64,' + base64.b64encode(payload).decode()
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ReplacedUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.request = RequestFactory().get('/')
+        self.profile = UserProfile.objects.create(wallet_address='0x' + 'a' * 40)
+
+    def upload(self, profile, payload):
+        """Set profile's avatar to an already-rendered image (variants stored up front)"""
+        digest = content_hash(payload)
+        for size in AVATAR_SIZES:
+            for fmt in FORMATS:
+                default_storage.save(variant_name(digest, 'avatar', size, fmt), ContentFile(b'variant'))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                profile.avatar_url = handle_profile_image(profile, data_url(payload), profile.wallet_address,
+                                                          self.request)
+                profile.save()
+        return digest
+
+    def stored(self, digest):
+        return [name for name in [f'profile_images/{digest}.png'] + [
+            variant_name(digest, 'avatar', size, fmt) for size in AVATAR_SIZES for fmt in FORMATS]
+            if default_storage.exists(name)]
+
+    def test_replaced_upload_and_variants_are_deleted_after_commit(self):
+        old = self.upload(self.profile, b'first')
+        self.assertTrue(self.stored(old))
+        self.upload(self.profile, b'second')
+        self.assertEqual(self.stored(old), [])
+
+    def test_failed_save_keeps_the_old_file(self):
+        old = self.upload(self.profile, b'first')
+        kept = self.stored(old)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                handle_profile_image(self.profile, data_url(b'second'), self.profile.wallet_address, self.request)
+                raise RuntimeError('save failed')
+        self.assertEqual(self.stored(old), kept)
+
+    def test_file_shared_with_another_profile_is_kept(self):
+        old = self.upload(self.profile, b'first')
+        other = UserProfile.objects.create(wallet_address='0x' + 'b' * 40)
+        self.upload(other, b'first')
+        kept = self.stored(old)
+        self.upload(self.profile, b'second')
+        self.assertEqual(self.stored(old), kept)
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 56
+
+
+class StreamedUploadTests(TestCase):
+    def setUp(self):
+        media, temp = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(temp.cleanup)
+        self.temp_dir = temp.name
+        override = override_settings(MEDIA_ROOT=media.name, FILE_UPLOAD_TEMP_DIR=temp.name, PROFILE_IMAGE_MAX_SIZE=1000)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def post(self, payload, content_type='image/png'):
+        return self.client.post(reverse('nft:update_profile', args=[ALICE]), {
+            'username': 'alice', 'profile_image': SimpleUploadedFile('avatar.png', payload, content_type=content_type),
+        })
+
+    def assertNoTempFiles(self):
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_stored_extension_comes_from_the_bytes(self):
+        response = self.post(PNG, content_type='image/svg+xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['avatar_url'].rsplit('.', 1)[1], 'png')
+        self.assertNoTempFiles()
+
+    def test_unsupported_image_is_rejected(self):
+        for payload in (b'<svg xmlns="http://www.w3.org/2000/svg"/>', b''):
+            response = self.post(payload)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], 'profile_image: not a supported image')
+            self.assertNoTempFiles()
+        self.assertFalse(UserProfile.objects.exists())
+
+    def test_size_limit_is_enforced_mid_stream(self):
+        handler = ProfileImageUploadHandler(max_size=1000)
+        handler.chunk_size = 400
+        # No Content-Length on the part, so only the bytes received tell
+        handler.new_file('profile_image', 'avatar.png', 'image/png', None)
+        temporary = handler.file.temporary_file_path()
+        handler.receive_data_chunk(PNG + b'\0' * 336, 0)
+        handler.receive_data_chunk(b'\0' * 400, 400)
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'\0' * 400, 800)
+        self.assertEqual(handler.rejected, {'profile_image': 'larger than 1000 bytes'})
+        self.assertFalse(os.path.exists(temporary))
+
+        response = self.post(PNG + b'\0' * 1000)
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(UserProfile.objects.exists())
+        self.assertNoTempFiles()
+
+    def test_failed_store_leaves_no_temp_file(self):
+        with mock.patch('nft.views.handle_uploaded_image', side_effect=OSError('disk full')):
+            response = self.post(PNG + b'\0' * 500)
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(UserProfile.objects.exists())
+        self.assertNoTempFiles()
+
+
+class MetadataFailureTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        for name, value in (('CACHE_DIR', Path(cache_dir)), ('_failures', OrderedDict())):
+            patcher = mock.patch.object(token_metadata, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        race = mock.patch.object(token_metadata, '_race', side_effect=LookupError('no gateway'))
+        self.race = race.start()
+        self.addCleanup(race.stop)
+
+    def uri(self, n):
+        return f'ipfs://Qm{"x" * 43}{n + 1}'
+
+    def test_failed_cids_are_not_raced_again_until_the_ttl_passes(self):
+        self.assertIsNone(token_metadata.fetch_metadata(self.uri(1)))
+        self.assertIsNone(token_metadata.fetch_metadata(self.uri(1)))
+        self.assertEqual(self.race.call_count, 1)
+        token_metadata.request_metadata(self.uri(1))
+        self.assertNotIn(token_metadata.ipfs_path(self.uri(1)), token_metadata._queued)
+        # Explicit prefetches (fetch_token_metadata, sync_blockchain) still retry
+        self.assertEqual(token_metadata.prefetch_metadata([self.uri(1)]), (0, 1))
+        self.assertEqual(self.race.call_count, 2)
+        with mock.patch.object(token_metadata, 'FAILURE_TTL', 0):
+            token_metadata.fetch_metadata(self.uri(2))
+            token_metadata.fetch_metadata(self.uri(2))
+        self.assertEqual(self.race.call_count, 4)
+
+    def test_failures_remembered_are_bounded(self):
+        with mock.patch.object(token_metadata, 'MAX_FAILURES', 2):
+            for n in range(3):
+                token_metadata.fetch_metadata(self.uri(n))
+        self.assertEqual(list(token_metadata._failures), [token_metadata.ipfs_path(self.uri(n)) for n in (1, 2)])
+        self.assertFalse(token_metadata.recently_failed(token_metadata.ipfs_path(self.uri(0))))
+
+
+class ActivityPayloadTests(TestCase):
+    def test_avatars_come_from_profiles(self):
+        nft = make_nft(1)
+        seller, buyer = '0x' + 'a' * 40, '0x' + 'b' * 40
+        UserProfile.objects.create(wallet_address=seller, username='seller',
+                                   avatar_url='https://example.com/media/profile_images/a.png',
+                                   avatar_variants={'webp': {'64': 'https://example.com/media/a-64.webp'}})
+        UserProfile.objects.create(wallet_address=buyer, avatar_url='https://example.com/media/b.png')
+        tx = make_transaction(1, nft, seller, buyer, 'buy', price=1)
+        stranger = make_transaction(2, nft, buyer, '0x' + 'c' * 40, 'transfer')
+        sale, transfer = activity_payloads([tx, stranger])
+        self.assertEqual(sale['from'], {'address': seller, 'name': 'seller',
+                                        'avatar': 'https://example.com/media/a-64.webp'})
+        self.assertEqual(sale['to']['avatar'], 'https://example.com/media/b.png')
+        self.assertEqual(sale['to']['name'], 'Userbbbb')
+        self.assertIsNone(transfer['to']['avatar'])
+
+
+class RequestMetricsTests(TestCase):
+    def test_unknown_methods_share_one_label(self):
+        for method in ('GET', 'BREW', 'PROPFIND'):
+            observe_request('metrics_test_view', method, 0.01, 0, 0)
+        methods = {sample.labels['method'] for metric in REQUEST_LATENCY.collect() for sample in metric.samples
+                   if sample.labels.get('view') == 'metrics_test_view'}
+        self.assertEqual(methods, {'GET', 'other'})
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.nft = make_nft(1)
+        self.star, self.fan, self.other, self.late = (
+            UserProfile.objects.create(wallet_address='0x' + c * 40) for c in '1234')
+
+    def activity(self, count, start=1):
+        return Transaction.objects.bulk_create([Transaction(
+            transaction_hash=f'0x{n:064x}', nft=self.nft, from_address=self.star.wallet_address, to_address='0x' + 'e' * 40,
+            transaction_type='list', block_number=n, gas_used=21000, gas_price=1, timestamp=timezone.now(),
+        ) for n in range(start, start + count)])
+
+    def timeline_ids(self, owner):
+        return [tx.id for tx in timeline.timeline_page(owner, limit=100)[0]]
+
+    def test_fan_out_keeps_timelines_near_their_length(self):
+        follow(self.star, self.fan)
+        for tx in self.activity(timeline.TIMELINE_LENGTH + 100):
+            timeline.fan_out(tx)
+            self.assertLess(TimelineEntry.objects.filter(owner_id=self.fan.id).count(),
+                            timeline.TIMELINE_LENGTH + timeline.TRIM_EVERY)
+        overflow = TimelineEntry.objects.count() - timeline.TIMELINE_LENGTH
+        self.assertEqual(timeline.trim_timelines(), overflow)
+        newest = Transaction.objects.order_by('-id').values_list('id', flat=True)[:timeline.TIMELINE_LENGTH]
+        self.assertEqual(set(TimelineEntry.objects.values_list('transaction_id', flat=True)), set(newest))
+
+    @mock.patch.object(timeline, 'FANOUT_LIMIT', 3)
+    def test_crossing_the_limit_drops_pushed_copies(self):
+        follow(self.star, self.fan)
+        follow(self.star, self.other)
+        for tx in self.activity(5):
+            timeline.fan_out(tx)
+        self.assertEqual(TimelineEntry.objects.count(), 10)
+        follow(self.star, self.late)
+        self.assertFalse(TimelineEntry.objects.exists())
+        expected = sorted(Transaction.objects.values_list('id', flat=True), reverse=True)
+        for owner in (self.fan, self.other, self.late):
+            self.assertEqual(self.timeline_ids(owner), expected)
+
+    @mock.patch.object(timeline, 'FANOUT_LIMIT', 3)
+    def test_dropping_under_the_limit_backfills_followers(self):
+        for owner in (self.fan, self.other, self.late):
+            follow(self.star, owner)
+        for tx in self.activity(5):
+            # Pulled: nothing is pushed
+            self.assertEqual(timeline.fan_out(tx), 0)
+        unfollow(self.star, self.late)
+        expected = sorted(Transaction.objects.values_list('id', flat=True), reverse=True)
+        self.assertEqual(self.timeline_ids(self.fan), expected)
+        self.assertEqual(self.timeline_ids(self.other), expected)
+        self.assertEqual(self.timeline_ids(self.late), [])
+        self.assertEqual(TimelineEntry.objects.count(), 10)
+
+
+CONTRACT = '0x' + '1' * 40
+ALICE, BOB, CAROL, DAVE = ('0x' + c * 40 for c in 'abcd')
+ZERO = '0x' + '0' * 40
+
+
+def chain_log(name, block, index, tx, **args):
+    """A raw eth_getLogs entry for a marketplace event"""
+    entry = next(entry for entry in abi_registry.registry().abi
+                 if entry.get('type') == 'event' and entry['name'] == name)
+    topic0 = next(topic for topic, decoder in abi_registry.registry().events.items() if decoder.name == name)
+    topics, data_types, data_values = ['0x' + topic0.hex()], [], []
+    for arg in entry['inputs']:
+        if arg['indexed']:
+            topics.append('0x' + encode([arg['type']], [args[arg['name']]]).hex())
+        else:
+            data_types.append(arg['type'])
+            data_values.append(args[arg['name']])
+    return {'address': CONTRACT, 'topics': topics, 'data': '0x' + encode(data_types, data_values).hex(),
+            'blockNumber': hex(block), 'logIndex': hex(index), 'removed': False,
+            'transactionHash': '0x' + hashlib.sha256(tx.encode()).hexdigest()}
+
+
+class FakeChain:
+    """
+    Stand-in for NFTMarketplaceWeb3: a chain of `head` blocks carrying
+    `logs`. Blocks from fork_at on hash differently per branch, so two
+    FakeChains with different branches look like a reorg.
+    """
+    contract_address = CONTRACT
+
+    def __init__(self, logs, head, fork_at=None, branch='a', delay=None):
+        self.logs, self.head, self.fork_at, self.branch, self.delay = logs, head, fork_at, branch, delay
+
+    def block_hash(self, number):
+        branch = self.branch if self.fork_at is not None and number >= self.fork_at else 'a'
+        return '0x' + hashlib.sha256(f'{branch}{number}'.encode()).hexdigest()
+
+    def get_latest_block(self):
+        return self.head
+
+    def get_logs(self, from_block, to_block):
+        if self.delay:
+            self.delay(from_block)
+        return [log for log in self.logs if from_block <= int(log['blockNumber'], 16) <= to_block]
+
+    def get_blocks(self, numbers):
+        return {n: (self.block_hash(n), self.block_hash(n - 1), 1_700_000_000 + 12 * n)
+                for n in numbers if n <= self.head}
+
+
+class ChainTestCase(TestCase):
+    """Ingestion from block 100 against a FakeChain, with tokens 1 and 2 owned by Alice"""
+
+    def setUp(self):
+        for name, value in (('START_BLOCK', 100), ('JOURNAL_SIZE', 128)):
+            patcher = mock.patch.object(chain_sync, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(web3_instance.set_instance, None)
+        make_nft(1, owner_address=ALICE)
+        make_nft(2, owner_address=ALICE)
+        rebuild_profile_stats()
+
+    def use_chain(self, chain):
+        web3_instance.set_instance(chain)
+        return chain
+
+    def state(self):
+        nfts = list(NFT.objects.order_by('token_id').values_list(
+            'token_id', 'owner_address', 'is_listed', 'is_auction', 'price', 'auction_end_time', 'current_bid',
+            'highest_bidder', 'is_burned', 'token_uri'))
+        transactions = sorted(Transaction.objects.values_list('transaction_hash', 'transaction_type', 'block_number'))
+        profiles = sorted(UserProfile.objects.values_list(
+            'wallet_address', 'nfts_owned', 'nfts_created', 'total_created', 'total_collected', 'total_volume'))
+        return nfts, transactions, [profile for profile in profiles if any(profile[1:])]
+
+
+def sale(block, token_id, seller, buyer, price, tx):
+    return [chain_log('Transfer', block, 0, tx, **{'from': seller, 'to': buyer, 'tokenId': token_id}),
+            chain_log('NFTSold', block, 1, tx, tokenId=token_id, seller=seller, buyer=buyer, price=price)]
+
+
+def mint(block, token_id, creator, tx):
+    return [chain_log('Transfer', block, 0, tx, **{'from': ZERO, 'to': creator, 'tokenId': token_id}),
+            chain_log('NFTMinted', block, 1, tx, tokenId=token_id, creator=creator, tokenURI=f'ipfs://{token_id}',
+                      royaltyPercentage=250)]
+
+
+class ChainReorgTests(ChainTestCase):
+    def test_depth_one_reorg_restores_the_previous_owner(self):
+        before = self.state()
+        self.use_chain(FakeChain(sale(105, 1, ALICE, BOB, 10 ** 18, 's1'), head=105))
+        chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(NFT.objects.get(token_id=1).owner_address, BOB)
+        self.assertEqual(UserProfile.objects.get(wallet_address=BOB).total_collected, 1)
+
+        self.use_chain(FakeChain([], head=106, fork_at=105, branch='b'))
+        summary = chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(summary['rolled_back'], 1)
+        self.assertEqual(self.state(), before)
+        self.assertEqual(chain_sync.synced_block(), 106)
+
+    def test_deep_reorg_matches_a_clean_ingest_of_the_new_branch(self):
+        common = mint(102, 900, BOB, 'm900')
+        branch_a = common + sale(104, 1, ALICE, BOB, 10 ** 18, 's1') + mint(106, 901, CAROL, 'm901') + [
+            chain_log('NFTListed', 107, 0, 'l901', tokenId=901, seller=CAROL, price=2 * 10 ** 18, isAuction=True),
+            chain_log('BidPlaced', 108, 0, 'b901', tokenId=901, bidder=DAVE, amount=3 * 10 ** 18),
+        ]
+        branch_b = common + [
+            chain_log('Transfer', 105, 0, 'x2', **{'from': ALICE, 'to': ZERO, 'tokenId': 2}),
+        ] + sale(109, 900, BOB, DAVE, 5 * 10 ** 17, 's900')
+        baseline = self.state()
+
+        self.use_chain(FakeChain(branch_a, head=110))
+        chain_sync.sync(confirmations=0, notify=False)
+        self.assertTrue(NFT.objects.filter(token_id=901, is_auction=True, highest_bidder=DAVE).exists())
+
+        self.use_chain(FakeChain(branch_b, head=112, fork_at=104, branch='b'))
+        summary = chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(summary['rolled_back'], 7)
+        self.assertFalse(NFT.objects.filter(token_id=901).exists())
+        reorged = self.state()
+
+        # Undo everything, then ingest branch b from scratch
+        chain_sync.rollback(chain_sync.START_BLOCK - 1)
+        self.assertEqual(self.state(), baseline)
+        chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(self.state(), reorged)
+        nfts = {row[0]: row for row in reorged[0]}
+        self.assertTrue(nfts[2][8])
+        self.assertEqual(nfts[900][1], DAVE)
+
+    def test_reorg_keeps_the_rarity_index_in_step(self):
+        NFT.objects.update(collection='Apes')
+        for token_id, eyes in ((1, 'laser'), (2, 'laser')):
+            rarity.index_pairs(NFT.objects.get(token_id=token_id), [('Eyes', eyes), ('Hat', 'cap')])
+
+        def counts():
+            return (dict(TraitCollection.objects.values_list('collection', 'nft_count')),
+                    sorted(TraitValue.objects.values_list('collection', 'trait_type', 'value', 'count')),
+                    sorted(NFTTrait.objects.values_list('nft__token_id', 'trait__value')))
+
+        before = counts()
+        version = TraitCollection.objects.get(collection='Apes').version
+        burn = chain_log('Transfer', 105, 0, 'x2', **{'from': ALICE, 'to': ZERO, 'tokenId': 2})
+        self.use_chain(FakeChain([burn] + mint(106, 901, CAROL, 'm901'), head=106))
+        chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(TraitCollection.objects.get(collection='Apes').nft_count, 1)
+        self.assertEqual(TraitValue.objects.get(collection='Apes', value='laser').count, 1)
+        # What index_many_in_background does for the minted NFT once the range commits
+        rarity.index_pairs(NFT.objects.get(token_id=901), [('Eyes', 'sleepy')])
+
+        self.use_chain(FakeChain([], head=107, fork_at=105, branch='b'))
+        self.assertEqual(chain_sync.sync(confirmations=0, notify=False)['rolled_back'], 2)
+        self.assertEqual(counts(), ({'Apes': 2, '': 0}, before[1], before[2]))
+        self.assertGreater(TraitCollection.objects.get(collection='').version, 1)
+        self.assertEqual(TraitCollection.objects.get(collection='Apes').version, version + 2)
+
+    def test_reorg_past_the_journal_raises(self):
+        chain_sync.JOURNAL_SIZE = 4
+        self.use_chain(FakeChain(sale(105, 1, ALICE, BOB, 10 ** 18, 's1'), head=120))
+        chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(ChainBlock.objects.count(), 4)
+        self.use_chain(FakeChain([], head=125, fork_at=110, branch='b'))
+        with self.assertRaises(chain_sync.ReorgTooDeep):
+            chain_sync.sync(confirmations=0, notify=False)
+        self.assertEqual(NFT.objects.get(token_id=1).owner_address, BOB)
+        self.assertEqual(chain_sync.synced_block(), 120)
+
+    def test_chain_moving_mid_read_is_retried_next_pass(self):
+        chain = self.use_chain(FakeChain(sale(105, 1, ALICE, BOB, 10 ** 18, 's1'), head=105))
+        chain_sync.sync(confirmations=0, notify=False)
+        # A header that does not link to the journal, while the journal itself is still canonical
+        chain.head = 110
+        real_get_blocks = chain.get_blocks
+        chain.get_blocks = lambda numbers: {n: (h, '0x' + 'f' * 64 if n == 106 else p, t)
+                                            for n, (h, p, t) in real_get_blocks(numbers).items()}
+        with self.assertRaises(chain_sync.ChainMoved):
+            chain_sync.sync(confirmations=0, notify=False)
+        chain.get_blocks = real_get_blocks
+        self.assertEqual(chain_sync.sync(confirmations=0, notify=False)['rolled_back'], 0)
+        self.assertEqual(chain_sync.synced_block(), 110)
+
+
+class AuctionSchedulerTests(TestCase):
+    def test_load_reads_only_open_auctions(self):
+        now = timezone.now()
+        make_auction(1, now + timedelta(minutes=5))
+        make_auction(2, now - timedelta(minutes=5), auction_closed_at=now)
+        make_nft(3)
+        scheduler = auctions.AuctionScheduler()
+        self.assertEqual(scheduler.load(), 1)
+        self.assertEqual(scheduler._heap, [((now + timedelta(minutes=5)).timestamp(), NFT.objects.get(token_id=1).id)])
+
+    def test_wakes_for_an_auction_ending_before_the_current_head(self):
+        scheduler = auctions.AuctionScheduler()
+        woken = threading.Event()
+
+        def close_due_auctions():
+            woken.set()
+            return []
+
+        scheduler.schedule(1, timezone.now() + timedelta(hours=1))
+        with mock.patch.object(auctions, 'close_due_auctions', side_effect=close_due_auctions), \
+                mock.patch.object(auctions.connections, 'close_all'):
+            thread = threading.Thread(target=scheduler.run)
+            thread.start()
+            try:
+                self.assertFalse(woken.wait(0.2))
+                scheduled_at = time.time()
+                scheduler.schedule(2, timezone.now() + timedelta(seconds=0.3))
+                self.assertTrue(woken.wait(5))
+                self.assertGreaterEqual(time.time() - scheduled_at, 0.25)
+            finally:
+                scheduler.stop()
+                thread.join(5)
+        self.assertFalse(thread.is_alive())
+        # The hour-long auction is still waiting
+        self.assertEqual([nft_id for _, nft_id in scheduler._heap], [1])
+
+    def test_rereads_open_auctions_listed_elsewhere(self):
+        scheduler = auctions.AuctionScheduler(reload_interval=0.2)
+        self.assertFalse(scheduler.running)
+        closed = threading.Event()
+        with mock.patch.object(scheduler, 'load') as load, \
+                mock.patch.object(auctions, 'close_due_auctions', side_effect=lambda: closed.set() or []), \
+                mock.patch.object(auctions.connections, 'close_all'):
+            scheduler.start()
+            self.assertTrue(scheduler.running)
+            try:
+                # Nothing on the heap: only the periodic re-read wakes it
+                self.assertTrue(closed.wait(5))
+            finally:
+                scheduler.stop(timeout=5)
+            self.assertGreaterEqual(load.call_count, 2)
+        self.assertFalse(scheduler._thread.is_alive())
+
+    def test_schedule_auctions_skips_closed_and_fixed_price_listings(self):
+        now = timezone.now()
+        scheduler = auctions.AuctionScheduler()
+        scheduler._thread = mock.Mock()
+        nfts = [NFT(id=1, is_auction=True, auction_end_time=now), NFT(id=2, is_auction=False),
+                NFT(id=3, is_auction=True, auction_end_time=now, auction_closed_at=now)]
+        with mock.patch.object(auctions, 'scheduler', scheduler):
+            auctions.schedule_auctions(nfts)
+        self.assertEqual([nft_id for _, nft_id in scheduler._heap], [1])
+
+
+def listing(**fields):
+    values = {'seller': ALICE, 'price': 0, 'isActive': False, 'isAuction': False, 'auctionEndTime': 0,
+              'startingPrice': 0, 'highestBid': 0, 'highestBidder': ZERO}
+    values.update(fields)
+    return values
+
+
+def snapshot_row(owner=ALICE, is_listed=False, is_auction=False, price=None, auction_end_time=None,
+                 current_bid=None, highest_bidder=None, auction_closed_at=None):
+    return (1, 1, owner, is_listed, is_auction, price, auction_end_time, current_bid, highest_bidder,
+            auction_closed_at)
+
+
+class FindDriftTests(TestCase):
+    def test_in_sync_listing_has_no_drift(self):
+        end = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        row = snapshot_row(is_listed=True, is_auction=True, price=Decimal('1.5'), auction_end_time=end,
+                           current_bid=Decimal('2'), highest_bidder=BOB)
+        chain = listing(isActive=True, isAuction=True, price=15 * 10 ** 17, auctionEndTime=int(end.timestamp()),
+                        highestBid=2 * 10 ** 18, highestBidder='0x' + BOB[2:].upper())  # checksum-style case
+        self.assertEqual(reconcile.find_drift(row, ALICE, chain), [])
+
+    def test_owner_and_listing_drift(self):
+        row = snapshot_row(is_listed=True, price=Decimal('1'))
+        self.assertEqual(reconcile.find_drift(row, BOB, listing()), [('owner_address', ALICE, BOB),
+                                                                    ('is_listed', True, False)])
+
+    def test_price_is_compared_at_column_precision(self):
+        row = snapshot_row(is_listed=True, price=Decimal('0.12345678'))
+        chain = listing(isActive=True, price=123456781 * 10 ** 9)
+        self.assertEqual(reconcile.find_drift(row, ALICE, chain), [])
+
+    def test_auction_without_bids_has_no_bidder(self):
+        row = snapshot_row(is_listed=True, is_auction=True, price=Decimal('1'), current_bid=Decimal('1'),
+                           highest_bidder=BOB, auction_end_time=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        chain = listing(isActive=True, isAuction=True, price=10 ** 18, auctionEndTime=1767225600)
+        self.assertEqual(reconcile.find_drift(row, ALICE, chain), [('current_bid', Decimal('1'), None),
+                                                                  ('highest_bidder', BOB, None)])
+
+    def test_closed_but_unsettled_auction_only_checks_the_owner(self):
+        row = snapshot_row(is_auction=True, auction_closed_at=timezone.now())
+        chain = listing(isActive=True, isAuction=True, price=10 ** 18, highestBid=5, highestBidder=BOB)
+        self.assertEqual(reconcile.find_drift(row, ALICE, chain), [])
+
+
+class ReconcileTests(TestCase):
+    def test_fixes_drifted_rows_and_profile_counts(self):
+        make_nft(1, owner_address=ALICE)
+        make_nft(2, owner_address=ALICE, is_listed=True, price=1)
+        make_nft(3, owner_address=ALICE)
+        rebuild_profile_stats()
+        owners = {1: BOB, 2: ALICE}
+
+        class Node:
+            def batch_call(self, calls, block):
+                results = []
+                for name, (token_id,) in calls:
+                    if token_id == 3:
+                        results.append(None)
+                    elif name == 'ownerOf':
+                        results.append(owners[token_id])
+                    else:
+                        results.append(tuple(listing().values()))
+                return results
+
+        self.addCleanup(web3_instance.set_instance, None)
+        web3_instance.set_instance(Node())
+        batches = list(reconcile.reconcile(batch_size=2, concurrency=2, block=1))
+        self.assertEqual([batch.checked for batch in batches], [2, 1])
+        self.assertEqual(sum(batch.fixed for batch in batches), 2)
+        self.assertEqual(NFT.objects.get(token_id=1).owner_address, BOB)
+        self.assertFalse(NFT.objects.get(token_id=2).is_listed)
+        self.assertEqual(UserProfile.objects.get(wallet_address=BOB).nfts_owned, 1)
+        self.assertEqual(UserProfile.objects.get(wallet_address=ALICE).nfts_owned, 2)
+        self.assertIn({'token_id': 3, 'field': 'token', 'db': 'registered', 'chain': 'not minted or burned',
+                       'fixed': False}, batches[1].drift)
+
+
+def thread_pool(max_workers, mp_context, initializer, initargs):
+    """ProcessPoolExecutor stand-in: fetch_shard only talks to the (fake) node, so threads do"""
+    return ThreadPoolExecutor(max_workers)
+
+
+@mock.patch.object(chain_backfill, 'ProcessPoolExecutor', thread_pool)
+class BackfillTests(ChainTestCase):
+    def setUp(self):
+        super().setUp()
+        logs = (sale(150, 1, ALICE, BOB, 10 ** 18, 's1') + sale(250, 1, BOB, CAROL, 10 ** 18, 's2') +
+                sale(450, 1, CAROL, DAVE, 10 ** 18, 's3'))
+        # Earlier shards answer slower, so later ones finish first
+        self.chain = self.use_chain(FakeChain(logs, head=599, delay=lambda start: time.sleep((600 - start) / 4000)))
+
+    def test_shards_are_applied_in_block_order(self):
+        applied = [(start, end) for start, end, _ in chain_backfill.backfill(shard_size=100, workers=4,
+                                                                             rpc_rate=0, confirmations=0)]
+        self.assertEqual(applied, chain_backfill.shards(100, 599, 100))
+        self.assertEqual(NFT.objects.get(token_id=1).owner_address, DAVE)
+        owned = dict(UserProfile.objects.values_list('wallet_address', 'nfts_owned'))
+        self.assertEqual([owned.get(address, 0) for address in (ALICE, BOB, CAROL, DAVE)], [1, 0, 0, 1])
+        self.assertEqual(Transaction.objects.filter(transaction_type='buy').count(), 3)
+        self.assertEqual(chain_sync.synced_block(), 599)
+        # Only the newest blocks are journaled, and sync() carries on from the backfill
+        self.assertEqual(ChainBlock.objects.order_by('number').first().number, 599 - chain_sync.JOURNAL_SIZE + 1)
+        self.chain.head = 610
+        self.assertEqual(chain_sync.sync(confirmations=0, notify=False)['rolled_back'], 0)
+
+    def test_interrupted_backfill_resumes_after_the_last_applied_shard(self):
+        run = chain_backfill.backfill(shard_size=100, workers=4, rpc_rate=0, confirmations=0)
+        self.assertEqual([next(run)[:2], next(run)[:2]], [(100, 199), (200, 299)])
+        run.close()
+        self.assertEqual(chain_sync.synced_block(), 299)
+        self.assertEqual(NFT.objects.get(token_id=1).owner_address, CAROL)
+        resumed = [shard[:2] for shard in chain_backfill.backfill(shard_size=100, workers=4, rpc_rate=0,
+                                                                  confirmations=0)]
+        self.assertEqual(resumed, [(300, 399), (400, 499), (500, 599)])
+        self.assertEqual(NFT.objects.get(token_id=1).owner_address, DAVE)
+        self.assertEqual(Transaction.objects.filter(transaction_type='buy').count(), 3)
+
+
+class RateLimiterTests(TestCase):
+    def test_spaces_calls_by_the_rate(self):
+        limiter = chain_backfill.RateLimiter(50)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 50 - 0.01)
+
+    def test_no_limit_at_zero(self):
+        limiter = chain_backfill.RateLimiter(0)
+        started = time.monotonic()
+        for _ in range(1000):
+            limiter.wait()
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+class AbiRegistryTests(TestCase):
+    def test_decoded_events_match_web3(self):
+        from web3 import Web3
+        from .management.commands.benchmark_decode import _canonical, synthetic_logs, web3_formatted
+        registry = abi_registry.registry()
+        raw = synthetic_logs(registry, 300, random.Random(1))
+        formatted = [web3_formatted(log) for log in raw]
+        contract = Web3().eth.contract(address=Web3.to_checksum_address(CONTRACT), abi=registry.abi)
+        expected = []
+        for log in formatted:
+            event = getattr(contract.events, registry.events[bytes(log['topics'][0])].name)()
+            data = event.process_log(log)
+            expected.append((data['blockNumber'], data['logIndex'], data['transactionHash'].to_0x_hex(),
+                             data['event'], {name: _canonical(value) for name, value in data['args'].items()}))
+        self.assertEqual(registry.decode_logs(raw), expected)
+        self.assertEqual(registry.decode_logs(formatted), expected)
+
+    def test_skips_removed_and_foreign_logs_and_sorts(self):
+        registry = abi_registry.registry()
+        later = chain_log('BidPlaced', 7, 0, 'b', tokenId=1, bidder=BOB, amount=5)
+        earlier = chain_log('NFTDelisted', 6, 3, 'd', tokenId=1, seller=ALICE)
+        removed = dict(chain_log('NFTDelisted', 6, 4, 'r', tokenId=2, seller=ALICE), removed=True)
+        foreign = dict(earlier, topics=['0x' + 'ab' * 32])
+        events = registry.decode_logs([later, removed, foreign, earlier, dict(earlier, topics=[])])
+        self.assertEqual([(block, index, name, args) for block, index, _, name, args in events], [
+            (6, 3, 'NFTDelisted', {'tokenId': 1, 'seller': ALICE}),
+            (7, 0, 'BidPlaced', {'tokenId': 1, 'bidder': BOB, 'amount': 5}),
+        ])
+
+    def test_disk_cache(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        artifact = os.path.join(workdir.name, 'NFTMarketplace.json')
+        cache_dir = os.path.join(workdir.name, 'cache')
+        shutil.copy(abi_registry.ARTIFACT_PATH, artifact)
+
+        compiled = abi_registry.load(artifact, cache_dir)
+        cache_path = os.path.join(cache_dir, 'NFTMarketplace.json')
+        with open(cache_path) as f:
+            cached = json.load(f)
+        self.assertNotIn('bytecode', cached)
+        self.assertEqual(cached['selectors'], compiled.selectors)
+
+        # Served from the cache, even with the artifact gone
+        os.remove(artifact)
+        with mock.patch.object(abi_registry.AbiRegistry, 'derive') as derive:
+            from_cache = abi_registry.load(artifact, cache_dir)
+        derive.assert_not_called()
+        self.assertEqual(set(from_cache.events), set(compiled.events))
+
+        # A changed artifact is recompiled
+        with open(artifact, 'w') as f:
+            json.dump({'abi': [entry for entry in compiled.abi if entry.get('name') != 'NFTSold']}, f)
+        recompiled = abi_registry.load(artifact, cache_dir)
+        self.assertNotIn('NFTSold', {decoder.name for decoder in recompiled.events.values()})
+
+        os.remove(artifact)
+        os.remove(cache_path)
+        with self.assertRaises(FileNotFoundError):
+            abi_registry.load(artifact, cache_dir)
@@ -0,0 +1,226 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Square avatar crops and width-bounded banners, each in every supported format
+AVATAR_SIZES = (32, 64, 128, 256)
+BANNER_WIDTHS = (640, 1280, 1920)
+FORMATS = tuple(fmt for fmt in ('webp', 'avif') if features.check(fmt))
+QUALITY = {'webp': 80, 'avif': 60}
+
+# Smallest avatar variant lists use in place of the full-size upload
+LIST_AVATAR_SIZE = 64
+
+THUMBNAIL_DIR = 'thumbnails'
+
+# Hex digits of the SHA-256 used in stored names
+HASH_LENGTH = 32
+
+# kind -> (UserProfile URL field, UserProfile variants field)
+PROFILE_FIELDS = {
+    'avatar': ('avatar_url', 'avatar_variants'),
+    'banner': ('banner_url', 'banner_variants'),
+}
+
+
+def content_hash(data):
+    """Name for an uploaded image: identical bytes always get the same name"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def file_content_hash(f, chunk_size=64 * 2 ** 10):
+    """content_hash of a file, read in chunks"""
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        sha256.update(chunk)
+    return sha256.hexdigest()[:HASH_LENGTH]
+
+
+def render_source(name):
+    """
+    What to hand render_variants for a stored file: its path when the
+    storage is on local disk (workers read it themselves), else its bytes
+    """
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        with default_storage.open(name) as f:
+            return f.read()
+
+
+def variant_name(digest, kind, size, fmt):
+    return f'{THUMBNAIL_DIR}/{digest}/{kind}-{size}.{fmt}'
+
+
+def variant_sizes(kind):
+    return AVATAR_SIZES if kind == 'avatar' else BANNER_WIDTHS
+
+
+def render_variants(source, kind):
+    """
+    Decode an uploaded image (a file path or its bytes) and encode every
+    variant of `kind`. Returns [(size, fmt, bytes)]. Runs in the thumbnail
+    worker processes, so it touches nothing but Pillow.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        variants = []
+        for size in variant_sizes(kind):
+            if kind == 'avatar':
+                resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            else:
+                # Never upscale; a banner narrower than the smallest width still gets one variant
+                if size > image.width and size != BANNER_WIDTHS[0]:
+                    continue
+                width = min(size, image.width)
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for fmt in FORMATS:
+                out = io.BytesIO()
+                resized.save(out, fmt.upper(), quality=QUALITY[fmt])
+                variants.append((size, fmt, out.getvalue()))
+        return variants
+
+
+def store_variants(digest, kind, rendered, base_url):
+    """Save rendered variants; returns {fmt: {size: url}} for the profile"""
+    urls = {}
+    for size, fmt, data in rendered:
+        name = variant_name(digest, kind, size, fmt)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        urls.setdefault(fmt, {})[str(size)] = base_url + default_storage.url(name)
+    return urls
+
+
+def existing_variants(digest, kind, base_url):
+    """URLs of a previously rendered image with the same content, or None"""
+    names = {
+        (size, fmt): variant_name(digest, kind, size, fmt)
+        for size in variant_sizes(kind) for fmt in FORMATS
+    }
+    # Banners skip widths above the original, so only the smallest size is certain
+    required = [name for (size, _), name in names.items() if kind == 'avatar' or size == BANNER_WIDTHS[0]]
+    if not all(default_storage.exists(name) for name in required):
+        return None
+    urls = {}
+    for (size, fmt), name in names.items():
+        if default_storage.exists(name):
+            urls.setdefault(fmt, {})[str(size)] = base_url + default_storage.url(name)
+    return urls
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process pool shared by all requests in this process, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded server process is not safe
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _reset_executor(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+
+
+def schedule_profile_variants(profile_id, kind, source, digest, url, base_url):
+    """
+    Render `kind` variants of an uploaded image (see render_source) off the
+    request path and attach them to the profile once done, unless it has
+    switched to a different image meanwhile. With THUMBNAIL_WORKERS = 0 it
+    renders inline.
+    """
+    if not getattr(settings, 'THUMBNAIL_WORKERS', 2):
+        _attach_variants(profile_id, kind, url, store_variants(digest, kind, render_variants(source, kind), base_url))
+        return
+    executor = get_executor()
+    try:
+        future = executor.submit(render_variants, source, kind)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        future = get_executor().submit(render_variants, source, kind)
+
+    def done(future):
+        try:
+            variants = store_variants(digest, kind, future.result(), base_url)
+            _attach_variants(profile_id, kind, url, variants)
+        except BrokenProcessPool:
+            _reset_executor(executor)
+            logger.error("Thumbnail worker died rendering %s for profile %s", kind, profile_id)
+        except Exception:
+            logger.exception("Failed to render %s variants for profile %s", kind, profile_id)
+
+    future.add_done_callback(done)
+
+
+def _attach_variants(profile_id, kind, url, variants):
+    from .models import UserProfile
+    url_field, variants_field = PROFILE_FIELDS[kind]
+    UserProfile.objects.filter(id=profile_id, **{url_field: url}).update(**{variants_field: variants})
+
+
+def regenerate_profile_variants(force=False, workers=None):
+    """
+    Render variants for profile images uploaded before thumbnails existed
+    (or all of them with force=True), fanning the work across a process
+    pool. Images not stored in default_storage (external URLs) are skipped.
+    Returns the number of images rendered.
+    """
+    from .models import UserProfile
+    media_url = settings.MEDIA_URL
+    jobs = []
+    for profile in UserProfile.objects.only('id', 'avatar_url', 'banner_url', 'avatar_variants', 'banner_variants'):
+        for kind, (url_field, variants_field) in PROFILE_FIELDS.items():
+            url = getattr(profile, url_field)
+            if not url or media_url not in url or (getattr(profile, variants_field) and not force):
+                continue
+            base_url, _, name = url.partition(media_url)
+            if default_storage.exists(name):
+                jobs.append((profile.id, kind, url, base_url.rstrip('/'), name))
+
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {}
+        for profile_id, kind, url, base_url, name in jobs:
+            with default_storage.open(name) as f:
+                digest = file_content_hash(f)
+            futures[executor.submit(render_variants, render_source(name), kind)] = (
+                profile_id, kind, url, base_url, digest)
+        for future in as_completed(futures):
+            profile_id, kind, url, base_url, digest = futures[future]
+            try:
+                variants = store_variants(digest, kind, future.result(), base_url)
+            except Exception:
+                logger.exception("Failed to render %s variants for profile %s", kind, profile_id)
+                continue
+            _attach_variants(profile_id, kind, url, variants)
+            rendered += 1
+    return rendered
+
+
+def list_avatar_url(variants):
+    """Small WebP avatar for list rows, or None while variants are pending"""
+    return ((variants or {}).get('webp') or {}).get(str(LIST_AVATAR_SIZE))
@@ -0,0 +1,194 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from .models import TimelineEntry, Transaction, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Wallets with at least this many followers are not fanned out on write;
+# their activity is merged into followers' timelines at read time instead
+FANOUT_LIMIT = getattr(settings, 'ACTIVITY_TIMELINE_FANOUT_LIMIT', 1000)
+TIMELINE_LENGTH = getattr(settings, 'ACTIVITY_TIMELINE_LENGTH', 500)
+
+TIMELINE_PAGE_SIZE = 20
+MAX_TIMELINE_PAGE_SIZE = 100
+# Recent activity copied into a timeline when its owner follows someone
+FOLLOW_BACKFILL = 50
+INSERT_BATCH_SIZE = 1000
+# fan_out trims about one in TRIM_EVERY of the timelines it writes, so each
+# stays within roughly TIMELINE_LENGTH + TRIM_EVERY entries between sweeps
+TRIM_EVERY = 16
+
+# For follows only the follower is acting; being followed is not activity
+FOLLOW_TYPES = ('follow', 'unfollow')
+
+Follow = UserProfile.following.through
+
+
+def participants(tx):
+    """Addresses whose followers should see tx"""
+    if tx.transaction_type in FOLLOW_TYPES:
+        return {tx.from_address}
+    return {tx.from_address, tx.to_address}
+
+
+def activity_of(addresses):
+    """Transactions (as a Q) that participants() would attribute to any of addresses"""
+    addresses = list(addresses)
+    return Q(from_address__in=addresses) | (Q(to_address__in=addresses) & ~Q(transaction_type__in=FOLLOW_TYPES))
+
+
+def _trim(owner_id, length=TIMELINE_LENGTH):
+    """Delete entries beyond the newest `length` of owner_id's timeline; returns rows deleted"""
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+    oldest_kept = list(entries.order_by('-transaction_id').values_list('transaction_id', flat=True)[length - 1:length])
+    if not oldest_kept:
+        return 0
+    return entries.filter(transaction_id__lt=oldest_kept[0]).delete()[0]
+
+
+def _backfill(owner_ids, address):
+    """Copy address's FOLLOW_BACKFILL most recent activities into each of owner_ids' timelines"""
+    recent = list(Transaction.objects.filter(activity_of([address]))
+                  .order_by('-id').values_list('id', flat=True)[:FOLLOW_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, transaction_id=tx_id) for owner_id in owner_ids for tx_id in recent],
+        batch_size=INSERT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    for owner_id in owner_ids:
+        _trim(owner_id)
+
+
+def fan_out(tx):
+    """
+    Push tx into the timeline of every follower of its participants that
+    are under FANOUT_LIMIT, trimming a TRIM_EVERY share of those timelines
+    back to TIMELINE_LENGTH. Returns the number of timelines written.
+    """
+    pushers = UserProfile.objects.filter(
+        wallet_address__in=participants(tx), followers_count__gt=0, followers_count__lt=FANOUT_LIMIT,
+    ).values_list('id', flat=True)
+    owners = set(Follow.objects.filter(to_userprofile_id__in=list(pushers)).values_list('from_userprofile_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, transaction_id=tx.id) for owner_id in owners],
+        batch_size=INSERT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    # Which owners get trimmed varies with tx.id, so every timeline is trimmed every TRIM_EVERY writes or so
+    for owner_id in owners:
+        if (owner_id + tx.id) % TRIM_EVERY == 0:
+            _trim(owner_id)
+    return len(owners)
+
+
+def on_transaction_saved(sender, instance, created, **kwargs):
+    """post_save hook: fan new transactions out once they commit"""
+    if created:
+        transaction.on_commit(lambda: _safe_fan_out(instance))
+
+
+def _safe_fan_out(tx):
+    try:
+        fan_out(tx)
+    except Exception:
+        logger.exception("Failed to fan out activity %s", tx.pk)
+
+
+def on_follow(owner, followed, followers_count):
+    """
+    Called inside follow()'s transaction with followed's new followers_count.
+    Seeds owner's timeline with followed's recent activity while followed is
+    pushed. When this follow takes followed to FANOUT_LIMIT its activity is
+    pulled at read time from now on, so the copies already pushed into
+    followers' timelines are dropped rather than left to crowd out others.
+    """
+    if followers_count < FANOUT_LIMIT:
+        _backfill([owner.id], followed.wallet_address)
+    elif followers_count == FANOUT_LIMIT:
+        TimelineEntry.objects.filter(
+            owner_id__in=Follow.objects.filter(to_userprofile_id=followed.id).values('from_userprofile_id'),
+            transaction__in=Transaction.objects.filter(activity_of([followed.wallet_address])),
+        ).delete()
+
+
+def on_unfollow(owner, followed, followers_count):
+    """
+    Called inside unfollow()'s transaction with followed's new
+    followers_count. Drops followed's activity from owner's timeline. When
+    this unfollow takes followed back under FANOUT_LIMIT, its activity is no
+    longer merged in at read time, so it is backfilled into every remaining
+    follower's timeline; otherwise everything it did while pulled would be
+    missing from them.
+    """
+    TimelineEntry.objects.filter(
+        owner_id=owner.id,
+        transaction__in=Transaction.objects.filter(activity_of([followed.wallet_address])),
+    ).delete()
+    if followers_count == FANOUT_LIMIT - 1:
+        followers = list(Follow.objects.filter(to_userprofile_id=followed.id).values_list('from_userprofile_id', flat=True))
+        _backfill(followers, followed.wallet_address)
+        logger.info("%s dropped under the fan-out limit; backfilled %d timelines", followed.wallet_address, len(followers))
+
+
+def timeline_page(owner, cursor=None, limit=TIMELINE_PAGE_SIZE):
+    """
+    Newest-first page of owner's home timeline: (transactions, next_cursor).
+
+    Pushed activity is one range scan on the (owner, transaction) index;
+    activity of followed wallets at or over FANOUT_LIMIT is read from
+    Transaction and merged in. Both sides are ordered by transaction id,
+    which is also the cursor.
+    """
+    pushed = TimelineEntry.objects.filter(owner_id=owner.id)
+    if cursor:
+        pushed = pushed.filter(transaction_id__lt=cursor)
+    ids = set(pushed.order_by('-transaction_id').values_list('transaction_id', flat=True)[:limit + 1])
+
+    pulled_from = list(Follow.objects.filter(
+        from_userprofile_id=owner.id, to_userprofile__followers_count__gte=FANOUT_LIMIT,
+    ).values_list('to_userprofile__wallet_address', flat=True))
+    if pulled_from:
+        pulled = Transaction.objects.filter(activity_of(pulled_from))
+        if cursor:
+            pulled = pulled.filter(id__lt=cursor)
+        ids.update(pulled.order_by('-id').values_list('id', flat=True)[:limit + 1])
+
+    ids = sorted(ids, reverse=True)
+    next_cursor = ids[limit - 1] if len(ids) > limit else None
+    ids = ids[:limit]
+    transactions = Transaction.objects.select_related('nft').in_bulk(ids)
+    return [transactions[tx_id] for tx_id in ids if tx_id in transactions], next_cursor
+
+
+def trim_timelines(length=TIMELINE_LENGTH):
+    """Delete entries beyond the newest `length` of every timeline; returns rows deleted"""
+    overfull = (TimelineEntry.objects.values('owner_id').annotate(n=Count('id'))
+                .filter(n__gt=length).values_list('owner_id', flat=True))
+    return sum(_trim(owner_id, length) for owner_id in list(overfull))
+
+
+def rebuild_timelines(length=TIMELINE_LENGTH):
+    """
+    Refill every timeline from the follow graph and the hot transaction
+    table (e.g. after seed_data, which bypasses the post_save hook).
+    Returns the number of entries written.
+    """
+    pushers = dict(UserProfile.objects.filter(followers_count__gt=0, followers_count__lt=FANOUT_LIMIT)
+                   .values_list('id', 'wallet_address'))
+    following = {}
+    for owner_id, followed_id in Follow.objects.filter(to_userprofile_id__in=list(pushers)).values_list(
+            'from_userprofile_id', 'to_userprofile_id'):
+        following.setdefault(owner_id, []).append(pushers[followed_id])
+
+    written = 0
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        for owner_id, addresses in following.items():
+            recent = (Transaction.objects.filter(activity_of(addresses))
+                      .order_by('-id').values_list('id', flat=True)[:length])
+            entries = [TimelineEntry(owner_id=owner_id, transaction_id=tx_id) for tx_id in recent]
+            TimelineEntry.objects.bulk_create(entries, batch_size=INSERT_BATCH_SIZE)
+            written += len(entries)
+    return written
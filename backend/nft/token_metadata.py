@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import urlsplit
+import requests
+from django.conf import settings
+from .instrumentation import add_timing
+from .metrics import observe_ipfs_fetch, record_cache
+
+logger = logging.getLogger(__name__)
+
+# Public gateways raced against each other for every uncached CID; the first
+# valid JSON wins and the slower requests are abandoned
+GATEWAYS = [gateway.rstrip('/') for gateway in getattr(settings, 'IPFS_GATEWAYS', [
+    'https://ipfs.io',
+    'https://cloudflare-ipfs.com',
+    'https://gateway.pinata.cloud',
+])]
+# CIDs resolved at the same time (each with one request per gateway)
+FETCH_CONCURRENCY = getattr(settings, 'IPFS_FETCH_CONCURRENCY', 8)
+FETCH_TIMEOUT = getattr(settings, 'IPFS_FETCH_TIMEOUT', 10)
+# Seconds a CID no gateway could serve is left alone before it is raced again,
+# and how many such CIDs are remembered (oldest forgotten first)
+FAILURE_TTL = getattr(settings, 'IPFS_FAILURE_TTL', 300)
+MAX_FAILURES = 10_000
+CACHE_DIR = Path(getattr(settings, 'TOKEN_METADATA_CACHE_DIR', settings.BASE_DIR / 'cache' / 'token_metadata'))
+
+# Token JSON is small; anything bigger is not metadata
+MAX_METADATA_SIZE = 1024 * 1024
+CHUNK_SIZE = 16 * 1024
+
+# CIDv0 (base58 Qm...) or CIDv1 (base32 b...)
+CID_RE = re.compile(r'^(Qm[1-9A-HJ-NP-Za-km-z]{44}|b[a-z2-7]{58,})$')
+
+
+def ipfs_path(uri):
+    """
+    'CID[/path]' for an IPFS token URI (ipfs://CID/..., ipfs://ipfs/CID/...,
+    https://<any gateway>/ipfs/CID/... or a bare CID), else None. Only these
+    are immutable, so only these are cached.
+    """
+    uri = (uri or '').strip()
+    if uri.startswith('ipfs://'):
+        path = uri[len('ipfs://'):]
+        if path.startswith('ipfs/'):
+            path = path[len('ipfs/'):]
+    elif uri.startswith(('http://', 'https://')):
+        _, _, path = urlsplit(uri).path.partition('/ipfs/')
+    else:
+        path = uri
+    path = path.strip('/')
+    cid = path.split('/', 1)[0]
+    return path if CID_RE.match(cid) else None
+
+
+def cache_path(path):
+    key = hashlib.sha256(path.encode()).hexdigest()
+    return CACHE_DIR / key[:2] / f'{key}.json'
+
+
+def cached_metadata(uri):
+    """Metadata for uri from the local cache, or None; never touches the network"""
+    path = ipfs_path(uri)
+    if path is None:
+        return None
+    try:
+        with open(cache_path(path), 'rb') as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        record_cache('token_metadata', False)
+        return None
+    except ValueError:
+        logger.warning("Corrupt cached metadata for %s", path)
+        return None
+    record_cache('token_metadata', True)
+    return metadata
+
+
+def _store(path, metadata):
+    target = cache_path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(metadata, f, separators=(',', ':'))
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _fetch_from(gateway, path, cancelled):
+    """GET path from one gateway, giving up early once another gateway has won"""
+    start = time.perf_counter()
+    with requests.get(f'{gateway}/ipfs/{path}', timeout=FETCH_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        body = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if cancelled.is_set():
+                return None
+            body += chunk
+            if len(body) > MAX_METADATA_SIZE:
+                raise ValueError(f'metadata larger than {MAX_METADATA_SIZE} bytes')
+    metadata = json.loads(body)
+    if not isinstance(metadata, dict):
+        raise ValueError('metadata is not a JSON object')
+    observe_ipfs_fetch(gateway, time.perf_counter() - start)
+    return metadata
+
+
+_gateway_pool = None
+_background_pool = None
+_pool_lock = threading.Lock()
+# path -> Event set once the fetch in progress for it finishes
+_inflight = {}
+# paths waiting in the background pool
+_queued = set()
+# path -> time.monotonic() after which a failed fetch may be retried
+_failures = OrderedDict()
+
+
+def _record_failure(path):
+    with _pool_lock:
+        _failures[path] = time.monotonic() + FAILURE_TTL
+        _failures.move_to_end(path)
+        while len(_failures) > MAX_FAILURES:
+            _failures.popitem(last=False)
+
+
+def recently_failed(path):
+    """Whether fetching path failed less than FAILURE_TTL seconds ago"""
+    with _pool_lock:
+        retry_at = _failures.get(path)
+        if retry_at is None:
+            return False
+        if retry_at > time.monotonic():
+            return True
+        del _failures[path]
+        return False
+
+
+def _get_gateway_pool():
+    global _gateway_pool
+    with _pool_lock:
+        if _gateway_pool is None:
+            _gateway_pool = ThreadPoolExecutor(
+                max_workers=FETCH_CONCURRENCY * max(len(GATEWAYS), 1), thread_name_prefix='ipfs-gateway')
+        return _gateway_pool
+
+
+def _race(path):
+    """Ask every gateway for path at once; the first valid response wins"""
+    cancelled = threading.Event()
+    pool = _get_gateway_pool()
+    pending = {pool.submit(_fetch_from, gateway, path, cancelled): gateway for gateway in GATEWAYS}
+    errors = []
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                gateway = pending.pop(future)
+                try:
+                    metadata = future.result()
+                except Exception as e:
+                    errors.append(f'{gateway}: {e}')
+                    continue
+                if metadata is not None:
+                    return metadata
+    finally:
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+    raise LookupError(f'No gateway returned metadata for {path}: ' + '; '.join(errors))
+
+
+def fetch_metadata(uri, retry_failed=False):
+    """
+    Metadata for an IPFS token URI: from the cache if present, else raced
+    across GATEWAYS and cached for good (a CID's content never changes).
+    Concurrent calls for the same CID share one fetch. Returns None for
+    non-IPFS URIs and when every gateway fails; a CID that failed is not
+    raced again for FAILURE_TTL seconds unless retry_failed.
+    """
+    path = ipfs_path(uri)
+    if path is None:
+        return None
+    metadata = cached_metadata(uri)
+    if metadata is not None:
+        return metadata
+    if not retry_failed and recently_failed(path):
+        return None
+
+    with _pool_lock:
+        event = _inflight.get(path)
+        leader = event is None
+        if leader:
+            event = _inflight[path] = threading.Event()
+    if not leader:
+        event.wait()
+        return cached_metadata(uri)
+
+    start = time.perf_counter()
+    try:
+        metadata = _race(path)
+        _store(path, metadata)
+        return metadata
+    except Exception as e:
+        logger.warning("Failed to fetch token metadata %s: %s", path, e)
+        _record_failure(path)
+        return None
+    finally:
+        add_timing('ipfs', time.perf_counter() - start)
+        with _pool_lock:
+            del _inflight[path]
+        event.set()
+
+
+def prefetch_metadata(uris, concurrency=None):
+    """
+    Resolve many token URIs into the cache, at most `concurrency` CIDs at a
+    time. Already cached and non-IPFS URIs cost nothing; CIDs that failed
+    recently are tried again. Returns (fetched, failed) counts.
+    """
+    paths = {}
+    for uri in uris:
+        path = ipfs_path(uri)
+        if path is not None and path not in paths and not cache_path(path).exists():
+            paths[path] = uri
+    if not paths:
+        return 0, 0
+    fetched = failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency or FETCH_CONCURRENCY, thread_name_prefix='ipfs-prefetch') as pool:
+        for metadata in pool.map(lambda uri: fetch_metadata(uri, retry_failed=True), paths.values()):
+            if metadata is None:
+                failed += 1
+            else:
+                fetched += 1
+    return fetched, failed
+
+
+def request_metadata(uri, callback=None):
+    """
+    Queue uri to be fetched into the cache in the background if it is not
+    there yet (nor failed within FAILURE_TTL). With a callback, it is
+    called with the metadata (None if it could not be fetched) once
+    available, cached or not.
+    """
+    global _background_pool
+    path = ipfs_path(uri)
+    if path is None:
+        if callback is not None:
+            callback(None)
+        return
+    if callback is None and (cache_path(path).exists() or recently_failed(path)):
+        return
+    with _pool_lock:
+        if callback is None:
+            if path in _queued or path in _inflight:
+                return
+            _queued.add(path)
+        if _background_pool is None:
+            _background_pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix='ipfs-background')
+    _background_pool.submit(_background_fetch, path, uri, callback)
+
+
+def _background_fetch(path, uri, callback):
+    with _pool_lock:
+        _queued.discard(path)
+    metadata = fetch_metadata(uri)
+    if callback is not None:
+        try:
+            callback(metadata)
+        except Exception:
+            logger.exception("Token metadata callback failed for %s", path)
+
+
+def local_metadata(uri):
+    """
+    Cached metadata for uri, for request handlers: never waits on a gateway;
+    a miss is fetched in the background for the next request
+    """
+    metadata = cached_metadata(uri)
+    if metadata is None:
+        request_metadata(uri)
+    return metadata
+
+
+def metadata_attributes(metadata):
+    """[{'trait_type', 'value'}] from ERC-721 metadata `attributes` (or legacy `properties` dict)"""
+    if not metadata:
+        return []
+    attributes = metadata.get('attributes')
+    if isinstance(attributes, list):
+        return [
+            {'trait_type': str(attr.get('trait_type', '')), 'value': attr.get('value')}
+            for attr in attributes if isinstance(attr, dict) and 'value' in attr
+        ]
+    properties = metadata.get('properties')
+    if isinstance(properties, dict):
+        return [{'trait_type': str(key), 'value': value} for key, value in properties.items()
+                if isinstance(value, (str, int, float, bool))]
+    return []
@@ -0,0 +1,107 @@
+import hashlib
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+PROFILE_IMAGE_FIELDS = ('profile_image', 'cover_image')
+
+# Leading bytes of the accepted image formats and the extension each is stored under
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+def sniff_image(head):
+    """Extension for the image format `head` (a file's first bytes) starts, or None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+class ProfileImageUploadHandler(FileUploadHandler):
+    """
+    Stream the image parts of a multipart profile update straight to
+    temporary files, one chunk at a time, hashing as they arrive.
+
+    Memory stays at one chunk per upload whatever the file size. Parts over
+    PROFILE_IMAGE_MAX_SIZE, non-image parts and unexpected file fields are
+    dropped as soon as that is known (the rest of the part is read and
+    discarded) and listed in `rejected` for the view to report. So are
+    parts whose first bytes are not a PNG, JPEG, GIF or WebP image,
+    whatever content type the client sent. Completed files carry their
+    SHA-256 as `.sha256` and the sniffed format's extension as `.image_ext`.
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.PROFILE_IMAGE_MAX_SIZE
+        self.rejected = {}
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self._discard()
+        if field_name not in PROFILE_IMAGE_FIELDS:
+            self.rejected[field_name] = 'unexpected file field'
+            raise SkipFile()
+        if not content_type.startswith('image/'):
+            self.rejected[field_name] = 'not an image'
+            raise SkipFile()
+        if content_length is not None and content_length > self.max_size:
+            self.rejected[field_name] = f'larger than {self.max_size} bytes'
+            raise SkipFile()
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+        self.image_ext = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self._reject(f'larger than {self.max_size} bytes')
+        if start == 0:
+            # The first chunk is a whole chunk_size unless the file is shorter
+            self.image_ext = sniff_image(raw_data)
+            if self.image_ext is None:
+                self._reject('not a supported image')
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        # Hand the file over to request.FILES; the next part gets a new one
+        file = self.__dict__.pop('file', None)
+        if file is None:
+            return None
+        if self.image_ext is None:
+            # Empty part: no chunk came in to sniff
+            self.rejected[self.field_name] = 'not a supported image'
+            file.close()
+            return None
+        file.seek(0)
+        file.size = file_size
+        file.sha256 = self.sha256.hexdigest()
+        file.image_ext = self.image_ext
+        return file
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def _reject(self, reason):
+        self.rejected[self.field_name] = reason
+        self._discard()
+        raise SkipFile()
+
+    def _discard(self):
+        # The parser closes `handler.file` on errors if the attribute exists,
+        # so a skipped part must not leave one behind
+        file = self.__dict__.pop('file', None)
+        if file is not None:
+            # Closing a TemporaryUploadedFile deletes it
+            file.close()
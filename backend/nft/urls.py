@@ -1,6 +1,9 @@
-from django.urls import path
-from . import views, profile_views
-from .views import set_nft_listed, follow_user, unfollow_user, get_followers, get_following
+from django.urls import path, register_converter
+from . import views
+from .views import set_nft_listed, follow_user, unfollow_user, get_followers, get_following, check_following
+from .fields import AddressConverter
+
+register_converter(AddressConverter, 'address')
 
 app_name = 'nft'
 
@@ -11,8 +14,10 @@ urlpatterns = [
     path('nfts/combined/<str:combined_id>/', views.get_nft_by_combined_id, name='get_nft_by_combined_id'),
     path('nfts/search/', views.search_nfts, name='search_nfts'),
     path('nfts/register/', views.register_nft, name='register_nft'),
+    path('nfts/register/batch/', views.register_nfts_batch, name='register_nfts_batch'),
     path('nfts/<int:token_id>/transfer/', views.update_nft_owner, name='update_nft_owner'),
     path('nfts/<str:nft_id>/toggle-like/', views.toggle_nft_like, name='toggle_nft_like'),
+    path('nfts/stats/', views.get_nft_stats_batch, name='get_nft_stats_batch'),
     path('nfts/<str:nft_id>/stats/', views.get_nft_stats, name='get_nft_stats'),
     path('nfts/<str:nft_id>/track-view/', views.track_nft_view, name='track_nft_view'),
     path('nfts/combined/', views.get_combined_nfts, name='get_combined_nfts'),
@@ -27,15 +32,17 @@ urlpatterns = [
     path('collections/by-likes/', views.get_collections_by_likes, name='get_collections_by_likes'),
     
     # User endpoints
-    path('profiles/<str:wallet_address>/', views.get_user_profile, name='get_user_profile'),
-    path('profiles/<str:wallet_address>/update/', views.update_profile, name='update_profile'),
-    path('profiles/<str:wallet_address>/nfts/', views.get_user_nfts, name='get_user_nfts'),
-    path('profiles/<str:wallet_address>/created/', views.get_user_created_nfts, name='get_user_created_nfts'),
-    path('profiles/<str:wallet_address>/liked/', views.get_user_liked_nfts, name='get_user_liked_nfts'),
-    path('profiles/<str:wallet_address>/follow/', follow_user, name='follow_user'),
-    path('profiles/<str:wallet_address>/unfollow/', unfollow_user, name='unfollow_user'),
-    path('profiles/<str:wallet_address>/followers/', get_followers, name='get_followers'),
-    path('profiles/<str:wallet_address>/following/', get_following, name='get_following'),
+    path('profiles/<address:wallet_address>/', views.get_user_profile, name='get_user_profile'),
+    path('profiles/<address:wallet_address>/update/', views.update_profile, name='update_profile'),
+    path('profiles/<address:wallet_address>/nfts/', views.get_user_nfts, name='get_user_nfts'),
+    path('profiles/<address:wallet_address>/created/', views.get_user_created_nfts, name='get_user_created_nfts'),
+    path('profiles/<address:wallet_address>/liked/', views.get_user_liked_nfts, name='get_user_liked_nfts'),
+    path('profiles/<address:wallet_address>/follow/', follow_user, name='follow_user'),
+    path('profiles/<address:wallet_address>/unfollow/', unfollow_user, name='unfollow_user'),
+    path('profiles/<address:wallet_address>/followers/', get_followers, name='get_followers'),
+    path('profiles/<address:wallet_address>/following/', get_following, name='get_following'),
+    path('profiles/<address:wallet_address>/following/check/', check_following, name='check_following'),
+    path('profiles/<address:wallet_address>/timeline/', views.get_home_timeline, name='get_home_timeline'),
     
     # Contract endpoints
     path('contract/info/', views.get_contract_info, name='get_contract_info'),
@@ -46,6 +53,10 @@ urlpatterns = [
     # Activity endpoints
     path('activities/', views.get_activities, name='get_activities'),
     path('activities/stats/', views.get_activity_stats, name='get_activity_stats'),
+    path('activities/stream/', views.stream_activities, name='stream_activities'),
+
+    # Performance endpoints
+    path('perf/', views.get_perf_stats, name='get_perf_stats'),
 
 
 ]
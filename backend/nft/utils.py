@@ -8,10 +8,11 @@ def validate_file_size(file_data):
     """
     # Get the size from the base64 string (approximately)
     # Remove the header (data:image/png;base64,) and calculate size
-    if ';base64,' in file_data:
-        base64_str = file_data.split(';base64,')[1]
+    header_end = file_data.find(';base64,')
+    if header_end != -1:
         # Calculate approximate file size (base64 string length * 3/4)
-        file_size = len(base64_str) * 3 / 4
+        # from offsets rather than a split copy of the payload
+        file_size = (len(file_data) - header_end - len(';base64,')) * 3 / 4
         
         if file_size > settings.MAX_UPLOAD_SIZE:
             raise ValidationError(f'File size cannot exceed {settings.MAX_UPLOAD_SIZE/(1024*1024)}MB')
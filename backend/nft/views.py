@@ -1,132 +1,50 @@
 from django.shortcuts import render
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, Min
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, Min
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import json
+import logging
 import time
 from datetime import datetime, timedelta
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import base64
 from .utils import validate_file_size
-from .file_handlers import handle_profile_image, handle_cover_image
+from .file_handlers import handle_profile_image, handle_cover_image, handle_uploaded_image
+from .uploads import ProfileImageUploadHandler
 from .models import NFT, Collection, UserProfile, Transaction, Favorite
 from .web3_utils import web3_instance
 from .ipfs_utils import upload_to_ipfs
 from .auth_utils import get_or_create_web3_user
+from .fields import normalize_address
+from .archive import all_time_page
+from .activity_stream import activity_payloads, parse_filters, sse_events, sse_events_sync
+from .profile_stats import record_registration, record_transfer, record_burn
+from .follows import (follow, unfollow, follow_counts, followers_page, following_page, following_among,
+                      parse_page_params, MAX_FOLLOW_CHECK)
+from .timeline import timeline_page, TIMELINE_PAGE_SIZE, MAX_TIMELINE_PAGE_SIZE
+from .token_metadata import local_metadata
+from .rarity import index_in_background, schedule_rank, unindex_nft, collection_key
+from .nft_stats import nft_stats, resolve_nfts, MAX_STATS_BATCH
+from .registration import RegistrationConflict, register_nfts, validate_registrations, MAX_REGISTER_BATCH
+from .instrumentation import JsonResponse, endpoint_stats
+from .metrics import render as render_metrics
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
 # User Profile Views
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_user_profile(request, wallet_address):
     """Get user profile by wallet address"""
     try:
-        from django.contrib.auth.models import User
-        import hashlib
-        
-        print(f"[DEBUG] get_user_profile called with wallet_address: {wallet_address}")
-        
-        # Create a safe username using hash of wallet address
-        username_hash = hashlib.md5(wallet_address.encode()).hexdigest()[:12]
-        username = f"user_{username_hash}"
-        
-        try:
-            # Try to get existing user first
-            user = User.objects.get(username=username)
-            user_created = False
-        except User.DoesNotExist:
-            # Create new user if doesn't exist
-            try:
-                user = User.objects.create_user(
-                    username=username,
-                    email=f"{username}@example.com",
-                    password='unusable'  # These users won't login traditionally
-                )
-                user_created = True
-                print(f"[DEBUG] User created: {user_created}")
-            except Exception as user_error:
-                print(f"[ERROR] Failed to create user: {str(user_error)}")
-                # If user creation fails, try to get or create profile without user
-                try:
-                    profile = UserProfile.objects.get(wallet_address=wallet_address)
-                except UserProfile.DoesNotExist:
-                    profile = UserProfile.objects.create(
-                        wallet_address=wallet_address,
-                        username=f"User{wallet_address[-4:]}"
-                    )
-                
-                # Get user's NFTs
-                user_nfts = NFT.objects.filter(owner_address=wallet_address)
-                created_nfts = NFT.objects.filter(creator_address=wallet_address)
-                
-                profile_data = {
-                    'id': profile.id,
-                    'wallet_address': profile.wallet_address,
-                    'username': profile.username or f"User{wallet_address[-4:]}",
-                    'avatar_url': profile.avatar_url,
-                    'banner_url': profile.banner_url,
-                    'bio': profile.bio,
-                    'website': profile.website,
-                    'twitter': profile.twitter,
-                    'instagram': profile.instagram,
-                    'discord': profile.discord,
-                    'total_created': profile.total_created or 0,
-                    'total_collected': profile.total_collected or 0,
-                    'total_volume': float(profile.total_volume) if profile.total_volume else 0,
-                    'created_at': profile.created_at.isoformat(),
-                    'nfts_owned': user_nfts.count(),
-                    'nfts_created': created_nfts.count(),
-                }
-                
-                return JsonResponse({
-                    'success': True,
-                    'data': profile_data
-                })
-        
-        # Get or create profile
-        try:
-            profile, created = UserProfile.objects.get_or_create(
-                wallet_address=wallet_address,
-                defaults={
-                    'user': user,
-                    'username': f"User{wallet_address[-4:]}"
-                }
-            )
-            print(f"[DEBUG] Profile created: {profile.id} {created}")
-        except Exception as profile_error:
-            print(f"[ERROR] Profile creation failed: {str(profile_error)}")
-            # Return a basic profile response
-            return JsonResponse({
-                'success': True,
-                'data': {
-                    'id': 0,
-                    'wallet_address': wallet_address,
-                    'username': f"User{wallet_address[-4:]}",
-                    'avatar_url': None,
-                    'banner_url': None,
-                    'bio': None,
-                    'website': None,
-                    'twitter': None,
-                    'instagram': None,
-                    'discord': None,
-                    'total_created': 0,
-                    'total_collected': 0,
-                    'total_volume': 0,
-                    'created_at': timezone.now().isoformat(),
-                    'nfts_owned': 0,
-                    'nfts_created': 0,
-                }
-            })
-        
-        # Get user's NFTs
-        user_nfts = NFT.objects.filter(owner_address=wallet_address)
-        created_nfts = NFT.objects.filter(creator_address=wallet_address)
-        print(f"[DEBUG] NFTs found: {user_nfts.count()} {created_nfts.count()}")
+        logger.debug("get_user_profile called with wallet_address: %s", wallet_address)
+        profile = get_or_create_web3_user(wallet_address)
         
         profile_data = {
             'id': profile.id,
@@ -134,6 +52,8 @@ def get_user_profile(request, wallet_address):
             'username': profile.username or f"User{wallet_address[-4:]}",
             'avatar_url': profile.avatar_url,
             'banner_url': profile.banner_url,
+            'avatar_variants': profile.avatar_variants,
+            'banner_variants': profile.banner_variants,
             'bio': profile.bio,
             'website': profile.website,
             'twitter': profile.twitter,
@@ -143,17 +63,19 @@ def get_user_profile(request, wallet_address):
             'total_collected': profile.total_collected or 0,
             'total_volume': float(profile.total_volume) if profile.total_volume else 0,
             'created_at': profile.created_at.isoformat(),
-            'nfts_owned': user_nfts.count(),
-            'nfts_created': created_nfts.count(),
+            'nfts_owned': profile.nfts_owned,
+            'nfts_created': profile.nfts_created,
+            'followers_count': profile.followers_count,
+            'following_count': profile.following_count,
         }
-        print(f"[DEBUG] Profile data: {profile_data}")
+        logger.debug("Profile data: %s", profile_data)
         
         return JsonResponse({
             'success': True,
             'data': profile_data
         })
     except Exception as e:
-        print(f"[ERROR] get_user_profile failed: {str(e)}")
+        logger.exception("get_user_profile failed: %s", e)
         # Return a fallback response instead of 500 error
         return JsonResponse({
             'success': True,
@@ -163,6 +85,8 @@ def get_user_profile(request, wallet_address):
                 'username': f"User{wallet_address[-4:]}",
                 'avatar_url': None,
                 'banner_url': None,
+                'avatar_variants': {},
+                'banner_variants': {},
                 'bio': None,
                 'website': None,
                 'twitter': None,
@@ -174,42 +98,57 @@ def get_user_profile(request, wallet_address):
                 'created_at': timezone.now().isoformat(),
                 'nfts_owned': 0,
                 'nfts_created': 0,
+                'followers_count': 0,
+                'following_count': 0,
             }
         })
 
 @csrf_exempt
 @require_http_methods(["POST"])
 def update_profile(request, wallet_address):
-    """Update user profile including profile and cover images"""
+    """
+    Update user profile including profile and cover images.
+
+    Send multipart/form-data with profile_image / cover_image file parts
+    (streamed to disk, max PROFILE_IMAGE_MAX_SIZE each) and the text fields
+    as form fields, or JSON with the images as base64 data: URLs.
+    """
     try:
-        data = json.loads(request.body)
-        # Get or create user profile
-        profile, created = UserProfile.objects.get_or_create(wallet_address=wallet_address)
-        # Handle profile image
-        if 'profile_image' in data:
-            image_data = data['profile_image']
-            if image_data.startswith('data:image'):
-                format, imgstr = image_data.split(';base64,')
-                ext = format.split('/')[-1]
-                filename = f'profile_{wallet_address}.{ext}'
-                file_data = ContentFile(base64.b64decode(imgstr))
-                file_path = default_storage.save(f'profile_images/{filename}', file_data)
-                profile.avatar_url = request.build_absolute_uri(default_storage.url(file_path))
-        # Handle cover image
-        if 'cover_image' in data:
-            image_data = data['cover_image']
-            if image_data.startswith('data:image'):
-                format, imgstr = image_data.split(';base64,')
-                ext = format.split('/')[-1]
-                filename = f'cover_{wallet_address}.{ext}'
-                file_data = ContentFile(base64.b64decode(imgstr))
-                file_path = default_storage.save(f'cover_images/{filename}', file_data)
-                profile.banner_url = request.build_absolute_uri(default_storage.url(file_path))
-        # Update other profile fields
-        for field in ['username', 'bio', 'website', 'twitter', 'instagram', 'discord']:
-            if field in data:
-                setattr(profile, field, data[field])
-        profile.save()
+        files = {}
+        if request.content_type == 'multipart/form-data':
+            # Must be set before request.POST/FILES are first read
+            upload_handler = ProfileImageUploadHandler(request)
+            request.upload_handlers = [upload_handler]
+            data = request.POST
+            files = request.FILES
+            if upload_handler.rejected:
+                field, reason = next(iter(upload_handler.rejected.items()))
+                status = 413 if reason.startswith('larger') else 400
+                return JsonResponse({'success': False, 'error': f'{field}: {reason}'}, status=status)
+        else:
+            data = json.loads(request.body)
+        with transaction.atomic():
+            # Get or create user profile
+            profile, created = UserProfile.objects.get_or_create(wallet_address=wallet_address)
+            # Handle profile image (thumbnails are rendered in the background once this commits)
+            if 'profile_image' in files:
+                profile.avatar_url = handle_uploaded_image(profile, files['profile_image'], 'avatar', request)
+            elif 'profile_image' in data:
+                avatar_url = handle_profile_image(profile, data['profile_image'], wallet_address, request)
+                if avatar_url:
+                    profile.avatar_url = avatar_url
+            # Handle cover image
+            if 'cover_image' in files:
+                profile.banner_url = handle_uploaded_image(profile, files['cover_image'], 'banner', request)
+            elif 'cover_image' in data:
+                banner_url = handle_cover_image(profile, data['cover_image'], wallet_address, request)
+                if banner_url:
+                    profile.banner_url = banner_url
+            # Update other profile fields
+            for field in ['username', 'bio', 'website', 'twitter', 'instagram', 'discord']:
+                if field in data:
+                    setattr(profile, field, data[field])
+            profile.save()
         return JsonResponse({
             'success': True,
             'data': {
@@ -218,6 +157,8 @@ def update_profile(request, wallet_address):
                 'username': profile.username,
                 'avatar_url': profile.avatar_url,
                 'banner_url': profile.banner_url,
+                'avatar_variants': profile.avatar_variants,
+                'banner_variants': profile.banner_variants,
                 'bio': profile.bio,
                 'website': profile.website,
                 'twitter': profile.twitter,
@@ -259,9 +200,17 @@ def get_nfts(request):
             nfts = nfts.filter(price__lte=price_max)
         
         # Sorting
-        if sort_order == 'desc':
-            sort_by = f'-{sort_by}'
-        nfts = nfts.order_by(sort_by)
+        if sort_by == 'rarity':
+            # Ranks are per collection, so they only order NFTs of one collection;
+            # rarest first by default, served by the (collection, rarity_rank) index
+            if not collection:
+                return JsonResponse({'success': False, 'error': 'sort_by=rarity requires a collection'}, status=400)
+            rank = F('rarity_rank')
+            nfts = nfts.order_by(rank.asc(nulls_last=True) if sort_order == 'desc' else rank.desc(nulls_last=True), 'id')
+        else:
+            if sort_order == 'desc':
+                sort_by = f'-{sort_by}'
+            nfts = nfts.order_by(sort_by)
         
         # Pagination
         paginator = Paginator(nfts, limit)
@@ -286,6 +235,7 @@ def get_nfts(request):
                 'creator_address': nft.creator_address,
                 'collection': nft.collection,
                 'category': nft.category,
+                'rarity_rank': nft.rarity_rank,
                 'created_at': nft.created_at.isoformat(),
             })
         
@@ -336,6 +286,7 @@ def get_nft_detail(request, token_id):
             'category': nft.category,
             'created_at': nft.created_at.isoformat(),
             'blockchain_data': blockchain_data,
+            'metadata': local_metadata(nft.token_uri),
         }
         
         return JsonResponse({
@@ -433,12 +384,10 @@ def get_user_nfts(request, wallet_address):
 def get_user_created_nfts(request, wallet_address):
     """Get NFTs created by a user"""
     try:
-        print(f"[DEBUG] get_user_created_nfts called with wallet_address: {wallet_address}")
+        logger.debug("get_user_created_nfts called with wallet_address: %s", wallet_address)
         nfts = NFT.objects.filter(creator_address=wallet_address)
-        print(f"[DEBUG] Number of NFTs found: {nfts.count()}")
         nfts_data = []
         for nft in nfts:
-            print(f"[DEBUG] NFT: id={nft.id}, token_id={nft.token_id}, name={nft.name}, creator_address={nft.creator_address}")
             nfts_data.append({
                 'id': nft.id,
                 'token_id': nft.token_id,
@@ -459,7 +408,7 @@ def get_user_created_nfts(request, wallet_address):
             'data': nfts_data
         })
     except Exception as e:
-        print(f"[ERROR] get_user_created_nfts: {str(e)}")
+        logger.exception("get_user_created_nfts: %s", e)
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -487,21 +436,17 @@ def get_contract_info(request):
 def upload_ipfs(request):
     """Upload a file to IPFS"""
     try:
-        print("[API] Starting IPFS upload request")
-        print(f"[API] Content type: {request.content_type}")
-        print(f"[API] Available files: {list(request.FILES.keys())}")
+        logger.debug("Starting IPFS upload request, content type: %s", request.content_type)
         
         if 'file' not in request.FILES:
-            print("[API] No file found in request")
+            logger.info("IPFS upload request without a file")
             return JsonResponse({
                 'success': False,
                 'error': 'No file provided'
             }, status=400)
             
         file = request.FILES['file']
-        print(f"[API] File name: {file.name}")
-        print(f"[API] File size: {file.size} bytes")
-        print(f"[API] File content type: {file.content_type}")
+        logger.debug("IPFS upload file: name=%s size=%s content_type=%s", file.name, file.size, file.content_type)
         
         ipfs_hash = upload_to_ipfs(file.read())
         
@@ -671,27 +616,67 @@ def register_nft(request):
     """Register a newly minted NFT in the backend database"""
     try:
         data = json.loads(request.body)
-        print("[DEBUG] register_nft payload:", data)
-        nft, created = NFT.objects.get_or_create(
-            token_id=data['token_id'],
-            defaults={
-                'name': data['name'],
-                'description': data['description'],
-                'image_url': data['image_url'],
-                'token_uri': data.get('token_uri', ''),
-                'creator_address': data['creator_address'],
-                'owner_address': data['owner_address'],
-                'price': data.get('price'),
-                'is_listed': data.get('is_listed', False),
-                'is_auction': data.get('is_auction', False),
-                'collection': data.get('collection'),
-                'category': data.get('category'),
-            }
-        )
-        print("[DEBUG] NFT created:", created, "NFT:", nft)
+        logger.debug("register_nft payload: %s", data)
+        with transaction.atomic():
+            nft, created = NFT.objects.get_or_create(
+                token_id=data['token_id'],
+                defaults={
+                    'name': data['name'],
+                    'description': data['description'],
+                    'image_url': data['image_url'],
+                    'token_uri': data.get('token_uri', ''),
+                    'creator_address': data['creator_address'],
+                    'owner_address': data['owner_address'],
+                    'price': data.get('price'),
+                    'is_listed': data.get('is_listed', False),
+                    'is_auction': data.get('is_auction', False),
+                    'auction_end_time': parse_datetime(data['auction_end_time']) if data.get('auction_end_time') else None,
+                    'collection': data.get('collection'),
+                    'category': data.get('category'),
+                }
+            )
+            if created:
+                record_registration(nft)
+                transaction.on_commit(lambda: index_in_background(nft))
+        logger.debug("NFT created: %s NFT: %s", created, nft)
         return JsonResponse({'success': True, 'created': created, 'nft_id': nft.id})
     except Exception as e:
-        print("[ERROR] register_nft:", str(e))
+        logger.exception("register_nft: %s", e)
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def register_nfts_batch(request):
+    """
+    Register many NFTs (e.g. a collection drop) in one request and one
+    transaction. POST {"nfts": [<register_nft body>, ...]}, at most
+    MAX_REGISTER_BATCH items. Every item is validated first; if any is
+    invalid nothing is written and the errors are returned. Existing token
+    ids are upserted (metadata fields only) and reported as created: false,
+    unless another creator registered them, which is an error too.
+    """
+    try:
+        items = json.loads(request.body).get('nfts')
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'success': False, 'error': 'nfts must be a non-empty list'}, status=400)
+        if len(items) > MAX_REGISTER_BATCH:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_REGISTER_BATCH} NFTs per request'}, status=400)
+        rows, errors = validate_registrations(items)
+        if errors:
+            return JsonResponse({'success': False, 'error': 'Invalid NFTs', 'errors': errors}, status=400)
+        try:
+            results = register_nfts(rows)
+        except RegistrationConflict as e:
+            return JsonResponse({'success': False, 'error': 'Invalid NFTs', 'errors': e.errors}, status=400)
+        created = sum(1 for result in results if result['created'])
+        return JsonResponse({
+            'success': True,
+            'created': created,
+            'existing': len(results) - created,
+            'results': results,
+        })
+    except Exception as e:
+        logger.exception("register_nfts_batch: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -707,7 +692,7 @@ def update_nft_owner(request, token_id):
     try:
         from .models import NFT, Transaction
         data = json.loads(request.body) if request.body else {}
-        forced_new_owner = data.get('new_owner')
+        forced_new_owner = normalize_address(data.get('new_owner'))
 
         nft = NFT.objects.get(token_id=token_id)
         old_owner = nft.owner_address
@@ -716,37 +701,39 @@ def update_nft_owner(request, token_id):
             new_owner = forced_new_owner
         else:
             from .web3_utils import web3_instance
-            new_owner = web3_instance.get_nft_owner(token_id)
+            new_owner = normalize_address(web3_instance.get_nft_owner(token_id))
             if not new_owner:
                 return JsonResponse({'success': False, 'error': 'Could not fetch owner from blockchain'}, status=400)
 
         # Only proceed if the owner actually changes
         if old_owner != new_owner:
-            nft.owner_address = new_owner
-            # If this was a simulated transfer, also mark NFT as not listed
-            if forced_new_owner:
-                nft.is_listed = False
-            nft.save()
+            with transaction.atomic():
+                nft.owner_address = new_owner
+                # If this was a simulated transfer, also mark NFT as not listed
+                if forced_new_owner:
+                    nft.is_listed = False
+                nft.save()
 
-            tx_hash = data.get('transaction_hash', '') or (f"simulated_{token_id}_{int(time.time())}" if forced_new_owner else '')
-            price = data.get('price', None)
-            block_number = data.get('block_number', 0)
-            gas_used = data.get('gas_used', 0)
-            gas_price = data.get('gas_price', 0)
+                tx_hash = data.get('transaction_hash', '') or (f"simulated_{token_id}_{int(time.time())}" if forced_new_owner else '')
+                price = data.get('price', None)
+                block_number = data.get('block_number', 0)
+                gas_used = data.get('gas_used', 0)
+                gas_price = data.get('gas_price', 0)
 
-            # Create Transaction record
-            Transaction.objects.create(
-                transaction_hash=tx_hash,
-                nft=nft,
-                from_address=old_owner,
-                to_address=new_owner,
-                transaction_type='buy',
-                price=price,
-                block_number=block_number,
-                gas_used=gas_used,
-                gas_price=gas_price,
-                timestamp=timezone.now()
-            )
+                # Create Transaction record
+                Transaction.objects.create(
+                    transaction_hash=tx_hash,
+                    nft=nft,
+                    from_address=old_owner,
+                    to_address=new_owner,
+                    transaction_type='buy',
+                    price=price,
+                    block_number=block_number,
+                    gas_used=gas_used,
+                    gas_price=gas_price,
+                    timestamp=timezone.now()
+                )
+                record_transfer(nft, old_owner, price=price, sale=True)
         return JsonResponse({'success': True, 'owner_address': new_owner})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -757,7 +744,7 @@ def toggle_nft_like(request, nft_id):
     """Toggle like/unlike for an NFT and return current like status and count"""
     try:
         data = json.loads(request.body)
-        user_address = data.get('user_address')
+        user_address = normalize_address(data.get('user_address'))
         if not user_address:
             return JsonResponse({'success': False, 'error': 'User address required'}, status=400)
         # Handle combined ID format (local_1, local_2, etc.)
@@ -799,8 +786,7 @@ def set_nft_listed(request, token_id):
     try:
         nft = NFT.objects.get(token_id=token_id)
         # Check on-chain listing status
-        contract = web3_instance.get_nftmarketplace_contract()
-        is_listed = contract.functions.isListed(token_id).call()
+        is_listed = web3_instance.get_listing(token_id)['isActive']
         if is_listed:
             nft.is_listed = True
             nft.save()
@@ -815,11 +801,9 @@ def set_nft_listed(request, token_id):
 def get_combined_nfts(request):
     """Get NFTs from local database only"""
     try:
-        print("[DEBUG] get_combined_nfts called")
-        
         # Get user address from query params for like status
-        user_address = request.GET.get('user_address')
-        print(f"[DEBUG] User address for like status: {user_address}")
+        user_address = normalize_address(request.GET.get('user_address'))
+        logger.debug("get_combined_nfts called, user address for like status: %s", user_address)
         
         # Get user's liked NFTs if address provided
         liked_nft_ids = set()
@@ -828,13 +812,12 @@ def get_combined_nfts(request):
                 # Get local NFT likes
                 favorites = Favorite.objects.filter(user_address=user_address)
                 liked_nft_ids = set(favorites.values_list('nft__id', flat=True))
-                print(f"[DEBUG] User liked {len(liked_nft_ids)} local NFTs")
+                logger.debug("User liked %d local NFTs", len(liked_nft_ids))
             except Exception as e:
-                print(f"[ERROR] Failed to get user likes: {str(e)}")
+                logger.error("Failed to get user likes: %s", e)
         
         # Get local NFTs
         local_nfts = NFT.objects.all()[:50]  # Increased limit since no OpenSea NFTs
-        print(f"[DEBUG] Found {local_nfts.count()} local NFTs")
         
         local_nfts_data = []
         for nft in local_nfts:
@@ -859,8 +842,6 @@ def get_combined_nfts(request):
                 'like_count': like_count
             })
         
-        print(f"[DEBUG] Processed {len(local_nfts_data)} local NFTs")
-        
         # Optional sorting
         sort_key = request.GET.get('sort')
         if sort_key == 'likes':
@@ -870,9 +851,7 @@ def get_combined_nfts(request):
             import random
             random.shuffle(local_nfts_data)
         
-        print(f"[DEBUG] Total NFTs: {len(local_nfts_data)}")
-        print(f"[DEBUG] Sample NFT IDs: {[nft['id'] for nft in local_nfts_data[:3]]}")
-        print(f"[DEBUG] First NFT full data: {local_nfts_data[0] if local_nfts_data else 'No NFTs'}")
+        logger.debug("get_combined_nfts returning %d NFTs", len(local_nfts_data))
 
         return JsonResponse({
             'success': True,
@@ -883,7 +862,7 @@ def get_combined_nfts(request):
             }
         })
     except Exception as e:
-        print(f"[ERROR] get_combined_nfts: {str(e)}")
+        logger.exception("get_combined_nfts: %s", e)
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -898,7 +877,7 @@ def get_activities(request):
         page = request.GET.get('page', 1)
         limit = request.GET.get('limit', 20)
         activity_type = request.GET.get('type')  # mint, list, buy, bid, transfer, delist
-        time_filter = request.GET.get('time_filter', '24h')  # 1h, 24h, 7d, 30d
+        time_filter = request.GET.get('time_filter', '24h')  # 1h, 24h, 7d, 30d, all (includes archive)
         search_query = request.GET.get('search', '')
         
         # Build query
@@ -932,100 +911,31 @@ def get_activities(request):
         activities = activities.order_by('-timestamp')
         
         # Pagination
-        paginator = Paginator(activities, limit)
-        activities_page = paginator.get_page(page)
-        
-        # Serialize data
-        activities_data = []
-        for activity in activities_page:
-            # Get user profiles for from and to addresses
-            try:
-                from_profile = UserProfile.objects.get(wallet_address=activity.from_address)
-                from_username = from_profile.username or f"User{activity.from_address[-4:]}"
-            except UserProfile.DoesNotExist:
-                from_username = f"User{activity.from_address[-4:]}"
-            
-            try:
-                to_profile = UserProfile.objects.get(wallet_address=activity.to_address)
-                to_username = to_profile.username or f"User{activity.to_address[-4:]}"
-            except UserProfile.DoesNotExist:
-                to_username = f"User{activity.to_address[-4:]}"
-            
-            # Calculate time ago
-            time_diff = timezone.now() - activity.timestamp
-            if time_diff.days > 0:
-                time_ago = f"{time_diff.days} days ago"
-            elif time_diff.seconds > 3600:
-                hours = time_diff.seconds // 3600
-                time_ago = f"{hours} hours ago"
-            else:
-                minutes = time_diff.seconds // 60
-                time_ago = f"{minutes} minutes ago"
-            
-            # Handle different activity types
-            if activity.transaction_type in ['follow', 'unfollow']:
-                # For follow/unfollow actions, no NFT involved
-                activities_data.append({
-                    'id': activity.id,
-                    'type': activity.transaction_type,
-                    'nft': None,
-                    'from': {
-                        'address': activity.from_address,
-                        'name': from_username,
-                        'avatar': f"https://images.unsplash.com/photo-147209{9645785 + activity.id}?w=32&h=32&fit=crop&crop=face"
-                    },
-                    'to': {
-                        'address': activity.to_address,
-                        'name': to_username,
-                        'avatar': f"https://images.unsplash.com/photo-147209{9645785 + activity.id + 100}?w=32&h=32&fit=crop&crop=face"
-                    },
-                    'price': None,
-                    'timestamp': activity.timestamp.isoformat(),
-                    'time_ago': time_ago,
-                    'transaction_hash': activity.transaction_hash,
-                    'block_number': activity.block_number,
-                })
-            else:
-                # For NFT-related activities
-                activities_data.append({
-                    'id': activity.id,
-                    'type': activity.transaction_type,
-                    'nft': {
-                        'id': activity.nft.id if activity.nft else None,
-                        'name': activity.nft.name if activity.nft else 'Unknown NFT',
-                        'image_url': activity.nft.image_url if activity.nft else '',
-                        'collection': activity.nft.collection if activity.nft else 'Unknown Collection',
-                        'token_id': activity.nft.token_id if activity.nft else None
-                    },
-                    'from': {
-                        'address': activity.from_address,
-                        'name': from_username,
-                        'avatar': f"https://images.unsplash.com/photo-147209{9645785 + activity.id}?w=32&h=32&fit=crop&crop=face"
-                    },
-                    'to': {
-                        'address': activity.to_address,
-                        'name': to_username,
-                        'avatar': f"https://images.unsplash.com/photo-147209{9645785 + activity.id + 100}?w=32&h=32&fit=crop&crop=face"
-                    },
-                    'price': float(activity.price) if activity.price else None,
-                    'timestamp': activity.timestamp.isoformat(),
-                    'time_ago': time_ago,
-                    'transaction_hash': activity.transaction_hash,
-                    'block_number': activity.block_number,
-                'gas_used': activity.gas_used,
-                'gas_price': float(activity.gas_price) if activity.gas_price else None
-            })
-        
-        return JsonResponse({
-            'success': True,
-            'data': activities_data,
-            'pagination': {
+        if time_filter == 'all':
+            # Hot table first, then archived transactions (nft.archive)
+            activities_page, pagination = all_time_page(
+                activities, page, limit,
+                transaction_type=activity_type if activity_type and activity_type != 'all' else None,
+                search=search_query,
+            )
+        else:
+            paginator = Paginator(activities, limit)
+            activities_page = paginator.get_page(page)
+            pagination = {
                 'page': activities_page.number,
                 'total_pages': paginator.num_pages,
                 'total_items': paginator.count,
                 'has_next': activities_page.has_next(),
                 'has_previous': activities_page.has_previous(),
             }
+        
+        # Serialize data (one profile query for the whole page)
+        activities_data = activity_payloads(list(activities_page))
+        
+        return JsonResponse({
+            'success': True,
+            'data': activities_data,
+            'pagination': pagination
         })
     except Exception as e:
         return JsonResponse({
@@ -1033,6 +943,24 @@ def get_activities(request):
             'error': str(e)
         }, status=500)
 
+@require_http_methods(["GET"])
+def stream_activities(request):
+    """
+    Push new activities as Server-Sent Events instead of polling get_activities.
+    Filters: ?type=buy,list&collection=<name>. Reconnecting clients send
+    Last-Event-ID (browsers do this automatically) to replay what they missed.
+    """
+    types, collection = parse_filters(request.GET)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if isinstance(request, ASGIRequest):
+        events = sse_events(types, collection, last_event_id)
+    else:
+        events = sse_events_sync(types, collection, last_event_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_activity_stats(request):
@@ -1087,7 +1015,7 @@ def get_activity_stats(request):
 def follow_user(request, wallet_address):
     try:
         data = json.loads(request.body)
-        follower_address = data.get('follower_address')
+        follower_address = normalize_address(data.get('follower_address'))
         if not follower_address:
             return JsonResponse({'success': False, 'error': 'Missing follower_address'}, status=400)
         
@@ -1101,13 +1029,10 @@ def follow_user(request, wallet_address):
             defaults={'username': f"User{follower_address[-4:]}"}
         )
         
-        # Check if already following
-        if user.followers.filter(wallet_address=follower_address).exists():
+        # Add follower (and both counts); False if already following
+        if not follow(user, follower):
             return JsonResponse({'success': False, 'error': 'Already following this user'}, status=400)
         
-        # Add follower
-        user.followers.add(follower)
-        
         # Create activity for the user being followed
         try:
             from .models import Transaction
@@ -1124,15 +1049,16 @@ def follow_user(request, wallet_address):
                 timestamp=timezone.now()
             )
         except Exception as activity_error:
-            print(f"[WARNING] Failed to create follow activity: {activity_error}")
+            logger.warning("Failed to create follow activity: %s", activity_error)
         
+        followers_count, following_count = follow_counts(user, follower)
         return JsonResponse({
             'success': True, 
-            'followers_count': user.followers.count(),
-            'following_count': follower.following.count()
+            'followers_count': followers_count,
+            'following_count': following_count
         })
     except Exception as e:
-        print(f"[ERROR] follow_user: {str(e)}")
+        logger.exception("follow_user: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -1140,7 +1066,7 @@ def follow_user(request, wallet_address):
 def unfollow_user(request, wallet_address):
     try:
         data = json.loads(request.body)
-        follower_address = data.get('follower_address')
+        follower_address = normalize_address(data.get('follower_address'))
         if not follower_address:
             return JsonResponse({'success': False, 'error': 'Missing follower_address'}, status=400)
         
@@ -1148,13 +1074,10 @@ def unfollow_user(request, wallet_address):
         user = UserProfile.objects.get(wallet_address=wallet_address)
         follower = UserProfile.objects.get(wallet_address=follower_address)
         
-        # Check if not following
-        if not user.followers.filter(wallet_address=follower_address).exists():
+        # Remove follower (and both counts); False if not following
+        if not unfollow(user, follower):
             return JsonResponse({'success': False, 'error': 'Not following this user'}, status=400)
         
-        # Remove follower
-        user.followers.remove(follower)
-        
         # Create activity for the user being unfollowed
         try:
             from .models import Transaction
@@ -1171,34 +1094,101 @@ def unfollow_user(request, wallet_address):
                 timestamp=timezone.now()
             )
         except Exception as activity_error:
-            print(f"[WARNING] Failed to create unfollow activity: {activity_error}")
+            logger.warning("Failed to create unfollow activity: %s", activity_error)
         
+        followers_count, following_count = follow_counts(user, follower)
         return JsonResponse({
             'success': True, 
-            'followers_count': user.followers.count(),
-            'following_count': follower.following.count()
+            'followers_count': followers_count,
+            'following_count': following_count
         })
     except Exception as e:
-        print(f"[ERROR] unfollow_user: {str(e)}")
+        logger.exception("unfollow_user: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_followers(request, wallet_address):
+    """Followers newest first; pass next_cursor back as ?cursor= for the next page"""
     try:
-        user = UserProfile.objects.get(wallet_address=wallet_address)
-        followers = list(user.followers.values('wallet_address', 'username', 'avatar_url'))
-        return JsonResponse({'success': True, 'followers': followers, 'count': len(followers)})
+        try:
+            cursor, limit = parse_page_params(request.GET)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor or limit'}, status=400)
+        user = UserProfile.objects.only('id', 'followers_count').get(wallet_address=wallet_address)
+        followers, next_cursor = followers_page(user, cursor, limit)
+        return JsonResponse({
+            'success': True,
+            'followers': followers,
+            'count': user.followers_count,
+            'next_cursor': next_cursor,
+        })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_following(request, wallet_address):
+    """Profiles followed, newest first; pass next_cursor back as ?cursor= for the next page"""
     try:
-        user = UserProfile.objects.get(wallet_address=wallet_address)
-        following = list(user.following.values('wallet_address', 'username', 'avatar_url'))
-        return JsonResponse({'success': True, 'following': following, 'count': len(following)})
+        try:
+            cursor, limit = parse_page_params(request.GET)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor or limit'}, status=400)
+        user = UserProfile.objects.only('id', 'following_count').get(wallet_address=wallet_address)
+        following, next_cursor = following_page(user, cursor, limit)
+        return JsonResponse({
+            'success': True,
+            'following': following,
+            'count': user.following_count,
+            'next_cursor': next_cursor,
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_home_timeline(request, wallet_address):
+    """
+    Activity of the wallets wallet_address follows, newest first, in the
+    get_activities item shape. Pass next_cursor back as ?cursor= for the
+    next page.
+    """
+    try:
+        try:
+            cursor, limit = parse_page_params(request.GET, TIMELINE_PAGE_SIZE, MAX_TIMELINE_PAGE_SIZE)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor or limit'}, status=400)
+        owner = UserProfile.objects.only('id').filter(wallet_address=wallet_address).first()
+        if owner is None:
+            return JsonResponse({'success': True, 'data': [], 'next_cursor': None})
+        activities, next_cursor = timeline_page(owner, cursor, limit)
+        return JsonResponse({
+            'success': True,
+            'data': activity_payloads(activities),
+            'next_cursor': next_cursor,
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def check_following(request, wallet_address):
+    """
+    Which of the given addresses wallet_address follows, e.g. to render
+    follow buttons for a page of profiles. GET ?addresses=a,b,c or POST
+    {"addresses": [...]}; at most MAX_FOLLOW_CHECK addresses per call.
+    """
+    try:
+        if request.method == 'POST':
+            addresses = json.loads(request.body).get('addresses') or []
+        else:
+            addresses = request.GET.get('addresses', '').split(',')
+        if not isinstance(addresses, list):
+            return JsonResponse({'success': False, 'error': 'addresses must be a list'}, status=400)
+        if len(addresses) > MAX_FOLLOW_CHECK:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_FOLLOW_CHECK} addresses per request'}, status=400)
+        return JsonResponse({'success': True, 'following': following_among(wallet_address, addresses)})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -1207,13 +1197,12 @@ def get_following(request, wallet_address):
 def get_nft_by_combined_id(request, combined_id):
     """Get NFT details by combined ID (handles both local and OpenSea NFTs)"""
     try:
-        print(f"[DEBUG] get_nft_by_combined_id called with id: {combined_id}")
+        logger.debug("get_nft_by_combined_id called with id: %s", combined_id)
         
         # Check if this is a local NFT (has "local_" prefix)
         if combined_id.startswith('local_'):
             # Extract the actual ID from the local ID
             actual_id = combined_id.replace('local_', '')
-            print(f"[DEBUG] Local NFT detected, actual_id: {actual_id}")
             
             try:
                 # Try to find by database ID first, then by token_id
@@ -1245,6 +1234,7 @@ def get_nft_by_combined_id(request, combined_id):
                     'category': nft.category,
                     'created_at': nft.created_at.isoformat(),
                     'blockchain_data': blockchain_data,
+                    'metadata': local_metadata(nft.token_uri),
                     'source': 'local'
                 }
                 
@@ -1265,7 +1255,7 @@ def get_nft_by_combined_id(request, combined_id):
             }, status=404)
                 
     except Exception as e:
-        print(f"[ERROR] get_nft_by_combined_id: {str(e)}")
+        logger.exception("get_nft_by_combined_id: %s", e)
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -1276,93 +1266,69 @@ def get_nft_by_combined_id(request, combined_id):
 def get_nft_stats(request, nft_id):
     """Get NFT statistics including views, likes, owners, and properties"""
     try:
-        # Extract the actual NFT ID from combined ID (e.g., "local_1" -> 1)
-        if nft_id.startswith('local_'):
-            actual_nft_id = nft_id.replace('local_', '')
-        else:
-            actual_nft_id = nft_id
-            
-        try:
-            # Try to find by database ID first, then by token_id
-            try:
-                nft = NFT.objects.get(id=actual_nft_id)
-            except NFT.DoesNotExist:
-                nft = NFT.objects.get(token_id=actual_nft_id)
-        except NFT.DoesNotExist:
+        nft = resolve_nfts([nft_id]).get(nft_id)
+        if nft is None:
             return JsonResponse({
                 'success': False,
                 'error': 'NFT not found'
             }, status=404)
-        
-        # Get likes count
-        likes_count = Favorite.objects.filter(nft=nft).count()
-        
-        # Get owners count (for now, just 1 since we don't track ownership history)
-        owners_count = 1
-        
-        # Get last sale info
-        last_sale = Transaction.objects.filter(
-            nft=nft, 
-            transaction_type__in=['buy', 'sale']
-        ).order_by('-timestamp').first()
-        
-        last_sale_info = 'No sales yet'
-        if last_sale and last_sale.price:
-            last_sale_info = f"Ξ{float(last_sale.price)}"
-        
-        # Calculate total volume
-        total_volume = Transaction.objects.filter(
-            nft=nft,
-            transaction_type__in=['buy', 'sale'],
-            price__isnull=False
-        ).aggregate(total=Sum('price'))['total'] or 0
-        
-        total_volume_str = f"Ξ{float(total_volume)}" if total_volume > 0 else "0 ETH"
-        
-        # Mock properties for now (you can extend this based on your NFT metadata)
-        properties = []
-        if nft.description:
-            # Extract some basic properties from description or create mock ones
-            properties = [
-                {"trait_type": "Rarity", "value": "Common", "rarity": "45%"},
-                {"trait_type": "Category", "value": nft.category or "Art", "rarity": "30%"},
-                {"trait_type": "Collection", "value": nft.collection or "Unknown", "rarity": "25%"}
-            ]
-        
-        # Get real views count
-        views_count = nft.views.count()
-        
-        stats_data = {
-            'views': views_count,
-            'likes': likes_count,
-            'owners': owners_count,
-            'last_sale': last_sale_info,
-            'total_volume': total_volume_str,
-            'properties': properties
-        }
-        
+
         return JsonResponse({
             'success': True,
-            'data': stats_data
+            'data': nft_stats([nft])[nft.id]
         })
         
     except Exception as e:
-        print(f"[ERROR] get_nft_stats: {str(e)}")
+        logger.exception("get_nft_stats: %s", e)
         return JsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
 
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def get_nft_stats_batch(request):
+    """
+    get_nft_stats for a page of NFT cards at once, in a fixed number of
+    queries. GET ?ids=local_1,local_2 or POST {"ids": [...]}; at most
+    MAX_STATS_BATCH ids. Returns {"data": {id: stats}, "missing": [ids not found]}.
+    """
+    try:
+        if request.method == 'POST':
+            try:
+                body = json.loads(request.body)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return JsonResponse({'success': False, 'error': 'Request body must be JSON'}, status=400)
+            if not isinstance(body, dict):
+                return JsonResponse({'success': False, 'error': 'Request body must be a JSON object'}, status=400)
+            nft_ids = body.get('ids') or []
+        else:
+            nft_ids = [nft_id for nft_id in request.GET.get('ids', '').split(',') if nft_id]
+        if not isinstance(nft_ids, list):
+            return JsonResponse({'success': False, 'error': 'ids must be a list'}, status=400)
+        if len(nft_ids) > MAX_STATS_BATCH:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_STATS_BATCH} ids per request'}, status=400)
+        nft_ids = list(dict.fromkeys(str(nft_id) for nft_id in nft_ids))
+        nfts = resolve_nfts(nft_ids)
+        stats = nft_stats(list({nft.id: nft for nft in nfts.values()}.values()))
+        return JsonResponse({
+            'success': True,
+            'data': {nft_id: stats[nft.id] for nft_id, nft in nfts.items()},
+            'missing': [nft_id for nft_id in nft_ids if nft_id not in nfts],
+        })
+    except Exception as e:
+        logger.exception("get_nft_stats_batch: %s", e)
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_user_liked_nfts(request, wallet_address):
     """Get all NFTs liked by a specific user"""
     try:
-        print(f"[DEBUG] get_user_liked_nfts called for user: {wallet_address}")
+        logger.debug("get_user_liked_nfts called for user: %s", wallet_address)
         
         # Get local NFT favorites
         favorites = Favorite.objects.filter(user_address=wallet_address)
-        print(f"[DEBUG] Found {favorites.count()} local favorites for user")
         
 
         
@@ -1393,14 +1359,14 @@ def get_user_liked_nfts(request, wallet_address):
         
 
         
-        print(f"[DEBUG] Returning {len(liked_nfts)} total liked NFTs ({len(favorites)} local)")
+        logger.debug("Returning %d liked NFTs", len(liked_nfts))
         return JsonResponse({
             'success': True,
             'data': liked_nfts,
             'count': len(liked_nfts)
         })
     except Exception as e:
-        print(f"[ERROR] get_user_liked_nfts: {str(e)}")
+        logger.exception("get_user_liked_nfts: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -1420,7 +1386,7 @@ def track_nft_view(request, nft_id):
         
         # Get viewer information
         data = json.loads(request.body) if request.body else {}
-        viewer_address = data.get('viewer_address')
+        viewer_address = normalize_address(data.get('viewer_address'))
         
         # Get IP address
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -1443,7 +1409,7 @@ def track_nft_view(request, nft_id):
             )
         except Exception as view_error:
             # This is expected for duplicate views
-            print(f"[INFO] Duplicate view or view creation failed: {view_error}")
+            logger.debug("Duplicate view or view creation failed: %s", view_error)
         
         # Return updated view count
         view_count = nft.views.count()
@@ -1454,7 +1420,7 @@ def track_nft_view(request, nft_id):
         })
         
     except Exception as e:
-        print(f"[ERROR] track_nft_view: {str(e)}")
+        logger.exception("track_nft_view: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -1463,7 +1429,7 @@ def burn_nft(request, token_id):
     """Burn an NFT (only by creator, never sold)"""
     try:
         data = json.loads(request.body) if request.body else {}
-        creator_address = data.get('creator_address')
+        creator_address = normalize_address(data.get('creator_address'))
         
         if not creator_address:
             return JsonResponse({'success': False, 'error': 'Creator address required'}, status=400)
@@ -1480,27 +1446,31 @@ def burn_nft(request, token_id):
                 'error': 'NFT cannot be burned. Must be unsold and owned by creator.'
             }, status=403)
         
-        if nft.creator_address.lower() != creator_address.lower():
+        if nft.creator_address != creator_address:
             return JsonResponse({'success': False, 'error': 'Only the creator can burn this NFT'}, status=403)
         
-        # Mark as burned in database
-        nft.is_burned = True
-        nft.burned_at = timezone.now()
-        nft.save()
-        
-        # Create burn transaction record
-        Transaction.objects.create(
-            transaction_hash=f"burn_{token_id}_{int(time.time())}",
-            nft=nft,
-            from_address=creator_address,
-            to_address='0x000000000000000000000000000000000000dEaD',  # Dead address
-            transaction_type='burn',
-            price=None,
-            block_number=0,
-            gas_used=0,
-            gas_price=0,
-            timestamp=timezone.now()
-        )
+        with transaction.atomic():
+            # Mark as burned in database
+            nft.is_burned = True
+            nft.burned_at = timezone.now()
+            nft.save()
+            record_burn(nft)
+            if unindex_nft(nft):
+                transaction.on_commit(lambda: schedule_rank(collection_key(nft.collection)))
+            
+            # Create burn transaction record
+            Transaction.objects.create(
+                transaction_hash=f"burn_{token_id}_{int(time.time())}",
+                nft=nft,
+                from_address=creator_address,
+                to_address='0x000000000000000000000000000000000000dEaD',  # Dead address
+                transaction_type='burn',
+                price=None,
+                block_number=0,
+                gas_used=0,
+                gas_price=0,
+                timestamp=timezone.now()
+            )
         
         return JsonResponse({
             'success': True, 
@@ -1509,7 +1479,7 @@ def burn_nft(request, token_id):
         })
         
     except Exception as e:
-        print(f"[ERROR] burn_nft: {str(e)}")
+        logger.exception("burn_nft: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -1518,7 +1488,7 @@ def hide_nft(request, token_id):
     """Hide an NFT from marketplace (by creator or admin)"""
     try:
         data = json.loads(request.body) if request.body else {}
-        user_address = data.get('user_address')
+        user_address = normalize_address(data.get('user_address'))
         reason = data.get('reason', 'Hidden by user')
         is_admin = data.get('is_admin', False)
         
@@ -1539,8 +1509,8 @@ def hide_nft(request, token_id):
         
         # Only creator or admin can hide
         can_hide = (
-            nft.creator_address.lower() == user_address.lower() or
-            nft.owner_address.lower() == user_address.lower() or
+            nft.creator_address == user_address or
+            nft.owner_address == user_address or
             is_admin
         )
         
@@ -1577,7 +1547,7 @@ def hide_nft(request, token_id):
         })
         
     except Exception as e:
-        print(f"[ERROR] hide_nft: {str(e)}")
+        logger.exception("hide_nft: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
@@ -1586,7 +1556,7 @@ def unhide_nft(request, token_id):
     """Unhide an NFT (restore visibility)"""
     try:
         data = json.loads(request.body) if request.body else {}
-        user_address = data.get('user_address')
+        user_address = normalize_address(data.get('user_address'))
         is_admin = data.get('is_admin', False)
         
         if not user_address:
@@ -1603,8 +1573,8 @@ def unhide_nft(request, token_id):
         
         # Only creator, owner, or admin can unhide
         can_unhide = (
-            nft.creator_address.lower() == user_address.lower() or
-            nft.owner_address.lower() == user_address.lower() or
+            nft.creator_address == user_address or
+            nft.owner_address == user_address or
             is_admin
         )
         
@@ -1641,5 +1611,25 @@ def unhide_nft(request, token_id):
         })
         
     except Exception as e:
-        print(f"[ERROR] unhide_nft: {str(e)}")
+        logger.exception("unhide_nft: %s", e)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_perf_stats(request):
+    """Per-endpoint p50/p95/p99 (ms) for this process, collected by PerformanceMiddleware"""
+    try:
+        return JsonResponse({
+            'success': True,
+            'data': endpoint_stats.summary()
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def prometheus_metrics(request):
+    """Prometheus scrape endpoint (all gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -1,55 +1,110 @@
-import json
+import logging
 import os
+import time
+from decimal import Decimal
 from web3 import Web3
 from eth_account import Account
-from django.conf import settings
+from eth_utils import function_abi_to_4byte_selector
+from eth_utils.abi import get_abi_input_types, get_abi_output_types
+from . import abi_registry
+from .instrumentation import add_timing
+from .metrics import observe_web3
+
+logger = logging.getLogger(__name__)
+
+ZERO_ADDRESS = '0x' + '0' * 40
+WEI = Decimal(10) ** 18
+# Precision of the price columns
+PRICE_QUANTUM = Decimal('1e-8')
+
+# Fields of the contract's Listing struct, in getListing() order
+LISTING_FIELDS = ('seller', 'price', 'isActive', 'isAuction', 'auctionEndTime', 'startingPrice',
+                  'highestBid', 'highestBidder')
+
+
+def from_wei(amount):
+    """Ether Decimal for a wei amount, at the precision of the price columns"""
+    return (Decimal(amount) / WEI).quantize(PRICE_QUANTUM)
+
+
+class TimedHTTPProvider(Web3.HTTPProvider):
+    """
+    HTTPProvider that records RPC time against the current request and in
+    the Prometheus metrics, labelled by contract function for eth_call.
+    """
+
+    # 0x-prefixed 4-byte selector -> function name, filled in once the ABI is loaded
+    function_selectors = {}
+
+    def make_request(self, method, params):
+        start = time.perf_counter()
+        try:
+            return super().make_request(method, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            add_timing('rpc', elapsed)
+            observe_web3(self._call_label(method, params), elapsed)
+
+    def make_batch_request(self, requests):
+        start = time.perf_counter()
+        try:
+            return super().make_batch_request(requests)
+        finally:
+            elapsed = time.perf_counter() - start
+            add_timing('rpc', elapsed)
+            observe_web3('batch', elapsed)
+
+    def _call_label(self, method, params):
+        if method != 'eth_call' or not params or not isinstance(params[0], dict):
+            return method
+        data = params[0].get('data') or params[0].get('input') or ''
+        if not isinstance(data, str):
+            data = '0x' + bytes(data).hex()
+        return self.function_selectors.get(data[:10].lower(), method)
+
 
 class NFTMarketplaceWeb3:
     def __init__(self):
-        print("[Web3] Initializing NFTMarketplaceWeb3...")
+        logger.info("Initializing NFTMarketplaceWeb3...")
+        self._call_codecs = {}
         # Sepolia testnet configuration
         self.sepolia_url = os.getenv('ALCHEMY_API_URL', "ADD_YOUR_ALCHEMY_URL_HERE")
         self.contract_address = os.getenv('NFT_CONTRACT_ADDRESS', "ADD_YOUR_CONTRACT_ADDRESS_HERE")
         
-        print(f"[Web3] Using Sepolia URL: {self.sepolia_url}")
-        print(f"[Web3] Contract address: {self.contract_address}")
+        logger.debug("Using Sepolia URL: %s", self.sepolia_url)
+        logger.debug("Contract address: %s", self.contract_address)
         
         if not Web3.is_address(self.contract_address):
             raise ValueError(f"Invalid contract address: {self.contract_address}")
         
         try:
-            print("[Web3] Connecting to Ethereum network...")
-            provider = Web3.HTTPProvider(self.sepolia_url)
+            logger.debug("Connecting to Ethereum network...")
+            provider = TimedHTTPProvider(self.sepolia_url)
             self.w3 = Web3(provider)
             
             if not self.w3.is_connected():
-                print("[Web3] WARNING: Could not connect to Ethereum network")
+                logger.warning("Could not connect to Ethereum network")
                 raise ConnectionError("Could not connect to Ethereum network")
             
-            print("[Web3] Successfully connected to Ethereum network")
-            print(f"[Web3] Network: {self.w3.eth.chain_id}")
+            logger.info("Connected to Ethereum network %s", self.w3.eth.chain_id)
             
             # Convert contract address to checksum address
             self.contract_address = Web3.to_checksum_address(self.contract_address)
-            print(f"[Web3] Using checksum address: {self.contract_address}")
+            logger.debug("Using checksum address: %s", self.contract_address)
             
             # Verify contract exists
             code = self.w3.eth.get_code(self.contract_address)
             if code.hex() == '0x':
                 raise ValueError(f"No contract found at address {self.contract_address}")
             
-            # Contract ABI (you'll need to get this from your compiled contract)
-            self.contract_abi = self._get_contract_abi()
+            # Contract ABI, compiled once from the Hardhat artifact (nft.abi_registry)
+            contract_abis = abi_registry.registry()
+            self.contract_abi = contract_abis.abi
             if not self.contract_abi:
                 raise ValueError("Contract ABI is empty or invalid")
             
-            print(f"[Web3] Loaded ABI with {len(self.contract_abi)} functions")
-            print("[Web3] Available functions:", [func['name'] for func in self.contract_abi if func.get('type') == 'function'])
-            
-            # Initialize contract
-            print(f"[Web3] Initializing contract with address: {self.contract_address}")
-            print(f"[Web3] Contract ABI type: {type(self.contract_abi)}")
-            print(f"[Web3] First few ABI entries: {self.contract_abi[:2]}")
+            logger.debug("Loaded ABI with %d entries", len(self.contract_abi))
+            provider.function_selectors = contract_abis.selectors
             
             # Extra validation before contract initialization
             if not self.contract_address:
@@ -60,385 +115,29 @@ class NFTMarketplaceWeb3:
             
             if not self.contract_abi:
                 raise ValueError("Contract ABI is empty")
-                
-            print(f"[Web3] Pre-initialization validation passed")
-            print(f"[Web3] Contract address: {self.contract_address}")
-            print(f"[Web3] ABI length: {len(self.contract_abi)}")
             
             try:
                 self.contract = self.w3.eth.contract(
                     address=self.contract_address,
                     abi=self.contract_abi
                 )
-                print("[Web3] Contract successfully initialized")
+                logger.info("Contract initialized at %s", self.contract_address)
             except Exception as e:
-                print(f"[Web3] Contract initialization failed: {str(e)}")
-                print(f"[Web3] Contract address type: {type(self.contract_address)}")
-                print(f"[Web3] Contract address value: {self.contract_address}")
+                logger.error("Contract initialization failed for %r: %s", self.contract_address, e)
                 raise
             
             # Test basic contract calls
             try:
                 name = self.contract.functions.name().call()
                 symbol = self.contract.functions.symbol().call()
-                print(f"[Web3] Contract name: {name}")
-                print(f"[Web3] Contract symbol: {symbol}")
+                logger.info("Contract name: %s, symbol: %s", name, symbol)
             except Exception as e:
-                print(f"[Web3] Warning: Could not get contract name/symbol: {str(e)}")
+                logger.warning("Could not get contract name/symbol: %s", e)
                 
         except Exception as e:
-            print(f"[Web3] Error initializing web3: {str(e)}")
-            print(f"[Web3] Error type: {type(e)}")
-            print(f"[Web3] Error args: {e.args}")
+            logger.error("Error initializing web3: %r", e)
             raise
     
-    def _get_contract_abi(self):
-        """Get contract ABI from the compiled contract"""
-        try:
-            print("[Web3] Getting contract ABI...")
-            # Try to get BASE_DIR from Django settings
-            try:
-                from django.conf import settings
-                base_dir = settings.BASE_DIR
-                print(f"[Web3] Using Django settings BASE_DIR: {base_dir}")
-            except:
-                print("[Web3] Django settings not found, using fallback path")
-                # Fallback if Django settings not available
-                base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            
-            # Path to the compiled contract artifacts
-            artifacts_path = os.path.join(
-                os.path.dirname(base_dir), 
-                'smartcontract', 
-                'artifacts', 
-                'contracts', 
-                'nftmarketplace.sol', 
-                'NFTMarketplace.json'
-            )
-            print(f"[Web3] Looking for contract ABI at: {artifacts_path}")
-            
-            if not os.path.exists(artifacts_path):
-                print(f"[Web3] Error: Contract artifact not found at {artifacts_path}")
-                raise FileNotFoundError(f"Contract artifact not found at {artifacts_path}")
-                
-            print(f"[Web3] File exists: {os.path.exists(artifacts_path)}")
-            
-            try:
-                with open(artifacts_path, 'r') as f:
-                    contract_data = json.load(f)
-                    if 'abi' not in contract_data:
-                        raise ValueError("No 'abi' field found in contract artifact")
-                    print(f"[Web3] Successfully loaded contract artifact")
-                    return contract_data['abi']
-            except json.JSONDecodeError as e:
-                print(f"[Web3] Error: Invalid JSON in contract artifact: {str(e)}")
-                raise
-            except Exception as e:
-                print(f"[Web3] Error loading contract artifact: {str(e)}")
-                raise
-
-            with open(artifacts_path, 'r') as f:
-                contract_data = json.load(f)
-                abi = contract_data['abi']
-                print(f"[Web3] Successfully loaded ABI with {len(abi)} functions")
-                print("[Web3] Available functions:", [func['name'] for func in abi if func.get('type') == 'function'])
-                return abi
-        except FileNotFoundError:
-            # Fallback ABI (basic structure - you should replace this with actual ABI)
-            return [
-                {
-                    "inputs": [],
-                    "stateMutability": "nonpayable",
-                    "type": "constructor"
-                },
-                {
-                    "anonymous": False,
-                    "inputs": [
-                        {
-                            "indexed": True,
-                            "internalType": "address",
-                            "name": "owner",
-                            "type": "address"
-                        },
-                        {
-                            "indexed": True,
-                            "internalType": "address",
-                            "name": "approved",
-                            "type": "address"
-                        },
-                        {
-                            "indexed": True,
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "Approval",
-                    "type": "event"
-                },
-                {
-                    "anonymous": False,
-                    "inputs": [
-                        {
-                            "indexed": True,
-                            "internalType": "address",
-                            "name": "from",
-                            "type": "address"
-                        },
-                        {
-                            "indexed": True,
-                            "internalType": "address",
-                            "name": "to",
-                            "type": "address"
-                        },
-                        {
-                            "indexed": True,
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "Transfer",
-                    "type": "event"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "to",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "approve",
-                    "outputs": [],
-                    "stateMutability": "nonpayable",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "owner",
-                            "type": "address"
-                        }
-                    ],
-                    "name": "balanceOf",
-                    "outputs": [
-                        {
-                            "internalType": "uint256",
-                            "name": "",
-                            "type": "uint256"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "getApproved",
-                    "outputs": [
-                        {
-                            "internalType": "address",
-                            "name": "",
-                            "type": "address"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "owner",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "address",
-                            "name": "operator",
-                            "type": "address"
-                        }
-                    ],
-                    "name": "isApprovedForAll",
-                    "outputs": [
-                        {
-                            "internalType": "bool",
-                            "name": "",
-                            "type": "bool"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [],
-                    "name": "name",
-                    "outputs": [
-                        {
-                            "internalType": "string",
-                            "name": "",
-                            "type": "string"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "ownerOf",
-                    "outputs": [
-                        {
-                            "internalType": "address",
-                            "name": "",
-                            "type": "address"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "from",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "address",
-                            "name": "to",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "safeTransferFrom",
-                    "outputs": [],
-                    "stateMutability": "nonpayable",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "from",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "address",
-                            "name": "to",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        },
-                        {
-                            "internalType": "bytes",
-                            "name": "data",
-                            "type": "bytes"
-                        }
-                    ],
-                    "name": "safeTransferFrom",
-                    "outputs": [],
-                    "stateMutability": "nonpayable",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "operator",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "bool",
-                            "name": "approved",
-                            "type": "bool"
-                        }
-                    ],
-                    "name": "setApprovalForAll",
-                    "outputs": [],
-                    "stateMutability": "nonpayable",
-                    "type": "function"
-                },
-                {
-                    "inputs": [],
-                    "name": "symbol",
-                    "outputs": [
-                        {
-                            "internalType": "string",
-                            "name": "",
-                            "type": "string"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "tokenURI",
-                    "outputs": [
-                        {
-                            "internalType": "string",
-                            "name": "",
-                            "type": "string"
-                        }
-                    ],
-                    "stateMutability": "view",
-                    "type": "function"
-                },
-                {
-                    "inputs": [
-                        {
-                            "internalType": "address",
-                            "name": "from",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "address",
-                            "name": "to",
-                            "type": "address"
-                        },
-                        {
-                            "internalType": "uint256",
-                            "name": "tokenId",
-                            "type": "uint256"
-                        }
-                    ],
-                    "name": "transferFrom",
-                    "outputs": [],
-                    "stateMutability": "nonpayable",
-                    "type": "function"
-                }
-            ]
-    
     def get_contract_info(self):
         """Get basic contract information"""
         try:
@@ -490,6 +189,101 @@ class NFTMarketplaceWeb3:
         except Exception as e:
             return {'error': str(e)}
     
+    def get_listing(self, token_id):
+        """On-chain listing of a token as a dict of LISTING_FIELDS (isActive False if not listed)"""
+        return dict(zip(LISTING_FIELDS, self.contract.functions.getListing(token_id).call()))
+
+    def batch_call(self, calls, block_identifier='latest'):
+        """
+        Run read-only contract calls [(function name, args)] as one JSON-RPC
+        batch, all against the same block. Returns the decoded results in
+        order; a call that reverts (e.g. ownerOf for a token that was never
+        minted) gives None rather than failing the whole batch.
+        """
+        if not calls:
+            return []
+        if isinstance(block_identifier, int):
+            block_identifier = hex(block_identifier)
+        requests, outputs = [], []
+        for name, args in calls:
+            selector, input_types, output_types = self._call_codec(name)
+            data = selector + self.w3.codec.encode(input_types, args).hex()
+            requests.append(('eth_call', [{'to': self.contract_address, 'data': data}, block_identifier]))
+            outputs.append(output_types)
+        responses = self.w3.provider.make_batch_request(requests)
+        if not isinstance(responses, list):
+            raise ConnectionError(f"Batch call failed: {responses.get('error')}")
+        results = []
+        for output_types, response in zip(outputs, responses):
+            result = response.get('result')
+            if 'error' in response or not result or result == '0x':
+                results.append(None)
+                continue
+            values = self.w3.codec.decode(output_types, bytes.fromhex(result[2:]))
+            results.append(values[0] if len(values) == 1 else values)
+        return results
+
+    def _call_codec(self, name):
+        """(0x selector, input types, output types) of a contract function, worked out once per name"""
+        if name not in self._call_codecs:
+            fn_abi = self.contract.get_function_by_name(name).abi
+            self._call_codecs[name] = ('0x' + function_abi_to_4byte_selector(fn_abi).hex(),
+                                       get_abi_input_types(fn_abi), get_abi_output_types(fn_abi))
+        return self._call_codecs[name]
+
+    def get_logs(self, from_block, to_block):
+        """
+        Raw JSON-RPC logs (hex strings, as the node sent them) the marketplace
+        contract emitted in [from_block, to_block]; web3's per-log result
+        formatting is skipped since abi_registry decodes the raw form directly
+        """
+        response = self.w3.provider.make_request('eth_getLogs', [{
+            'address': self.contract_address, 'fromBlock': hex(from_block), 'toBlock': hex(to_block),
+        }])
+        if 'error' in response:
+            raise ConnectionError(f"eth_getLogs {from_block}-{to_block} failed: {response['error']}")
+        return response['result']
+
+    def get_blocks(self, numbers):
+        """{number: (hash, parent hash, timestamp)} for block headers, fetched as one batch"""
+        numbers = list(numbers)
+        if not numbers:
+            return {}
+        with self.w3.batch_requests() as batch:
+            for number in numbers:
+                batch.add(self.w3.eth.get_block(number))
+            blocks = batch.execute()
+        return {block['number']: (block['hash'].to_0x_hex(), block['parentHash'].to_0x_hex(), block['timestamp'])
+                for block in blocks}
+
+    def end_auctions(self, token_ids):
+        """
+        Send endAuction for each token from the settler account
+        (AUCTION_SETTLER_PRIVATE_KEY) without waiting for receipts.
+        Returns {token_id: tx hash or None if sending failed}; raises
+        ValueError when no settler key is configured.
+        """
+        private_key = os.getenv('AUCTION_SETTLER_PRIVATE_KEY')
+        if not private_key:
+            raise ValueError("AUCTION_SETTLER_PRIVATE_KEY is not set")
+        account = Account.from_key(private_key)
+        # One nonce lookup per batch; transactions are numbered locally after it
+        nonce = self.w3.eth.get_transaction_count(account.address, 'pending')
+        hashes = {}
+        for token_id in token_ids:
+            try:
+                tx = self.contract.functions.endAuction(token_id).build_transaction({
+                    'from': account.address,
+                    'nonce': nonce,
+                })
+                signed = account.sign_transaction(tx)
+                hashes[token_id] = self.w3.eth.send_raw_transaction(signed.raw_transaction).to_0x_hex()
+                nonce += 1
+            except Exception as e:
+                logger.warning("endAuction(%s) failed: %s", token_id, e)
+                hashes[token_id] = None
+        return hashes
+
     def is_connected(self):
         """Check if Web3 is connected to the network"""
         return self.w3.is_connected()
@@ -501,5 +295,24 @@ class NFTMarketplaceWeb3:
         except Exception as e:
             return None
 
+class LazyWeb3:
+    """
+    Defers connecting to the node until the first attribute access, so
+    importing views (migrations, management commands, offline benchmarks)
+    does not require a reachable RPC endpoint.
+    """
+
+    def __init__(self):
+        self._instance = None
+
+    def set_instance(self, instance):
+        """Use `instance` instead of connecting (e.g. an offline stand-in)"""
+        self._instance = instance
+
+    def __getattr__(self, name):
+        if self._instance is None:
+            self._instance = NFTMarketplaceWeb3()
+        return getattr(self._instance, name)
+
 # Create a singleton instance
-web3_instance = NFTMarketplaceWeb3() 
\ No newline at end of file
+web3_instance = LazyWeb3()